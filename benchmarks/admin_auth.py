@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi.security import HTTPAuthorizationCredentials
+from mongomock_motor import AsyncMongoMockClient
+
+import main
+from database import get_database
+from dependencies.auth import create_access_token, get_current_admin_user
+from services.principal_cache import principal_cache
+
+# -------------------------------
+# Admin authentication with and without the principal cache
+# -------------------------------
+# 1) get_current_admin_user alone: JWT check + admins lookup vs a cache hit.
+# 2) GET /admin/metrics through the app (httpx ASGI transport, no network),
+#    `--concurrency` clients, with an optional simulated Mongo round trip on
+#    the admins lookup (--rtt-ms) since the in-memory database has none.
+# Needs the usual .env (ENCRYPTION_KEY, BLIND_INDEX_KEY, JWT_SECRET_KEY). Usage:
+# python -m benchmarks.admin_auth [--requests 4000] [--concurrency 20] [--rtt-ms 0 1]
+
+
+def in_memory_db(rtt_seconds: float):
+    db = AsyncMongoMockClient()["benchmark"]
+    find_one = db.admins.find_one
+
+    async def find_one_with_rtt(*args, **kwargs):
+        if rtt_seconds:
+            await asyncio.sleep(rtt_seconds)
+        return await find_one(*args, **kwargs)
+
+    db.admins.find_one = find_one_with_rtt
+    return db
+
+
+async def dependency_us(db, credentials, enabled: bool, n: int = 5000) -> float:
+    principal_cache.enabled = enabled
+    principal_cache.clear()
+    start = time.perf_counter()
+    for _ in range(n):
+        await get_current_admin_user(credentials, db)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def requests_per_second(client, headers, total: int, concurrency: int) -> float:
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while sent < total:
+            sent += 1
+            response = await client.get("/admin/metrics", headers=headers)
+            assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def run(total: int, concurrency: int, rtts_ms):
+    token = create_access_token({"sub": "benchmark"})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    db = in_memory_db(0)
+    await db.admins.insert_one({"username": "benchmark", "hashed_password": "x", "role": "admin"})
+    for enabled in (False, True):
+        print(f"dependency, cache {'on ' if enabled else 'off'}: {await dependency_us(db, credentials, enabled):7.1f} us")
+
+    for rtt_ms in rtts_ms:
+        db = in_memory_db(rtt_ms / 1000)
+        await db.admins.insert_one({"username": "benchmark", "hashed_password": "x", "role": "admin"})
+        main.app.dependency_overrides[get_database] = lambda: db
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark") as client:
+            await requests_per_second(client, headers, 200, concurrency)  # warm-up
+            for enabled in (False, True):
+                principal_cache.enabled = enabled
+                principal_cache.clear()
+                rate = await requests_per_second(client, headers, total, concurrency)
+                print(f"/admin/metrics, admins RTT {rtt_ms:g} ms, cache {'on ' if enabled else 'off'}: {rate:7.0f} req/s")
+    main.app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark admin authentication with the principal cache")
+    parser.add_argument("--requests", type=int, default=4000, help="requests per measurement")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--rtt-ms", type=float, nargs="+", default=[0, 1], help="simulated admins lookup latency")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.rtt_ms))
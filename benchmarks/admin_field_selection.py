@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+
+from benchmarks.payloads import make_raw
+from encrypt.encryption import encrypt_field
+from services.admin_service import AdminService
+from services.batch_writer import BatchWriter
+from services.decrypted_cache import decrypted_cache
+from services.webhook_service import WebhookService
+from utils.report_decoder import decode_end_of_call
+
+# -------------------------------
+# Admin views with field / message-range selection
+# -------------------------------
+# Latency of the decrypted call-log, chat and appointment views, whole and
+# with `fields` / message ranges, on an in-memory database (mongomock, so
+# round trips cost nothing; what remains is decryption and decoding). The
+# decrypted-document cache is cleared before every call.
+# Needs the usual .env (ENCRYPTION_KEY). Usage:
+# python -m benchmarks.admin_field_selection [--turns 1200] [--chat-messages 2000] [--repeat 20]
+
+
+async def per_call_ms(fn, repeat: int) -> float:
+    await fn()
+    elapsed = 0.0
+    for _ in range(repeat):
+        decrypted_cache.clear()
+        start = time.perf_counter()
+        await fn()
+        elapsed += time.perf_counter() - start
+    return elapsed / repeat * 1000
+
+
+async def main(turns: int, chat_messages: int, repeat: int):
+    db = AsyncMongoMockClient()["benchmark"]
+    await WebhookService.handle_end_of_call(db, decode_end_of_call(make_raw(turns)))
+    await BatchWriter.flush_all()
+    call_log_id = str((await db.callslog.find_one())["_id"])
+    messages = [encrypt_field(json.dumps({"role": "user", "content": "hello there " * 20})) for _ in range(chat_messages)]
+    chat_id = str((await db.chats.insert_one({"user_id": "u", "email": "e", "messages": messages})).inserted_id)
+    appointment_id = str((await db.appointments.insert_one({
+        "patient_name": "p",
+        "patient_email": encrypt_field("ann@example.com"),
+        "patient_phone": encrypt_field("+15550100"),
+        "patient_address": encrypt_field("1 Main St"),
+    })).inserted_id)
+
+    cases = [
+        ("call log full", lambda: AdminService.get_decrypted_call_log(db, call_log_id)),
+        ("call log fields=call_id,email,call_duration_minutes",
+         lambda: AdminService.get_decrypted_call_log(db, call_log_id, "call_id,email,call_duration_minutes")),
+        ("call log fields=body.message.summary",
+         lambda: AdminService.get_decrypted_call_log(db, call_log_id, "body.message.summary")),
+        ("call log last 20 turns",
+         lambda: AdminService.get_decrypted_call_log(db, call_log_id, "body.message.messages", -20)),
+        (f"chat full ({chat_messages} messages)", lambda: AdminService.get_decrypted_chat(db, chat_id)),
+        ("chat last 20 messages", lambda: AdminService.get_decrypted_chat(db, chat_id, None, -20)),
+        ("chat fields=email", lambda: AdminService.get_decrypted_chat(db, chat_id, "email")),
+        ("appointment full", lambda: AdminService.get_decrypted_appointment(db, appointment_id)),
+        ("appointment fields=patient_email",
+         lambda: AdminService.get_decrypted_appointment(db, appointment_id, "patient_email")),
+    ]
+    for label, fn in cases:
+        print(f"{label:55s} {await per_call_ms(fn, repeat):8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark admin views with field selection")
+    parser.add_argument("--turns", type=int, default=1200, help="turns in the call report")
+    parser.add_argument("--chat-messages", type=int, default=2000, help="messages in the chat")
+    parser.add_argument("--repeat", type=int, default=20, help="calls timed per case")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.chat_messages, args.repeat))
@@ -0,0 +1,65 @@
+import argparse
+import random
+import time
+
+import bson
+
+from benchmarks.payloads import make_raw
+from services import call_log_archive
+from services.call_log_archive import pack_archive, unpack_archive
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd rows are skipped
+    zstandard = None
+
+# -------------------------------
+# Call-log archive size per codec
+# -------------------------------
+# Builds a seeded corpus of end-of-call reports (4-400 turns), trains a zstd
+# dictionary on the first half and archives the second half with zlib, zstd
+# and zstd + dictionary (raw format, as CALLSLOG_ARCHIVE_NORMALIZE=false; pass
+# --normalize to measure normalized archives). Reports the stored archive
+# size against the raw bytes and the pack time per document.
+# The generated text is repetitive, so real-world ratios are lower.
+# Needs the usual .env (ENCRYPTION_KEY). Usage:
+# python -m benchmarks.call_log_archive [--documents 300] [--normalize]
+
+DICT_SIZE = 112 * 1024
+
+
+def configure(codec: str, dictionary=None):
+    call_log_archive.CALLSLOG_ARCHIVE_CODEC = codec
+    call_log_archive._dictionaries = {dictionary.dict_id(): dictionary} if dictionary else {}
+    call_log_archive.CALLSLOG_ARCHIVE_DICT_ID = dictionary.dict_id() if dictionary else None
+
+
+def main(documents: int, normalize: bool):
+    rnd = random.Random(1)
+    corpus = [make_raw(rnd.randint(4, 400), call_id=f"call-{i}") for i in range(documents)]
+    train, test = corpus[:documents // 2], corpus[documents // 2:]
+    raw_total = sum(map(len, test))
+    call_log_archive.CALLSLOG_ARCHIVE_NORMALIZE = normalize
+    print(f"{len(test)} test reports, {raw_total / 1e6:.1f} MB raw ({'normalized' if normalize else 'raw'} format)")
+
+    setups = [("zlib", None)]
+    if zstandard is not None:
+        setups += [("zstd", None), ("zstd", zstandard.train_dictionary(DICT_SIZE, train))]
+    for codec, dictionary in setups:
+        configure(codec, dictionary)
+        start = time.perf_counter()
+        archives = [pack_archive(raw)[0] for raw in test]
+        pack_ms = (time.perf_counter() - start) / len(test) * 1000
+        stored = sum(len(bson.encode(archive)) for archive in archives)
+        if not normalize:
+            assert all(unpack_archive(a) == raw for a, raw in zip(archives[:20], test))
+        label = codec + (" + dictionary" if dictionary else "")
+        print(f"{label:18s} {stored / 1e6:6.2f} MB ({raw_total / stored:5.1f}x smaller), pack {pack_ms:.2f} ms/doc")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark call-log archive codecs")
+    parser.add_argument("--documents", type=int, default=300, help="corpus size (half trains the dictionary)")
+    parser.add_argument("--normalize", action="store_true", help="archive in normalized format")
+    args = parser.parse_args()
+    main(args.documents, args.normalize)
@@ -0,0 +1,87 @@
+import argparse
+import copy
+import json
+import timeit
+
+import bson
+
+from benchmarks.payloads import SIZES, make_report
+from encrypt.encryption import ENVELOPE_BINARY_SUBTYPE, encrypt_field, seal
+from services.call_log_archive import pack_archive
+
+# -------------------------------
+# Call-log encryption: per-field Fernet vs one envelope
+# -------------------------------
+# Cost and stored BSON size of encrypting an end-of-call report three ways:
+#   per-field  every sensitive value Fernet-encrypted on its own (the layout
+#              before envelope encryption, reimplemented below for comparison)
+#   envelope   the same values serialized once and sealed with AES-GCM
+#   archive    what is stored today: normalized, compressed, sealed (CallLogArchive)
+# Needs the usual .env (ENCRYPTION_KEY). Usage:
+# python -m benchmarks.call_log_encryption [--repeat 3]
+
+SENSITIVE = ["summary", "transcript", "costBreakdown", "cost", "costs", "customer"]
+SENSITIVE_TURN = ["message", "content", "summary", "transcript", "cost", "costs", "customer"]
+TURN_LISTS = [("artifact", "messages"), ("artifact", "messagesOpenAIFormatted"), (None, "messages"), (None, "conversation")]
+
+
+def _fernet(value):
+    return encrypt_field(json.dumps(value)) if value is not None else None
+
+
+def per_field(body: dict) -> dict:
+    msg = body["message"]
+    for parent in (msg, msg.get("analysis") or {}, msg.get("artifact") or {}):
+        for field in SENSITIVE:
+            if field in parent:
+                parent[field] = _fernet(parent[field])
+    for parent_key, key in TURN_LISTS:
+        parent = msg.get(parent_key) if parent_key else msg
+        for turn in (parent or {}).get(key) or []:
+            for field in SENSITIVE_TURN:
+                if turn.get(field) is not None:
+                    turn[field] = _fernet(turn[field])
+    return body
+
+
+def envelope(body: dict) -> dict:
+    msg = body["message"]
+    sealed = {}
+    for name, parent in (("message", msg), ("analysis", msg.get("analysis")), ("artifact", msg.get("artifact"))):
+        for field in SENSITIVE:
+            if parent and field in parent:
+                sealed.setdefault(name, {})[field] = parent.pop(field)
+    for parent_key, key in TURN_LISTS:
+        parent = msg.get(parent_key) if parent_key else msg
+        if parent and key in parent:
+            sealed.setdefault(parent_key or "message", {})[key] = parent.pop(key)
+    msg["sealed"] = bson.Binary(seal(json.dumps(sealed).encode()), ENVELOPE_BINARY_SUBTYPE)
+    return body
+
+
+def best_ms(fn, number: int, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000
+
+
+def main(repeat: int):
+    for name, turns in SIZES.items():
+        report = make_report(turns)
+        raw = json.dumps(report).encode()
+        number = max(3, 300 // turns)
+        # Each run encrypts a fresh copy; the copy itself is timed separately and subtracted
+        copying = best_ms(lambda: copy.deepcopy(report), number, repeat)
+        results = {}
+        for label, encrypt in (("per-field", per_field), ("envelope", envelope)):
+            ms = best_ms(lambda: encrypt(copy.deepcopy(report)), number, repeat) - copying
+            results[label] = (ms, len(bson.encode(encrypt(copy.deepcopy(report)))))
+        archive, _ = pack_archive(raw)
+        results["archive"] = (best_ms(lambda: pack_archive(raw), number, repeat), len(bson.encode(archive)))
+        print(f"{name:7s} {turns:5d} turns {len(raw) / 1024:8.1f} KiB JSON  " + "  ".join(
+            f"{label} {ms:7.2f} ms {size / 1024:8.1f} KiB" for label, (ms, size) in results.items()
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark call-log encryption layouts")
+    parser.add_argument("--repeat", type=int, default=3, help="timing rounds (best is reported)")
+    main(parser.parse_args().repeat)
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import time
+
+import bcrypt
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+import main
+from services.password_hasher import password_hasher
+
+# -------------------------------
+# Webhook latency during a login burst
+# -------------------------------
+# `--logins` clients log in back to back (admin and user logins, alternating)
+# while one client posts /webhook/call-start every 10 ms; reports the webhook
+# latency percentiles and the login status codes. --inline runs bcrypt on the
+# event loop, as before the hashing pool. Worker count and queue come from
+# PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_QUEUE.
+# Needs the usual .env (ENCRYPTION_KEY, BLIND_INDEX_KEY, JWT_SECRET_KEY). Usage:
+# python -m benchmarks.login_burst [--logins 8] [--seconds 5] [--inline]
+
+
+async def run(logins: int, seconds: float, inline: bool):
+    if inline:
+        async def on_event_loop(fn, *args):
+            return fn(*args)
+        password_hasher._run = on_event_loop
+
+    db = AsyncMongoMockClient()["benchmark"]
+    main.app.mongodb = db
+    await db.admins.insert_one({
+        "username": "root", "hashed_password": bcrypt.hashpw(b"pw", bcrypt.gensalt(password_hasher.rounds)).decode(),
+    })
+    await db.users.insert_one({
+        "email": "user@example.com", "password": bcrypt.hashpw(b"pw", bcrypt.gensalt(password_hasher.rounds)).decode(),
+    })
+
+    stop = False
+    codes = {}
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=60) as client:
+        async def login(i: int):
+            while not stop:
+                if i % 2:
+                    response = await client.post("/auth/login", data={"username": "root", "password": "pw"})
+                else:
+                    response = await client.post("/users/login", json={"email": "user@example.com", "password": "pw"})
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                # A client told to retry backs off (and lets the loop run other requests)
+                await asyncio.sleep(0.05 if response.status_code == 429 else 0)
+
+        async def webhooks():
+            i = 0
+            while not stop:
+                start = time.perf_counter()
+                response = await client.post("/webhook/call-start", json={"call_id": f"call-{i}", "email": "a@b.com"})
+                assert response.status_code == 200, response.text
+                latencies.append((time.perf_counter() - start) * 1000)
+                i += 1
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(login(i)) for i in range(logins)] + [asyncio.create_task(webhooks())]
+        await asyncio.sleep(seconds)
+        stop = True
+        await asyncio.gather(*tasks)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+    mode = "inline" if inline else f"pool of {password_hasher.workers}"
+    print(
+        f"{mode}, {logins} login clients: {len(latencies)} webhooks, p50 {pct(.5):.1f} ms, "
+        f"p99 {pct(.99):.1f} ms, max {latencies[-1]:.1f} ms; login responses {dict(sorted(codes.items()))}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Webhook latency while logins hash passwords")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of the burst")
+    parser.add_argument("--inline", action="store_true", help="hash on the event loop (old behaviour)")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.seconds, args.inline))
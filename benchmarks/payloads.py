@@ -0,0 +1,63 @@
+import copy
+import json
+import random
+
+# -------------------------------
+# Synthetic VAPI end-of-call reports
+# -------------------------------
+# Shape and field names follow real reports; the conversation is random words
+# (seeded, so every run benchmarks the same bytes). A report repeats the turns
+# in artifact.messages, messages, messagesOpenAIFormatted and the transcript,
+# as VAPI does.
+
+# Name -> number of turns
+SIZES = {"small": 6, "median": 60, "large": 1200}
+
+_WORDS = (
+    "patient doctor appointment tomorrow pain headache cardiology booking email "
+    "please thank you morning afternoon"
+).split()
+
+
+def make_report(turns: int, call_id: str = None) -> dict:
+    rnd = random.Random(turns)
+    messages, openai, transcript = [], [], []
+    for i in range(turns):
+        role = "user" if i % 2 else "bot"
+        text = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(8, 30)))
+        messages.append({
+            "role": role, "message": text, "time": 1700000000000 + i * 1000,
+            "endTime": 1700000000500 + i * 1000, "secondsFromStart": i * 1.0, "duration": 500,
+        })
+        openai.append({"role": "user" if role == "user" else "assistant", "content": text})
+        transcript.append(("User: " if role == "user" else "AI: ") + text)
+    transcript = "\n".join(transcript)
+    return {"message": {
+        "timestamp": 1700000000000,
+        "type": "end-of-call-report",
+        "endedReason": "customer-ended-call",
+        "call": {"id": call_id or f"call-{turns}", "orgId": "org", "type": "webPhone"},
+        "assistant": {"id": "a1", "name": "Clinic", "model": {
+            "provider": "openai", "model": "gpt-4o", "systemPrompt": "You are a clinic assistant. " * 60,
+        }},
+        "analysis": {"summary": "Patient booked. " * 5, "successEvaluation": "true"},
+        "artifact": {
+            "messages": copy.deepcopy(messages),
+            "messagesOpenAIFormatted": copy.deepcopy(openai),
+            "transcript": transcript,
+            "recordingUrl": "https://example.invalid/rec.wav",
+        },
+        "messages": messages,
+        "conversation": openai,
+        "transcript": transcript,
+        "summary": "Patient booked. " * 5,
+        "cost": 0.12,
+        "costs": [{"type": "llm", "cost": 0.01, "promptTokens": i} for i in range(turns // 4 + 1)],
+        "costBreakdown": {"stt": 0.01, "llm": 0.02, "tts": 0.03, "total": 0.12},
+        "durationSeconds": turns * 6.0,
+        "customer": {"number": "+15551234567"},
+    }}
+
+
+def make_raw(turns: int, call_id: str = None) -> bytes:
+    return json.dumps(make_report(turns, call_id)).encode()
@@ -0,0 +1,38 @@
+import argparse
+import json
+import timeit
+
+from benchmarks.payloads import SIZES, make_raw
+from models.report import VapiCallReport
+from utils.report_decoder import decode_end_of_call
+
+# -------------------------------
+# End-of-call report decoding
+# -------------------------------
+# Time per decode of a /webhook body: plain json.loads, json.loads + the
+# VapiCallReport pydantic model (what the handler did before the fast
+# decoder), and utils.report_decoder.decode_end_of_call.
+# Usage: python -m benchmarks.report_decoder [--repeat 5]
+
+
+def per_call_us(fn, number: int, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main(repeat: int):
+    for name, turns in SIZES.items():
+        raw = make_raw(turns)
+        number = max(5, 3000 // turns)
+        plain = per_call_us(lambda: json.loads(raw), number, repeat)
+        model = per_call_us(lambda: VapiCallReport.model_validate(json.loads(raw)["message"]), number, repeat)
+        fast = per_call_us(lambda: decode_end_of_call(raw), number, repeat)
+        print(
+            f"{name:7s} {len(raw) / 1024:8.1f} KiB  json.loads {plain:9.1f} us  "
+            f"+ pydantic {model:9.1f} us  fast decoder {fast:9.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark end-of-call report decoding")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds (best is reported)")
+    main(parser.parse_args().repeat)
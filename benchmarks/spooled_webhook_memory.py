@@ -0,0 +1,85 @@
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.payloads import make_raw
+
+# -------------------------------
+# Peak memory of in-memory vs spooled /webhook bodies
+# -------------------------------
+# For each body size, decode + archive the report once from bytes (what a
+# small body goes through) and once from a spool file (bodies past
+# WEBHOOK_SPOOL_THRESHOLD_BYTES), each in a fresh process, and report the
+# increase of its peak RSS (VmHWM; Linux only).
+# Usage: python -m benchmarks.spooled_webhook_memory [--turns 1000 4000 16000 48000]
+
+CHUNK_BYTES = 64 * 1024
+
+
+def _peak_rss_kib() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM"):
+                return int(line.split()[1])
+    raise RuntimeError("VmHWM not available (Linux only)")
+
+
+def measure(mode: str, path: str):
+    """Runs in the child process: decode + archive one body and print the peak RSS increase."""
+    from services.call_log_archive import pack_archive, pack_archive_file, unpack_archive
+    from utils.report_decoder import decode_end_of_call, decode_end_of_call_file
+
+    gc.collect()
+    with open("/proc/self/clear_refs", "w") as refs:
+        refs.write("5")  # reset the peak to the current RSS
+    base = _peak_rss_kib()
+    if mode == "memory":
+        with open(path, "rb") as src:
+            raw = src.read()
+        report = decode_end_of_call(raw)
+        archive, _ = pack_archive(raw)
+    else:
+        spool = tempfile.TemporaryFile()
+        with open(path, "rb") as src:
+            for chunk in iter(lambda: src.read(CHUNK_BYTES), b""):
+                spool.write(chunk)
+        spool.flush()
+        report = decode_end_of_call_file(spool)
+        archive, _ = pack_archive_file(spool, report.size)
+    peak = (_peak_rss_kib() - base) / 1024
+    if mode == "spool":
+        with open(path, "rb") as src:
+            assert unpack_archive(archive) == src.read()
+    print(f"{peak:.1f}")
+
+
+def main(turns_list):
+    print(f"{'body':>9s} {'in-memory':>10s} {'spooled':>10s}  (peak RSS increase)")
+    for turns in turns_list:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as body:
+            body.write(make_raw(turns))
+        try:
+            peaks = [
+                subprocess.check_output(
+                    [sys.executable, "-m", "benchmarks.spooled_webhook_memory", "--measure", mode, body.name],
+                    text=True,
+                ).strip()
+                for mode in ("memory", "spool")
+            ]
+            print(f"{os.path.getsize(body.name) / 1e6:7.1f}MB {peaks[0]:>7s}MiB {peaks[1]:>7s}MiB")
+        finally:
+            os.unlink(body.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of in-memory vs spooled webhook bodies")
+    parser.add_argument("--turns", type=int, nargs="+", default=[1000, 4000, 16000, 48000])
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure)
+    else:
+        main(args.turns)
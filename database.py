@@ -5,23 +5,19 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from logging.handlers import RotatingFileHandler
-
-# --------------------------------
-# Logging Configuration
-# --------------------------------
-LOG_FILE = "app.log"
-
-logging.basicConfig(
-    level=logging.INFO,  # log INFO, WARNING, ERROR, CRITICAL
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=5),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger(__name__)
+from services.ingest_journal import ingest_journal, WEBHOOK_INGEST_MODE
+from services.webhook_service import WebhookService
+from services.batch_writer import BatchWriter
+from services.idempotency_service import IdempotencyService
+from services.appointment_service import AppointmentService
+from services.outbox_service import OutboxService, outbox_dispatcher
+from services.call_log_archive import CallLogArchive
+from services.export_service import ExportService
+from services.blind_index_service import BlindIndexService
+from services.admin_service import AdminService
+from services.chat_message_store import ChatMessageStore
+from services.search_index import SearchIndexService, search_index_worker
+from services.key_rotation import key_rotation
 
 # --------------------------------
 # Environment Variables
@@ -39,6 +35,34 @@ if not DB_NAME:
     logger.critical(" DB_NAME is not set in .env")
     raise ValueError(" DB_NAME is not set in .env")
 
+# --------------------------------
+# Indexes
+# --------------------------------
+async def ensure_indexes(db):
+    """
+    Create every collection's indexes. Most are only for speed and a failure is
+    logged; the appointment slot indexes are what prevents double bookings, so
+    startup is aborted if they cannot be created (e.g. duplicates already stored).
+    """
+    for name, create, required in (
+        ("webhook_events", IdempotencyService.ensure_indexes, False),
+        ("appointments", AppointmentService.ensure_indexes, True),
+        ("outbox", OutboxService.ensure_indexes, False),
+        ("callslog", CallLogArchive.ensure_indexes, False),
+        ("chats", ExportService.ensure_indexes, False),
+        ("blind indexes", BlindIndexService.ensure_indexes, False),
+        ("admin lists", AdminService.ensure_indexes, False),
+        ("chat_messages", ChatMessageStore.ensure_indexes, False),
+        ("search_postings", SearchIndexService.ensure_indexes, False),
+    ):
+        try:
+            await create(db)
+        except Exception as e:
+            if required:
+                logger.critical(f"Could not create indexes for {name}, refusing to start: {e}")
+                raise
+            logger.error(f"Could not create indexes for {name}: {e}")
+
 # --------------------------------
 # MongoDB Connection (Lifespan)
 # --------------------------------
@@ -48,11 +72,23 @@ async def lifespan(app: FastAPI):
         app.mongodb_client = AsyncIOMotorClient(MONGODB_URI)
         app.mongodb = app.mongodb_client[DB_NAME]
         logger.info(f"MongoDB connected to {DB_NAME}")
+        await ensure_indexes(app.mongodb)
+        await outbox_dispatcher.start(app.mongodb)
+        await search_index_worker.start(app.mongodb)
+        if WEBHOOK_INGEST_MODE == "journal":
+            await ingest_journal.start(
+                lambda raw: WebhookService.process_journaled_event(app.mongodb, raw)
+            )
         yield
     except Exception as e:
         logger.exception(f" MongoDB connection error: {e}")
         raise
     finally:
+        await key_rotation.stop()
+        await ingest_journal.stop()
+        await BatchWriter.flush_all()
+        await outbox_dispatcher.stop()
+        await search_index_worker.stop()
         app.mongodb_client.close()
         logger.warning(" MongoDB disconnected.")
 
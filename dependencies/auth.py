@@ -4,6 +4,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from services.admin_service import AdminService
+from services.principal_cache import principal_cache
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from database import get_database
 import os
@@ -21,8 +22,14 @@ async def get_current_admin_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get the current admin from JWT and verify existence."""
+    """Get the current admin from JWT and verify existence (cached per token until it expires)."""
     token = credentials.credentials
+    if principal_cache.is_revoked(token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    admin = principal_cache.get(token)
+    if admin is not None:
+        return admin
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
         username: str = payload.get("sub")
@@ -37,8 +44,19 @@ async def get_current_admin_user(
     if admin is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
 
+    principal_cache.put(token, payload.get("exp"), admin)
     return admin
 
+
+async def revoke_current_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token (logout); it is rejected from then on even before it expires."""
+    token = credentials.credentials
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    principal_cache.revoke(token, payload.get("exp"))
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -0,0 +1,61 @@
+# blind_index.py
+# Deterministic keyed hashes of contact fields, stored next to the (possibly
+# encrypted) value so equality lookups can use a Mongo index without the
+# plaintext. Same normalized input -> same hash; without the key the hash
+# reveals nothing beyond equality.
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import os
+import re
+
+from utils.formatters import correct_number
+
+# Must be set in .env: urlsafe base64 key (e.g. Fernet.generate_key()), separate
+# from the encryption keys because it must stay fixed when those rotate.
+# Changing it means rebuilding every index (scripts/backfill_blind_index.py --rebuild,
+# scripts/build_search_index.py --rebuild).
+BLIND_INDEX_KEY = os.getenv("BLIND_INDEX_KEY")
+
+if not BLIND_INDEX_KEY:
+    raise ValueError(
+        "❌ BLIND_INDEX_KEY not set in environment. Generate one with Fernet.generate_key(); "
+        "existing hashes then need python -m scripts.backfill_blind_index --rebuild "
+        "and python -m scripts.build_search_index --rebuild"
+    )
+
+_key = base64.urlsafe_b64decode(BLIND_INDEX_KEY)
+
+# 128 bits: no accidental collisions at our volumes
+_DIGEST_HEX_CHARS = 32
+_PHONE_NOISE = re.compile(r"[^\d+]")
+
+
+def normalize_email(email: str) -> Optional[str]:
+    if not email or not isinstance(email, str):
+        return None
+    return email.strip().lower() or None
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """correct_number() plus dropping spaces, dashes and brackets: '+44 (20) 7946-0000' -> '+442079460000'."""
+    if not phone or not isinstance(phone, str):
+        return None
+    return _PHONE_NOISE.sub("", correct_number(phone)) or None
+
+
+def blind_index(kind: str, normalized: Optional[str]) -> Optional[str]:
+    """HMAC-SHA256 of an already normalized value; `kind` keeps emails and phones in separate domains."""
+    if normalized is None:
+        return None
+    digest = hmac.new(_key, f"{kind}:{normalized}".encode(), hashlib.sha256).hexdigest()
+    return digest[:_DIGEST_HEX_CHARS]
+
+
+def email_index(email: str) -> Optional[str]:
+    return blind_index("email", normalize_email(email))
+
+
+def phone_index(phone: str) -> Optional[str]:
+    return blind_index("phone", normalize_phone(phone))
@@ -1,17 +1,41 @@
 # encryption.py
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from bson import Binary
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import hashlib
+import json
 import os
+import struct
+import time
+from typing import Iterable
 from dotenv import load_dotenv
+from utils import metrics
 load_dotenv()
 
 
 # Must be set in .env
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+# Optional key ring for rotation: comma-separated Fernet keys, newest first.
+# New data is encrypted with the first key; every key is accepted for decryption.
+ENCRYPTION_KEYS = [k.strip() for k in os.getenv("ENCRYPTION_KEYS", "").split(",") if k.strip()]
 
-if not ENCRYPTION_KEY:
+if not ENCRYPTION_KEYS and ENCRYPTION_KEY:
+    ENCRYPTION_KEYS = [ENCRYPTION_KEY]
+
+if not ENCRYPTION_KEYS:
     raise ValueError("❌ ENCRYPTION_KEY not set in environment. Generate one with Fernet.generate_key()")
 
-fernet = Fernet(ENCRYPTION_KEY.encode())
+_primary_fernet = Fernet(ENCRYPTION_KEYS[0].encode())
+fernet = MultiFernet([_primary_fernet] + [Fernet(k.encode()) for k in ENCRYPTION_KEYS[1:]])
+
+# Short public fingerprint of the current primary key (rotation checkpoints record it)
+PRIMARY_KEY_ID = hashlib.sha256(ENCRYPTION_KEYS[0].encode()).hexdigest()[:12]
 
 def encrypt_field(value: str) -> str:
     if value is None:
@@ -44,3 +68,201 @@ def safe_decrypt_field(encrypted_value: str) -> str:
     except Exception:
         # If it fails (e.g., it was already decrypted), just return the original value.
         return encrypted_value
+
+
+# ------- ENVELOPE ENCRYPTION -------
+# One AES-GCM data key per document, wrapped with a key-encryption key (KEK)
+# derived from ENCRYPTION_KEY. Layout of a sealed blob:
+#   magic(2) | version(1) | kek_id(4) | key_nonce(12) | wrapped_key(48) | data_nonce(12) | ciphertext+tag
+ENVELOPE_MAGIC = b"VE"
+ENVELOPE_VERSION = 1
+ENVELOPE_BINARY_SUBTYPE = 0x80  # BSON user-defined subtype, keeps Binary from decoding to bytes
+_ENVELOPE_HEADER = struct.Struct(">2sB4s")
+_NONCE_SIZE = 12
+_WRAPPED_KEY_SIZE = 32 + 16
+
+
+def _derive_kek(fernet_key: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"clinic-envelope-kek"
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+
+# Every key in the ring can unwrap data keys; seal() always wraps with the primary
+_keks = {}
+for _key in ENCRYPTION_KEYS:
+    _derived = _derive_kek(_key)
+    _keks[hashlib.sha256(_derived).digest()[:4]] = _derived
+_kek = _derive_kek(ENCRYPTION_KEYS[0])
+_kek_id = hashlib.sha256(_kek).digest()[:4]
+
+
+def seal(data: bytes) -> bytes:
+    """Encrypt bytes once with a fresh data key and return the versioned envelope."""
+    header = _ENVELOPE_HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, _kek_id)
+    data_key = AESGCM.generate_key(bit_length=256)
+    key_nonce = os.urandom(_NONCE_SIZE)
+    data_nonce = os.urandom(_NONCE_SIZE)
+    wrapped_key = AESGCM(_kek).encrypt(key_nonce, data_key, header)
+    ciphertext = AESGCM(data_key).encrypt(data_nonce, data, header)
+    return header + key_nonce + wrapped_key + data_nonce + ciphertext
+
+
+def seal_stream(chunks: Iterable[bytes]) -> bytes:
+    """
+    seal() for data produced chunk by chunk (e.g. a streaming compressor), so
+    the plaintext never has to be held whole. Output is readable by open_sealed().
+    """
+    header = _ENVELOPE_HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, _kek_id)
+    data_key = AESGCM.generate_key(bit_length=256)
+    key_nonce = os.urandom(_NONCE_SIZE)
+    data_nonce = os.urandom(_NONCE_SIZE)
+    wrapped_key = AESGCM(_kek).encrypt(key_nonce, data_key, header)
+
+    encryptor = Cipher(algorithms.AES(data_key), modes.GCM(data_nonce)).encryptor()
+    encryptor.authenticate_additional_data(header)
+    out = bytearray(header + key_nonce + wrapped_key + data_nonce)
+    for chunk in chunks:
+        out += encryptor.update(chunk)
+    out += encryptor.finalize()
+    out += encryptor.tag
+    return bytes(out)
+
+
+def open_sealed(blob: bytes) -> bytes:
+    """Decrypt an envelope produced by seal()."""
+    blob = bytes(blob)
+    magic, version, kek_id = _ENVELOPE_HEADER.unpack_from(blob)
+    if magic != ENVELOPE_MAGIC or version != ENVELOPE_VERSION:
+        raise ValueError("Unsupported envelope format")
+    kek = _keks.get(kek_id)
+    if kek is None:
+        raise ValueError("Envelope was sealed with an unknown key")
+    header = blob[:_ENVELOPE_HEADER.size]
+    pos = _ENVELOPE_HEADER.size
+    key_nonce = blob[pos:pos + _NONCE_SIZE]
+    pos += _NONCE_SIZE
+    wrapped_key = blob[pos:pos + _WRAPPED_KEY_SIZE]
+    pos += _WRAPPED_KEY_SIZE
+    data_nonce = blob[pos:pos + _NONCE_SIZE]
+    pos += _NONCE_SIZE
+    data_key = AESGCM(kek).decrypt(key_nonce, wrapped_key, header)
+    return AESGCM(data_key).decrypt(data_nonce, blob[pos:], header)
+
+
+def is_sealed(value) -> bool:
+    return isinstance(value, Binary) and value.subtype == ENVELOPE_BINARY_SUBTYPE
+
+
+def decrypt_document(value: Binary):
+    """Open a sealed JSON subtree (the `sealed` field of call logs written before the archive format)."""
+    return json.loads(open_sealed(value))
+
+
+# ------- KEY ROTATION -------
+_FERNET_TOKEN_PREFIX = "gAAAAA"  # base64 of the 0x80 version byte
+
+
+def rotate_field(value):
+    """
+    Re-encrypt a Fernet token under the primary key. Returns the new token, or
+    None when the value is not a token of ours or is already on the primary key.
+    """
+    if not isinstance(value, str) or not value.startswith(_FERNET_TOKEN_PREFIX):
+        return None
+    token = value.encode()
+    try:
+        _primary_fernet.extract_timestamp(token)  # HMAC check only, no decryption
+        return None
+    except InvalidToken:
+        pass
+    try:
+        return fernet.rotate(token).decode()
+    except InvalidToken:
+        return None
+
+
+def reseal(value: Binary):
+    """Re-seal an envelope under the primary KEK; None when it already uses it."""
+    _, _, kek_id = _ENVELOPE_HEADER.unpack_from(bytes(value[:_ENVELOPE_HEADER.size]))
+    if kek_id == _kek_id:
+        return None
+    return Binary(seal(open_sealed(value)), ENVELOPE_BINARY_SUBTYPE)
+
+
+def rotate_value(value):
+    """Rotate every Fernet token and sealed envelope inside a JSON-like value. Returns (value, changed)."""
+    if isinstance(value, str):
+        rotated = rotate_field(value)
+        return (rotated, True) if rotated is not None else (value, False)
+    if is_sealed(value):
+        rotated = reseal(value)
+        return (rotated, True) if rotated is not None else (value, False)
+    if isinstance(value, dict):
+        changed = False
+        result = {}
+        for key, item in value.items():
+            result[key], item_changed = rotate_value(item)
+            changed = changed or item_changed
+        return (result, True) if changed else (value, False)
+    if isinstance(value, list):
+        rotated = [rotate_value(item) for item in value]
+        if any(item_changed for _, item_changed in rotated):
+            return [item for item, _ in rotated], True
+        return value, False
+    return value, False
+
+
+# ------- ASYNC / OFFLOADED CRYPTO -------
+# Payloads at or above the threshold are encrypted/decrypted on a bounded
+# thread pool so one large call log cannot stall the event loop.
+CRYPTO_OFFLOAD_THRESHOLD_BYTES = int(os.getenv("CRYPTO_OFFLOAD_THRESHOLD_BYTES", 32 * 1024))
+CRYPTO_POOL_WORKERS = int(os.getenv("CRYPTO_POOL_WORKERS", 4))
+
+_crypto_pool = ThreadPoolExecutor(max_workers=CRYPTO_POOL_WORKERS, thread_name_prefix="crypto")
+
+
+def approx_size(value, depth: int = 4) -> int:
+    """Cheap size estimate of a JSON-like value (samples the first item of long lists)."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if depth <= 0:
+        return 64
+    if isinstance(value, dict):
+        return sum(len(k) + approx_size(v, depth - 1) for k, v in value.items())
+    if isinstance(value, list):
+        if not value:
+            return 2
+        return approx_size(value[0], depth - 1) * len(value)
+    return 8
+
+
+async def run_crypto(fn, *args, size: int = None):
+    """
+    Run a CPU-bound crypto function, offloading it to the crypto pool when
+    `size` (bytes, None = unknown) reaches CRYPTO_OFFLOAD_THRESHOLD_BYTES.
+    """
+    offload = size is None or size >= CRYPTO_OFFLOAD_THRESHOLD_BYTES
+    start = time.perf_counter()
+    try:
+        if offload:
+            return await asyncio.get_running_loop().run_in_executor(_crypto_pool, fn, *args)
+        return fn(*args)
+    finally:
+        metrics.observe(
+            "crypto_ms", (time.perf_counter() - start) * 1000,
+            op=getattr(fn, "__name__", "crypto"), offloaded=offload,
+        )
+        if size:
+            metrics.incr("crypto_bytes", size, op=getattr(fn, "__name__", "crypto"))
+
+
+def _encrypt_many(values):
+    return [encrypt_field(v) for v in values]
+
+
+async def encrypt_fields_async(values: list) -> list:
+    """Encrypt a batch of strings in one crypto call."""
+    size = sum(len(v) for v in values if isinstance(v, str))
+    return await run_crypto(_encrypt_many, values, size=size)
+
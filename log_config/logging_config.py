@@ -1,7 +1,13 @@
 from pathlib import Path
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 # Project root -> .../voicebot-service
 ROOT = Path(__file__).resolve().parent.parent
@@ -14,26 +20,171 @@ LOG_FILE = LOG_DIR / "app.log"
 
 FMT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Messages longer than this are cut before they are queued
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 4000))
+# Per-logger sampling of INFO/DEBUG records, e.g. "services.webhook_service=0.1,appointments=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Routes whose full request payloads may be dumped, e.g. "webhook,bookings" (off by default: PHI)
+LOG_PAYLOAD_ROUTES = os.getenv("LOG_PAYLOAD_ROUTES", "")
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 20000))
+
+_payload_routes = {r.strip() for r in LOG_PAYLOAD_ROUTES.split(",") if r.strip()}
+_listener = None
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _parse_rates(spec: str) -> dict:
+    rates = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, rate = part.split("=", 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO/DEBUG records per logger (prefix match). Warnings and errors always pass."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}
+
+    def _rate_for(self, name: str) -> float:
+        if name not in self._cache:
+            rate, best = 1.0, -1
+            for prefix, r in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    rate, best = r, len(prefix)
+            self._cache[name] = rate
+        return self._cache[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """
+    Queue the record without formatting it on the caller's thread.
+
+    Only the message is resolved (and truncated) here; JSON/text formatting and
+    disk I/O happen on the QueueListener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        msg = record.getMessage()
+        if len(msg) > LOG_MAX_MESSAGE_CHARS:
+            msg = msg[:LOG_MAX_MESSAGE_CHARS] + f"... [truncated {len(msg) - LOG_MAX_MESSAGE_CHARS} chars]"
+        record.msg = msg
+        record.args = None
+        if record.exc_info:
+            # Tracebacks cannot be pickled/shared safely; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def payload_debug_enabled(route: str) -> bool:
+    return route in _payload_routes or "*" in _payload_routes
+
+
+def payload_debug_routes() -> list:
+    return sorted(_payload_routes)
+
+
+def set_payload_debug(route: str, enabled: bool) -> None:
+    """Toggle full payload dumps for a route at runtime (this process only; see /admin/payload-debug)."""
+    if enabled:
+        _payload_routes.add(route)
+    else:
+        _payload_routes.discard(route)
+
+
+def log_payload(logger: logging.Logger, route: str, payload) -> None:
+    """Dump a request payload only when the route's debug switch is on."""
+    if not payload_debug_enabled(route):
+        return
+    if isinstance(payload, (bytes, bytearray)):
+        text = payload.decode("utf-8", errors="replace")
+    else:
+        text = json.dumps(payload, default=str)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + "..."
+    logger.info(f"Payload for {route}: {text}", extra={"route": route, "payload_debug": True})
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging() -> None:
+    global _listener
+
     # Clear any existing handlers (prevents duplicates with --reload)
     for h in logging.root.handlers[:]:
         logging.root.removeHandler(h)
+    _stop_listener()
 
     file_h = RotatingFileHandler(
         LOG_FILE, maxBytes=50*1024*1024, backupCount=5, encoding="utf-8"
     )
-    file_h.setFormatter(logging.Formatter(FMT))
+    file_h.setFormatter(JsonFormatter())
 
     console_h = logging.StreamHandler(sys.stdout)   # no emojis, safe on Windows
     console_h.setFormatter(logging.Formatter(FMT))
 
-    logging.basicConfig(level=logging.INFO, handlers=[file_h, console_h])
+    log_queue = queue.SimpleQueue()
+    queue_h = TruncatingQueueHandler(log_queue)
+    queue_h.addFilter(SamplingFilter(_parse_rates(LOG_SAMPLE_RATES)))
+
+    _listener = QueueListener(log_queue, file_h, console_h, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(_stop_listener)
+    atexit.register(_stop_listener)
+
+    logging.root.setLevel(LOG_LEVEL)
+    logging.root.addHandler(queue_h)
 
-    # Make uvicorn logs go to the same  handlers
+    # Make uvicorn logs go through the same pipeline
     for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
         l = logging.getLogger(name)
         l.setLevel(logging.INFO)
-        l.handlers = [file_h, console_h]
+        l.handlers = [queue_h]
         l.propagate = False
 
     logging.getLogger("log_setup").info(f"Logging to: {LOG_FILE}")
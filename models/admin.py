@@ -44,6 +44,12 @@ class UserCreate(BaseModel):
     password: str  # Plaintext, we'll hash it
     role: str = "admin"
 
+class AdminUpdate(BaseModel):
+    """Input model for changing an admin (only the given fields change)."""
+    email: Optional[EmailStr] = None
+    password: Optional[str] = None  # Plaintext, we'll hash it
+    role: Optional[str] = None
+
 class Token(BaseModel):
     """Response model for login (JWT)."""
     access_token: str
@@ -1,8 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from services.admin_service import AdminService
+from services.password_hasher import PasswordHasherBusy
+from models.admin import AdminUpdate
+from services.outbox_service import OutboxService
+from services.key_rotation import key_rotation
+from services.export_service import ExportService, EXPORT_KINDS
+from services.search_index import SearchIndexService, SOURCES
 from dependencies.auth import get_current_admin_user
 from database import get_database  # Adjust this import based on your project structure
+from utils import metrics
+from log_config.logging_config import payload_debug_routes, set_payload_debug
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Routes that call log_payload ("*" switches all of them)
+PAYLOAD_DEBUG_ROUTES = ("webhook", "bookings", "*")
 
 router = APIRouter(
     prefix="/admin",
@@ -14,13 +30,24 @@ router = APIRouter(
 @router.get("/call-logs")
 async def list_call_logs(
     limit: int = 100,
+    cursor: str = None,
+    email: str = None,
+    call_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
-    """Get a list of all call logs (just IDs and timestamps)."""
+    """
+    Get one page of call logs (just IDs and timestamps), newest first, optionally
+    filtered by email, call_id and a [start, end) receivedAt range. Pass the
+    returned next_cursor to get the following page.
+    """
     try:
-        call_logs = await AdminService.list_call_logs(db, limit)
+        call_logs = await AdminService.list_call_logs(db, limit, cursor, email, call_id, start, end)
         return call_logs
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error listing call logs: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while retrieving call logs")
@@ -29,12 +56,21 @@ async def list_call_logs(
 @router.get("/call-logs/{call_log_id}")
 async def get_call_log(
     call_log_id: str,
+    fields: str = None,
+    message_offset: int = None,
+    message_limit: int = Query(None, ge=1),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
-    """Get a specific call log with decrypted sensitive data."""
+    """
+    Get a specific call log with decrypted sensitive data.
+    `fields` (e.g. "call_id,body.message.summary") and message_offset/message_limit
+    restrict what is decrypted; the rest is returned as {"omitted": true}.
+    """
     try:
-        decrypted_log = await AdminService.get_decrypted_call_log(db, call_log_id)
+        decrypted_log = await AdminService.get_decrypted_call_log(
+            db, call_log_id, fields, message_offset, message_limit
+        )
         if decrypted_log is None:
             raise HTTPException(status_code=404, detail="Call log not found")
 
@@ -49,12 +85,19 @@ async def get_call_log(
 @router.get("/chats")
 async def list_chats(
     limit: int = 100,
+    cursor: str = None,
+    email: str = None,
+    start: datetime = None,
+    end: datetime = None,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
+    """One page of chats, most recently active first (email / updated_at range filters, next_cursor paging)."""
     try:
-        chats = await AdminService.list_chats(db, limit)
+        chats = await AdminService.list_chats(db, limit, cursor, email, start, end)
         return chats
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error listing chats: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while retrieving chats")
@@ -64,12 +107,15 @@ async def list_chats(
 @router.get("/chats/{chat_id}")
 async def get_chat(
     chat_id: str,
+    fields: str = None,
+    message_offset: int = None,
+    message_limit: int = Query(None, ge=1),
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
-    """Get a specific chat with decrypted message history + user email."""
+    """Get a specific chat with decrypted message history + user email (optionally only `fields` / a message range)."""
     try:
-        decrypted_chat = await AdminService.get_decrypted_chat(db, chat_id)
+        decrypted_chat = await AdminService.get_decrypted_chat(db, chat_id, fields, message_offset, message_limit)
         if decrypted_chat is None:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -84,13 +130,20 @@ async def get_chat(
 @router.get("/appointments")
 async def list_appointments(
     limit: int = 100,
+    cursor: str = None,
+    email: str = None,
+    call_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
-    """Get a list of all appointments (basic info without sensitive data)."""
+    """One page of appointments (basic info without sensitive data), latest appointment_time first."""
     try:
-        appointments = await AdminService.list_appointments(db, limit)
+        appointments = await AdminService.list_appointments(db, limit, cursor, email, call_id, start, end)
         return appointments
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error listing appointments: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while retrieving appointments")
@@ -99,12 +152,13 @@ async def list_appointments(
 @router.get("/appointments/{appointment_id}")
 async def get_appointment(
     appointment_id: str,
+    fields: str = None,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_admin: dict = Depends(get_current_admin_user)
 ):
-    """Get a specific appointment with decrypted sensitive data."""
+    """Get a specific appointment with decrypted sensitive data (optionally only `fields`)."""
     try:
-        decrypted_appointment = await AdminService.get_decrypted_appointment(db, appointment_id)
+        decrypted_appointment = await AdminService.get_decrypted_appointment(db, appointment_id, fields)
         if decrypted_appointment is None:
             raise HTTPException(status_code=404, detail="Appointment not found")
 
@@ -113,3 +167,216 @@ async def get_appointment(
     except Exception as e:
         print(f"Error decrypting appointment {appointment_id}: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while retrieving the appointment")
+
+
+# ========== EXPORT ENDPOINTS ==========
+@router.get("/export/{kind}")
+async def export_documents(
+    kind: str,
+    start: datetime = None,
+    end: datetime = None,
+    email: str = None,
+    call_id: str = None,
+    user_id: str = None,
+    fields: str = None,
+    message_offset: int = None,
+    message_limit: int = Query(None, ge=1),
+    gzip: bool = False,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """
+    Stream decrypted call_logs or chats as NDJSON, oldest first, for a date range
+    [start, end) and optional email / call_id / user_id filter. `fields` and the
+    message range work as on the single-document endpoints; gzip=true compresses.
+    """
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown export kind: {kind}")
+
+    query = ExportService.build_query(kind, start, end, email, call_id, user_id)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    filename = f"{kind}-{stamp}.ndjson" + (".gz" if gzip else "")
+    # Audit record: which filters were used, never their values (emails, ids)
+    logger.info(
+        "Admin export started",
+        extra={
+            "admin": current_admin.get("username"),
+            "kind": kind,
+            "filters": sorted(name for name, value in (
+                ("start", start), ("end", end), ("email", email), ("call_id", call_id), ("user_id", user_id),
+            ) if value is not None),
+            "fields": fields,
+            "message_range": message_offset is not None or message_limit is not None,
+            "gzip": gzip,
+        },
+    )
+    return StreamingResponse(
+        ExportService.stream(db, kind, query, fields, message_offset, message_limit, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ========== SEARCH ENDPOINTS ==========
+@router.get("/search")
+async def search_conversations(
+    q: str,
+    source: str = None,
+    limit: int = 20,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """
+    Keyword search over call transcripts and chat messages. Words are ANDed;
+    "quoted words" must appear together, word* matches by prefix. Returns ranked
+    call/chat ids with a snippet of the matching turn for each hit.
+    """
+    if source is not None and source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(SOURCES)}")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    try:
+        return await SearchIndexService.search(
+            db, q, sources=(source,) if source else SOURCES, limit=min(limit, 100)
+        )
+    except Exception as e:
+        print(f"Error searching conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+# ========== OUTBOX ENDPOINTS ==========
+@router.get("/outbox")
+async def list_outbox(
+    status: str = None,
+    limit: int = 100,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Get Make.com push counts per status and the pending/failed entries (payloads omitted)."""
+    try:
+        counts = await OutboxService.status_counts(db)
+        entries = await OutboxService.list_entries(db, status, limit)
+        return {"counts": counts, "entries": entries}
+    except Exception as e:
+        print(f"Error listing outbox: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while retrieving the outbox")
+
+
+@router.post("/outbox/{entry_id}/retry")
+async def retry_outbox_entry(
+    entry_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Requeue a dead-lettered push."""
+    if not await OutboxService.retry(db, entry_id):
+        raise HTTPException(status_code=404, detail="Dead outbox entry not found")
+    return {"status": "success", "detail": "Outbox entry requeued"}
+
+
+# ========== KEY ROTATION ENDPOINTS ==========
+@router.get("/key-rotation")
+async def get_key_rotation_status(
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Progress of the encryption-key rotation job (per collection checkpoint and counts)."""
+    try:
+        return await key_rotation.status(db)
+    except Exception as e:
+        print(f"Error reading key rotation status: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while retrieving the key rotation status")
+
+
+@router.post("/key-rotation/start")
+async def start_key_rotation(
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Start (or resume) re-encrypting stored data under the primary key of ENCRYPTION_KEYS."""
+    if not key_rotation.start(db):
+        raise HTTPException(status_code=409, detail="Key rotation is already running")
+    return {"status": "success", "detail": "Key rotation started"}
+
+
+@router.post("/key-rotation/stop")
+async def stop_key_rotation(current_admin: dict = Depends(get_current_admin_user)):
+    """Stop the rotation job; it resumes from its checkpoint on the next start."""
+    await key_rotation.stop()
+    return {"status": "success", "detail": "Key rotation stopped"}
+
+
+# ========== PAYLOAD DEBUG ENDPOINTS ==========
+@router.get("/payload-debug")
+async def get_payload_debug(current_admin: dict = Depends(get_current_admin_user)):
+    """Routes whose full request payloads are currently logged (in this worker)."""
+    return {"routes": payload_debug_routes()}
+
+
+@router.put("/payload-debug/{route}")
+async def update_payload_debug(
+    route: str,
+    enabled: bool,
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """
+    Switch full payload dumps for a route on or off at runtime. Payloads contain
+    PHI: turn it off again once done. Applies to the worker serving the request
+    (LOG_PAYLOAD_ROUTES sets the startup value for all workers).
+    """
+    if route not in PAYLOAD_DEBUG_ROUTES:
+        raise HTTPException(status_code=400, detail=f"route must be one of {', '.join(PAYLOAD_DEBUG_ROUTES)}")
+    set_payload_debug(route, enabled)
+    logger.warning(
+        "Payload debug logging changed",
+        extra={"admin": current_admin.get("username"), "route": route, "enabled": enabled},
+    )
+    return {"routes": payload_debug_routes()}
+
+
+# ========== ADMIN ACCOUNT ENDPOINTS ==========
+@router.patch("/admins/{username}")
+async def update_admin_account(
+    username: str,
+    update: AdminUpdate,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Change an admin's email, role or password; its cached sessions pick the change up at once."""
+    fields = update.dict(exclude_unset=True, exclude={"password"})
+    if update.password:
+        try:
+            fields["hashed_password"] = await AdminService.hash_password(update.password)
+        except PasswordHasherBusy as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields provided to update")
+    if not await AdminService.update_admin(db, username, fields):
+        raise HTTPException(status_code=404, detail="Admin not found")
+    logger.warning(
+        "Admin account changed",
+        extra={"admin": current_admin.get("username"), "target": username, "fields": sorted(fields)},
+    )
+    return {"status": "success", "detail": "Admin updated"}
+
+
+@router.delete("/admins/{username}")
+async def delete_admin_account(
+    username: str,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_admin: dict = Depends(get_current_admin_user)
+):
+    """Delete another admin; tokens it still holds stop working immediately."""
+    if username == current_admin.get("username"):
+        raise HTTPException(status_code=400, detail="You cannot delete your own account")
+    if not await AdminService.delete_admin(db, username):
+        raise HTTPException(status_code=404, detail="Admin not found")
+    logger.warning("Admin account deleted", extra={"admin": current_admin.get("username"), "target": username})
+    return {"status": "success", "detail": "Admin deleted"}
+
+
+# ========== METRICS ENDPOINT ==========
+@router.get("/metrics")
+async def get_service_metrics(current_admin: dict = Depends(get_current_admin_user)):
+    """Get in-process counters, timings and gauges (e.g. ingest journal lag)."""
+    return metrics.snapshot()
@@ -2,20 +2,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from dependencies.auth import create_access_token
+from dependencies.auth import create_access_token, revoke_current_token
 from database import get_database
 from models.admin import Token
-from passlib.context import CryptContext
 from services.admin_service import AdminService  # Import the actual service
+from services.password_hasher import PasswordHasherBusy
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
 )
 
-# password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 @router.post("/login", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -27,9 +24,12 @@ async def login_for_access_token(
     # Use the actual AdminService from services
     admin = await AdminService.get_admin_by_username(db, form_data.username)
 
-    if not admin or not AdminService.verify_password(
-        form_data.password, admin["hashed_password"]  # Changed from "password" to "hashed_password"
-    ):
+    try:
+        verified = admin is not None and await AdminService.verify_password(db, admin, form_data.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e), headers={"Retry-After": "1"})
+
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -38,4 +38,12 @@ async def login_for_access_token(
 
     # Use username instead of email for consistency
     access_token = create_access_token(data={"sub": admin["username"]})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post("/logout")
+async def logout(_: None = Depends(revoke_current_token)):
+    """
+    Logout endpoint: Revoke the bearer token used for this request.
+    """
+    return {"status": "success", "message": "Token revoked"}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request, HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from typing import List
 import logging
 
@@ -13,7 +14,10 @@ from models.clinic import (
 )
 from services.appointment_service import AppointmentService
 from services.webhook_service import WebhookService
+from services.ingest_journal import ingest_journal
 from utils.querybuilders import AppointmentQuery
+from utils.report_decoder import peek_event_type
+from utils.request_spool import read_body
 
 router = APIRouter()
 logger = logging.getLogger("appointments")
@@ -63,7 +67,11 @@ async def update_appointment(req: AppointmentUpdateRequest, request: Request):
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields provided for update")
 
-    updated = await AppointmentService.update_appointment(db, req.id, update_data)
+    try:
+        updated = await AppointmentService.update_appointment(db, req.id, update_data)
+    except DuplicateKeyError:
+        logger.warning("Appointment update conflicts with an existing booking", extra={"appointment_id": req.id})
+        raise HTTPException(**ERRORS["APPOINTMENT_EXISTS"])
     if not updated:
         logger.warning("Appointment not found for update", extra={"appointment_id": req.id})
         raise HTTPException(**ERRORS["APPOINTMENT_NOT_FOUND"])
@@ -87,9 +95,36 @@ async def delete_appointment(req: DeleteRequest, request: Request):
 @router.post("/webhook")
 async def handle_vapi_webhook(request: Request):
     db: AsyncIOMotorDatabase = await get_database(request)
-    body = await request.json()
+    if not ingest_journal.enabled:
+        # Inline mode: oversized bodies are spooled to disk and parsed incrementally
+        raw, spool = await read_body(request)
+        if spool is not None:
+            try:
+                return await WebhookService.dispatch_spooled_event(db, spool)
+            except Exception as e:
+                logger.exception("Error processing spooled webhook")
+                return AppointmentQuery.error(str(e), status="error")
+            finally:
+                spool.close()
+    else:
+        raw = await request.body()
+
+    # Pre-dispatch: read message.type from the raw bytes and drop ignored events immediately
+    event_type = peek_event_type(raw)
+    if not WebhookService.is_handled_event(event_type):
+        return WebhookService.ignored_event()
+
+    if ingest_journal.enabled:
+        # Ingest mode: make the raw body durable, acknowledge, and let the journal workers process it
+        try:
+            await ingest_journal.append(raw)
+            return AppointmentQuery.generic_success("Webhook accepted", {"status": "queued"})
+        except Exception as e:
+            logger.exception("Error journaling webhook")
+            return AppointmentQuery.error(str(e), status="error")
+
     try:
-        response = await WebhookService.handle_end_of_call(db, body)
+        response = await WebhookService.dispatch_event(db, raw, event_type)
         return response
     except Exception as e:
         logger.exception("Error processing webhook")
@@ -126,6 +161,16 @@ async def handle_vapi_tool_call(request: Request):
 async def get_appointments_by_email(email: str, request: Request):
     db: AsyncIOMotorDatabase = await get_database(request)
     appointments = await AppointmentService.get_appointments_by_email(db, email)
+    if not appointments:
+        raise HTTPException(**ERRORS["APPOINTMENT_NOT_FOUND"])
+    return [Appointment(**appt) for appt in appointments]
+
+
+# ---------------- Get appointment by patient phone ---------------- #
+@router.get("/appointments-by-phone", response_model=List[Appointment])
+async def get_appointments_by_phone(phone: str, request: Request):
+    db: AsyncIOMotorDatabase = await get_database(request)
+    appointments = await AppointmentService.get_appointments_by_phone(db, phone)
     if not appointments:
         raise HTTPException(**ERRORS["APPOINTMENT_NOT_FOUND"])
     return [Appointment(**appt) for appt in appointments]
\ No newline at end of file
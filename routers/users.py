@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from database import get_database
 from pydantic import BaseModel
-import bcrypt
+from services.password_hasher import password_hasher, PasswordHasherBusy
 
 router = APIRouter()
 
@@ -27,10 +27,13 @@ async def register_user(user: UserRegister, request: Request):
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed_pw = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt())
+    try:
+        hashed_pw = await password_hasher.hash(user.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     result = await users.insert_one({
         "email": user.email,
-        "password": hashed_pw.decode("utf-8")
+        "password": hashed_pw
     })
 
     return {"status": "success", "user_id": str(result.inserted_id)}
@@ -46,7 +49,11 @@ async def login_user(user: UserLogin, request: Request):
     if not db_user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
-    if not bcrypt.checkpw(user.password.encode("utf-8"), db_user["password"].encode("utf-8")):
+    try:
+        verified = await password_hasher.verify_and_upgrade(users, db_user, "password", user.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    if not verified:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     return {"status": "success", "user_id": str(db_user["_id"])}
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.blind_index_service import BLIND_INDEXES, BlindIndexService
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Blind index backfill
+# -------------------------------
+# Email/phone lookups go through the *_bidx hash fields, so documents written
+# before those fields existed are invisible to them until this has run.
+# Deploy (new writes get their hashes), then run this once; it only touches
+# documents that are missing a hash and can be re-run safely.
+# Usage: python -m scripts.backfill_blind_index [--collection appointments] [--rebuild]
+#   --rebuild  recompute every hash (after changing BLIND_INDEX_KEY)
+
+
+async def run(collections, rebuild: bool):
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    await BlindIndexService.ensure_indexes(db)
+    for collection in collections:
+        counts = await BlindIndexService.backfill(db, collection, rebuild=rebuild)
+        logger.info(f"{collection}: {counts}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill blind index (hash) fields for email/phone lookups")
+    parser.add_argument("--collection", choices=sorted(BLIND_INDEXES), help="only this collection")
+    parser.add_argument("--rebuild", action="store_true", help="recompute hashes that already exist")
+    args = parser.parse_args()
+    asyncio.run(run([args.collection] if args.collection else list(BLIND_INDEXES), args.rebuild))
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.admin_service import AdminService
+from services.search_index import SearchIndexService
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Search index backfill
+# -------------------------------
+# New call reports and chat messages are indexed as they arrive; call logs and
+# chats stored before search existed are not found until this has run. Only
+# documents without search_indexed are touched, and postings are unique, so it
+# can be interrupted and re-run (also next to live traffic).
+# Usage: python -m scripts.build_search_index [--source call|chat] [--concurrency 4] [--rebuild]
+#   --rebuild  drop the postings and index everything again (after changing BLIND_INDEX_KEY)
+
+BATCH_SIZE = 100
+
+
+async def backfill(db, collection: str, projection, index_one, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    last_id = None
+    indexed = 0
+    start = time.perf_counter()
+
+    async def index(document):
+        async with semaphore:
+            try:
+                await index_one(db, document)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to index {collection} {document['_id']}: {str(e)}")
+                return False
+
+    while True:
+        query = {"search_indexed": {"$ne": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query, projection).sort("_id", 1).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+        indexed += sum(await asyncio.gather(*(index(doc) for doc in batch)))
+        last_id = batch[-1]["_id"]
+        logger.info(
+            f"{collection}: indexed {indexed} documents "
+            f"({indexed / (time.perf_counter() - start):.1f} docs/s), last _id {last_id}"
+        )
+    return indexed
+
+
+async def run(sources, concurrency: int, rebuild: bool):
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    await SearchIndexService.ensure_indexes(db)
+    if rebuild:
+        for source, collection in (("call", "callslog"), ("chat", "chats")):
+            if source in sources:
+                deleted = await db.search_postings.delete_many({"source": source})
+                await db[collection].update_many({"search_indexed": True}, {"$unset": {"search_indexed": ""}})
+                logger.info(f"{collection}: dropped {deleted.deleted_count} postings")
+    if "call" in sources:
+        await backfill(db, "callslog", None, SearchIndexService.index_existing_call_log, concurrency)
+    if "chat" in sources:
+        await backfill(db, "chats", AdminService.chat_projection(), SearchIndexService.index_existing_chat, concurrency)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Index existing call logs and chats for admin search")
+    parser.add_argument("--source", choices=["call", "chat"], help="only call logs or only chats")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents indexed at the same time")
+    parser.add_argument("--rebuild", action="store_true", help="drop existing postings first")
+    args = parser.parse_args()
+    asyncio.run(run([args.source] if args.source else ["call", "chat"], args.concurrency, args.rebuild))
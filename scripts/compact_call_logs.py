@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from encrypt.encryption import run_crypto
+from services.admin_service import AdminService
+from services.call_log_archive import CallLogArchive
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Compact existing call logs
+# -------------------------------
+# Moves legacy callslog documents (inline `body`) to the archive format and
+# re-archives older archives so their assistant/botConfig snapshots are stored
+# once in config_snapshots. Safe to re-run; resumes from --after.
+# Usage: python -m scripts.compact_call_logs --batch-size 200 --concurrency 8
+
+PENDING_QUERY = {"$or": [
+    {"body": {"$exists": True}},
+    {"archive": {"$exists": True}, "archive.config_snapshots": {"$exists": False}},
+]}
+
+
+async def compact_legacy(db, doc: dict):
+    """Inline body -> archive + summary fields."""
+    body = await run_crypto(AdminService._decrypt_payload, doc["body"])
+    raw_size = len(json.dumps(body, separators=(",", ":"), default=str))
+    message = body.get("message") or {}
+    archive = await CallLogArchive.rewrite(db, doc["_id"], body, raw_size)
+    await db.callslog.update_one(
+        {"_id": doc["_id"]},
+        {
+            "$set": {
+                "event_type": message.get("type"),
+                "ended_reason": message.get("endedReason"),
+                "started_at": message.get("startedAt"),
+                "ended_at": message.get("endedAt"),
+                "archive": archive,
+            },
+            "$unset": {"body": ""},
+        },
+    )
+
+
+async def compact_archived(db, doc: dict):
+    """Archive written before config snapshots existed -> re-archive with hashes."""
+    body = await CallLogArchive.load_body(db, doc["_id"], restore_snapshots=False)
+    if body is None:
+        logger.warning(f"Call log {doc['_id']} has no archive document, skipping")
+        return
+    archive = await CallLogArchive.rewrite(db, doc["_id"], body, doc["archive"].get("raw_size", 0))
+    await db.callslog.update_one({"_id": doc["_id"]}, {"$set": {"archive": archive}})
+
+
+async def compact_one(db, doc: dict, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        try:
+            if isinstance(doc.get("body"), dict):
+                await compact_legacy(db, doc)
+            else:
+                await compact_archived(db, doc)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compact call log {doc['_id']}: {str(e)}")
+            return False
+
+
+async def run(batch_size: int, concurrency: int, after: str = None):
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    semaphore = asyncio.Semaphore(concurrency)
+    last_id = ObjectId(after) if after else None
+    done = failed = 0
+    start = time.perf_counter()
+
+    while True:
+        query = PENDING_QUERY if last_id is None else {"$and": [PENDING_QUERY, {"_id": {"$gt": last_id}}]}
+        batch = await db.callslog.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+
+        results = await asyncio.gather(*(compact_one(db, doc, semaphore) for doc in batch))
+        done += sum(results)
+        failed += len(results) - sum(results)
+        last_id = batch[-1]["_id"]
+        elapsed = time.perf_counter() - start
+        logger.info(f"Compacted {done} call logs ({failed} failed, {done / elapsed:.1f} docs/s), last _id {last_id}")
+
+    logger.info(f"Done: {done} compacted, {failed} failed")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compact callslog documents into the archive/snapshot format")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--after", help="resume after this callslog _id")
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.concurrency, args.after))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
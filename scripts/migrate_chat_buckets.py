@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.chat_message_store import ChatMessageStore
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Move chat messages to buckets
+# -------------------------------
+# Moves the inline `messages` array of every chat into chat_messages buckets
+# and sets message_count / last_message_at on the chat. Runs online: chats
+# appended to meanwhile are migrated by the append itself, and a chat is only
+# switched over if its array did not change while it was being copied.
+# Safe to re-run.
+# Usage: python -m scripts.migrate_chat_buckets --batch-size 200 --concurrency 4
+
+
+async def run(batch_size: int, concurrency: int):
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    await ChatMessageStore.ensure_indexes(db)
+    migrated = await ChatMessageStore.migrate_all(db, batch_size, concurrency)
+    logger.info(f"Done: {migrated} chats migrated")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Move inline chat messages into chat_messages buckets")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.concurrency))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.ingest_journal import INGEST_JOURNAL_DIR, replay_dead_letters
+from services.webhook_service import WebhookService
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Ingest journal dead letters
+# -------------------------------
+# Webhook bodies whose processing kept failing after the journal's retries
+# (e.g. a Mongo outage longer than the backoff) are kept in
+# <INGEST_JOURNAL_DIR>/dead-letter.log. Once the cause is fixed, run this to
+# process them again; handlers are idempotent, and bodies that still fail
+# stay in the file.
+# Usage: python -m scripts.replay_dead_letters [--dir journal]
+
+
+async def run(directory: str):
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    counts = await replay_dead_letters(directory, lambda raw: WebhookService.process_journaled_event(db, raw))
+    logger.info(f"Dead letters: {counts}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Re-process webhook bodies from the ingest journal's dead-letter file")
+    parser.add_argument("--dir", default=INGEST_JOURNAL_DIR, help="ingest journal directory")
+    args = parser.parse_args()
+    asyncio.run(run(args.dir))
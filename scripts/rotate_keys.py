@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.key_rotation import key_rotation
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Encryption key rotation
+# -------------------------------
+# 1. Put the new key first in ENCRYPTION_KEYS, keep the old ones after it, deploy.
+# 2. Run this job (or POST /admin/key-rotation/start); it resumes from its checkpoint.
+# 3. Once it reports completed with 0 conflicts, the old keys can be dropped.
+# Usage: python -m scripts.rotate_keys  (KEY_ROTATION_* env vars tune batch size, workers, rate)
+
+
+async def run():
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    await key_rotation.run(db)
+    logger.info(await key_rotation.status(db))
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+import argparse
+import logging
+import os
+
+import zstandard
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from services.call_log_archive import CALLSLOG_ARCHIVE_DICT_DIR, unpack_archive
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Train a zstd dictionary for callslog_archive
+# -------------------------------
+# Usage: python -m scripts.train_archive_dict --samples 2000 --size 112640
+# Then set CALLSLOG_ARCHIVE_DICT_ID to the printed id and deploy the .zdict file.
+
+
+def load_samples(db, limit: int) -> list:
+    """Original request bytes of the most recent archived call logs."""
+    samples = []
+    for archive in db.callslog_archive.find({}).sort("_id", -1).limit(limit):
+        try:
+            samples.append(unpack_archive(archive))
+        except Exception as e:
+            logger.warning(f"Skipping archive {archive['_id']}: {str(e)}")
+    return samples
+
+
+def train(samples: list, dict_size: int) -> zstandard.ZstdCompressionDict:
+    return zstandard.train_dictionary(dict_size, samples)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary from archived call reports")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=112 * 1024, help="dictionary size in bytes")
+    args = parser.parse_args()
+
+    db = MongoClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+    samples = load_samples(db, args.samples)
+    if len(samples) < 10:
+        raise SystemExit(f"Need at least 10 archived call logs to train a dictionary, found {len(samples)}")
+
+    dictionary = train(samples, args.size)
+    os.makedirs(CALLSLOG_ARCHIVE_DICT_DIR, exist_ok=True)
+    path = os.path.join(CALLSLOG_ARCHIVE_DICT_DIR, f"{dictionary.dict_id()}.zdict")
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    print(f"Trained dictionary {dictionary.dict_id()} from {len(samples)} samples -> {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,15 +1,39 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from encrypt.encryption import safe_decrypt_field
-from passlib.context import CryptContext
+from encrypt.encryption import safe_decrypt_field, is_sealed, decrypt_document, run_crypto, approx_size
+from services.call_log_archive import CallLogArchive
+from services.decrypted_cache import decrypted_cache
+from services.principal_cache import principal_cache
+from services.chat_message_store import ChatMessageStore
+from utils.field_selection import parse_fields, wants, select, omitted, mongo_slice
+from utils.report_normalizer import slice_conversation
+from utils.pagination import keyset_page, estimated_total
+from encrypt.blind_index import email_index
+from datetime import datetime
+from services.password_hasher import password_hasher
 import json
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ADMIN_LIST_MAX_LIMIT = 500
+
+# Collection -> (sort field of its admin list, equality filters that get a compound index)
+LIST_INDEXES = {
+    "callslog": ("receivedAt", ["email_bidx", "call_id"]),
+    "chats": ("updated_at", ["email_bidx"]),
+    "appointments": ("appointment_time", ["patient_email_bidx", "call_id"]),
+}
 
 
 class AdminService:
 
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        """(filter, sort desc, _id desc) indexes so every list page is one bounded index scan."""
+        for collection, (sort_field, filters) in LIST_INDEXES.items():
+            order = [(sort_field, -1), ("_id", -1)]
+            await db[collection].create_index(order, name=f"{collection}_list")
+            for field in filters:
+                await db[collection].create_index([(field, 1)] + order, name=f"{collection}_list_by_{field}")
+
     # ================== ADMIN METHODS ==================
     @staticmethod
     async def get_admin_by_username(db: AsyncIOMotorDatabase, username: str):
@@ -18,156 +42,287 @@ class AdminService:
         return admin_doc
 
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """Verify a plain password against a hashed password."""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def update_admin(db: AsyncIOMotorDatabase, username: str, fields: dict) -> bool:
+        """$set fields on an admin; its cached sessions re-resolve on their next request."""
+        result = await db.admins.update_one({"username": username}, {"$set": fields})
+        principal_cache.invalidate_admin(username)
+        if "username" in fields:
+            principal_cache.invalidate_admin(fields["username"])
+        return result.matched_count > 0
+
+    @staticmethod
+    async def delete_admin(db: AsyncIOMotorDatabase, username: str) -> bool:
+        """Delete an admin; tokens it still holds stop working immediately (in this process)."""
+        result = await db.admins.delete_one({"username": username})
+        principal_cache.invalidate_admin(username)
+        return result.deleted_count > 0
 
     @staticmethod
-    def hash_password(password: str) -> str:
+    async def verify_password(db: AsyncIOMotorDatabase, admin: dict, plain_password: str) -> bool:
+        """Verify an admin's password (upgrading a hash made with old parameters)."""
+        return await password_hasher.verify_and_upgrade(db.admins, admin, "hashed_password", plain_password)
+
+    @staticmethod
+    async def hash_password(password: str) -> str:
         """Hash a plain password."""
-        return pwd_context.hash(password)
+        return await password_hasher.hash(password)
 
     # ================== CALL LOG METHODS ==================
     @staticmethod
-    async def get_decrypted_call_log(db: AsyncIOMotorDatabase, call_log_id: str):
+    async def get_decrypted_call_log(
+        db: AsyncIOMotorDatabase, call_log_id: str, fields: str = None,
+        message_offset: int = None, message_limit: int = None,
+    ):
+        """
+        Call log with its decrypted body. `fields` (comma-separated dotted paths)
+        limits what is fetched and decrypted; everything else comes back as an
+        omitted marker. message_offset/message_limit select a range of turns.
+        """
         try:
             obj_id = ObjectId(call_log_id)
         except:
             return None
 
-        document = await db.callslog.find_one({"_id": obj_id})
+        variant = (fields, message_offset, message_limit)
+        cached = decrypted_cache.get("call_log", str(obj_id), variant)
+        if cached is not None:
+            return cached
+
+        paths = AdminService._with_id(parse_fields(fields))
+        document = await db.callslog.find_one({"_id": obj_id}, None if wants(paths, "body") else {"body": 0})
         if not document:
             return None
 
+        result = await AdminService.decrypt_call_log(db, document, paths, message_offset, message_limit)
+        decrypted_cache.put("call_log", str(obj_id), variant, result)
+        return result
+
+    @staticmethod
+    async def decrypt_call_log(
+        db: AsyncIOMotorDatabase, document: dict, paths=None,
+        message_offset: int = None, message_limit: int = None, archive: dict = None,
+    ) -> dict:
+        """
+        Decrypted, selected view of a fetched callslog document. `archive` is its
+        callslog_archive document when the caller already has it (bulk export).
+        """
         decrypted_document = document.copy()
-        if "body" in decrypted_document and isinstance(decrypted_document["body"], dict):
-            decrypted_document["body"] = AdminService._decrypt_payload(decrypted_document["body"])
+        if "archive" in decrypted_document:
+            if wants(paths, "body"):
+                # Archived format: the report is only decompressed when its body is asked for
+                restore = any(wants(paths, "body", "message", key) for key in ("assistant", "botConfig"))
+                if archive is not None:
+                    body = await CallLogArchive.open_body(db, archive, restore_snapshots=restore)
+                else:
+                    body = await CallLogArchive.load_body(db, document["_id"], restore_snapshots=restore)
+                if body is not None:
+                    decrypted_document["body"] = slice_conversation(body, message_offset, message_limit)
+            else:
+                decrypted_document["body"] = omitted(None)
+        elif "body" in decrypted_document and isinstance(decrypted_document["body"], dict):
+            body = decrypted_document["body"]
+            body = await run_crypto(AdminService._decrypt_payload, body, size=approx_size(body))
+            decrypted_document["body"] = slice_conversation(body, message_offset, message_limit)
 
-        return decrypted_document
+        return select(decrypted_document, paths)
 
     @staticmethod
-    async def list_call_logs(db: AsyncIOMotorDatabase, limit: int = 100):
-        cursor = (
-            db.callslog
-            .find({}, {"_id": 1, "receivedAt": 1, "email": 1})  # include email
-            .sort("receivedAt", -1)
-            .limit(limit)
+    async def list_call_logs(
+        db: AsyncIOMotorDatabase, limit: int = 100, cursor: str = None, email: str = None,
+        call_id: str = None, start: datetime = None, end: datetime = None,
+    ):
+        """Newest call logs first, one page at a time (pass back next_cursor for the next page)."""
+        query = AdminService._list_query(
+            "receivedAt", start, end, email_bidx=email_index(email) if email else None, call_id=call_id
         )
-        call_logs_list = await cursor.to_list(length=limit)
-        for log in call_logs_list:
-            log["_id"] = str(log["_id"])
-        return call_logs_list
+        projection = {"_id": 1, "receivedAt": 1, "email": 1}  # include email
+        return await AdminService._list_page(db.callslog, query, projection, "receivedAt", limit, cursor)
 
     # ================== CHAT METHODS ==================
     @staticmethod
-    async def get_decrypted_chat(db: AsyncIOMotorDatabase, chat_id: str):
+    async def get_decrypted_chat(
+        db: AsyncIOMotorDatabase, chat_id: str, fields: str = None,
+        message_offset: int = None, message_limit: int = None,
+    ):
+        """Chat with decrypted messages; only the selected fields and message range are fetched and decrypted."""
         try:
             obj_id = ObjectId(chat_id)
         except:
             return None
 
-        document = await db.chats.find_one(
-            {"_id": obj_id},
-            {
-                "_id": 1,
-                "user_id": 1,
-                "email": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "messages": 1,
-            },
-        )
+        variant = (fields, message_offset, message_limit)
+        cached = decrypted_cache.get("chat", str(obj_id), variant)
+        if cached is not None:
+            return cached
+
+        paths = AdminService._with_id(parse_fields(fields))
+        projection = AdminService.chat_projection(paths, message_offset, message_limit)
+        document = await db.chats.find_one({"_id": obj_id}, projection)
         if not document:
             return None
 
+        result = await AdminService.decrypt_chat(db, document, paths, message_offset, message_limit)
+        decrypted_cache.put("chat", str(obj_id), variant, result)
+        return result
+
+    @staticmethod
+    def chat_projection(paths=None, message_offset: int = None, message_limit: int = None) -> dict:
+        projection = {
+            "_id": 1,
+            "user_id": 1,
+            "email": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "message_count": 1,
+            "last_message_at": 1,
+        }
+        if wants(paths, "messages"):
+            # Only chats not yet moved to chat_messages still carry the array
+            message_range = mongo_slice(message_offset, message_limit)
+            projection["messages"] = 1 if message_range is None else {"$slice": message_range}
+        return projection
+
+    @staticmethod
+    async def decrypt_chat(
+        db: AsyncIOMotorDatabase, document: dict, paths=None,
+        message_offset: int = None, message_limit: int = None,
+    ) -> dict:
+        """
+        Decrypted, selected view of a fetched chat document. Bucketed messages are
+        read for the requested range; an inline (legacy) array is expected to be
+        range-projected already.
+        """
         decrypted_document = document.copy()
+        if "message_count" in decrypted_document and wants(paths, "messages"):
+            decrypted_document["messages"] = await ChatMessageStore.read(
+                db, document, message_offset, message_limit
+            )
         if "messages" in decrypted_document and isinstance(decrypted_document["messages"], list):
-            decrypted_messages = []
-            for encrypted_message in decrypted_document["messages"]:
-                decrypted_message_str = safe_decrypt_field(encrypted_message)
-                try:
-                    message_dict = json.loads(decrypted_message_str)
-                    decrypted_messages.append(message_dict)
-                except (json.JSONDecodeError, TypeError):
-                    decrypted_messages.append(decrypted_message_str)
-            decrypted_document["messages"] = decrypted_messages
-
-        return decrypted_document
-
-    @staticmethod
-    async def list_chats(db: AsyncIOMotorDatabase, limit: int = 100):
-        cursor = (
-            db.chats.find(
-                {},
-                {
-                    "_id": 1,
-                    "user_id": 1,
-                    "email": 1,  # ✅ include email
-                    "created_at": 1,
-                    "updated_at": 1,
-                    "message_count": {"$size": "$messages"},
-                },
+            messages = decrypted_document["messages"]
+            decrypted_document["messages"] = await run_crypto(
+                AdminService._decrypt_messages, messages,
+                size=sum(len(m) for m in messages if isinstance(m, str)),
             )
-            .sort("updated_at", -1)
-            .limit(limit)
-        )
+        elif not wants(paths, "messages"):
+            decrypted_document["messages"] = omitted(None)
+
+        return select(decrypted_document, paths)
 
-        chats_list = await cursor.to_list(length=limit)
-        for chat in chats_list:
-            chat["_id"] = str(chat["_id"])
-        return chats_list
+    @staticmethod
+    async def list_chats(
+        db: AsyncIOMotorDatabase, limit: int = 100, cursor: str = None, email: str = None,
+        start: datetime = None, end: datetime = None,
+    ):
+        """Most recently active chats first, one page at a time."""
+        query = AdminService._list_query("updated_at", start, end, email_bidx=email_index(email) if email else None)
+        projection = {
+            "_id": 1,
+            "user_id": 1,
+            "email": 1,  # ✅ include email
+            "created_at": 1,
+            "updated_at": 1,
+            "last_message_at": 1,
+            # Maintained counter; only chats not migrated to chat_messages yet fall back to $size
+            "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+        }
+        return await AdminService._list_page(db.chats, query, projection, "updated_at", limit, cursor)
 
     # ================== APPOINTMENT METHODS ==================
     @staticmethod
-    async def get_decrypted_appointment(db: AsyncIOMotorDatabase, appointment_id: str):
+    async def get_decrypted_appointment(db: AsyncIOMotorDatabase, appointment_id: str, fields: str = None):
         try:
             obj_id = ObjectId(appointment_id)
         except:
             return None
 
+        cached = decrypted_cache.get("appointment", str(obj_id), fields)
+        if cached is not None:
+            return cached
+
         document = await db.appointments.find_one({"_id": obj_id})
         if not document:
             return None
 
+        paths = AdminService._with_id(parse_fields(fields))
         decrypted_document = document.copy()
         sensitive_fields = ["patient_email", "patient_phone", "patient_address"]
         for field in sensitive_fields:
-            if field in decrypted_document:
+            if field in decrypted_document and wants(paths, field):
                 decrypted_document[field] = safe_decrypt_field(decrypted_document[field])
 
-        return decrypted_document
-
-    @staticmethod
-    async def list_appointments(db: AsyncIOMotorDatabase, limit: int = 100):
-        cursor = (
-            db.appointments.find(
-                {},
-                {
-                    "_id": 1,
-                    "patient_name": 1,
-                    "doctor_name": 1,
-                    "patient_email": 1,  
-                    "appointment_time": 1,
-                    "created_at": 1,
-                },
-            )
-            .sort("appointment_time", -1)
-            .limit(limit)
-        )
+        result = select(decrypted_document, paths)
+        decrypted_cache.put("appointment", str(obj_id), fields, result)
+        return result
 
-        appointments_list = await cursor.to_list(length=limit)
-        for appointment in appointments_list:
-            appointment["_id"] = str(appointment["_id"])
-        return appointments_list
+    @staticmethod
+    async def list_appointments(
+        db: AsyncIOMotorDatabase, limit: int = 100, cursor: str = None, email: str = None,
+        call_id: str = None, start: datetime = None, end: datetime = None,
+    ):
+        """Latest appointment times first, one page at a time."""
+        query = AdminService._list_query(
+            "appointment_time", start, end,
+            patient_email_bidx=email_index(email) if email else None, call_id=call_id,
+        )
+        projection = {
+            "_id": 1,
+            "patient_name": 1,
+            "doctor_name": 1,
+            "patient_email": 1,
+            "appointment_time": 1,
+            "created_at": 1,
+        }
+        return await AdminService._list_page(db.appointments, query, projection, "appointment_time", limit, cursor)
 
     # ================== HELPER METHODS ==================
+    @staticmethod
+    def _list_query(date_field: str, start: datetime = None, end: datetime = None, **equals) -> dict:
+        """Equality filters (None = not filtered) plus a [start, end) range on the list's sort field."""
+        query = {field: value for field, value in equals.items() if value is not None}
+        if start or end:
+            query[date_field] = {}
+            if start:
+                query[date_field]["$gte"] = start
+            if end:
+                query[date_field]["$lt"] = end
+        return query
+
+    @staticmethod
+    async def _list_page(collection, query: dict, projection: dict, sort_field: str, limit: int, cursor: str):
+        """{"items", "next_cursor", "estimated_total", "total_is_lower_bound"}; ValueError for a bad cursor."""
+        limit = max(1, min(limit, ADMIN_LIST_MAX_LIMIT))
+        items, next_cursor = await keyset_page(collection, query, projection, sort_field, limit, cursor)
+        for item in items:
+            item["_id"] = str(item["_id"])
+        return {"items": items, "next_cursor": next_cursor, **await estimated_total(collection, query)}
+
+    @staticmethod
+    def _with_id(paths):
+        """A field selection always keeps _id (the routers stringify it)."""
+        return paths if paths is None else paths + [("_id",)]
+
+    @staticmethod
+    def _decrypt_messages(encrypted_messages: list) -> list:
+        decrypted_messages = []
+        for encrypted_message in encrypted_messages:
+            decrypted_message_str = safe_decrypt_field(encrypted_message)
+            try:
+                message_dict = json.loads(decrypted_message_str)
+                decrypted_messages.append(message_dict)
+            except (json.JSONDecodeError, TypeError):
+                decrypted_messages.append(decrypted_message_str)
+        return decrypted_messages
+
     @staticmethod
     def _decrypt_payload(encrypted_payload: dict) -> dict:
         if not isinstance(encrypted_payload, dict):
             return encrypted_payload
 
         decrypted_dict = {}
+        sealed = encrypted_payload.get("sealed")
         for key, value in encrypted_payload.items():
+            if key == "sealed" and is_sealed(value):
+                continue
             if key in ["summary", "transcript", "content", "message", "costBreakdown"] and isinstance(value, str):
                 decrypted_value = safe_decrypt_field(value)
                 try:
@@ -181,4 +336,16 @@ class AdminService:
             else:
                 decrypted_dict[key] = value
 
+        # Envelope format: one sealed subtree holding every sensitive field
+        if is_sealed(sealed):
+            AdminService._merge_subtree(decrypted_dict, decrypt_document(sealed))
+
         return decrypted_dict
+
+    @staticmethod
+    def _merge_subtree(target: dict, subtree: dict) -> None:
+        for key, value in subtree.items():
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                AdminService._merge_subtree(target[key], value)
+            else:
+                target[key] = value
@@ -1,40 +1,43 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from models.clinic import Appointment
 from utils.querybuilders import AppointmentQuery
-from datetime import datetime
 from fastapi import HTTPException
+from services.decrypted_cache import decrypted_cache
+from services.blind_index_service import BlindIndexService
+from encrypt.blind_index import email_index, phone_index
+from encrypt.encryption import safe_decrypt_field
 
 
 class AppointmentService:
     """All database logic related to appointments."""
 
     @staticmethod
-    async def find_duplicate(
-        db: AsyncIOMotorDatabase,
-        patient_name: str,
-        doctor_name: str,
-        appointment_time: datetime,
-    ):
-        """Check if an appointment already exists for a patient or doctor at the same time."""
-        query = AppointmentQuery.duplicate_check(patient_name, doctor_name, appointment_time)
-        return await db.appointments.find_one(query)
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        """A doctor and a patient can each hold only one appointment per time slot."""
+        await db.appointments.create_index(
+            [("doctor_name", 1), ("appointment_time", 1)], unique=True, name="uniq_doctor_slot"
+        )
+        await db.appointments.create_index(
+            [("patient_name", 1), ("appointment_time", 1)], unique=True, name="uniq_patient_slot"
+        )
+        await db.appointments.create_index("call_id", name="appointments_call_id")
 
     @staticmethod
     async def create_appointment(db: AsyncIOMotorDatabase, appointment: Appointment):
-        """Create a new appointment in the database."""
-        # Check for duplicate
-        existing = await AppointmentService.find_duplicate(
-            db, appointment.patient_name, appointment.doctor_name, appointment.appointment_time
-        )
-        if existing:
-            return None
+        """
+        Create a new appointment in the database.
 
-        data = appointment.dict(by_alias=True, exclude={"id"})
-        result = await db.appointments.insert_one(data)
-        inserted = await db.appointments.find_one({"_id": result.inserted_id})
-        if inserted:
-            inserted["id"] = str(inserted["_id"])
-            del inserted["_id"]
+        Inserts optimistically and relies on the unique slot indexes; returns
+        None if the patient or doctor is already booked at that time.
+        """
+        data = BlindIndexService.with_index("appointments", appointment.dict(by_alias=True, exclude={"id"}))
+        try:
+            result = await db.appointments.insert_one(data)
+        except DuplicateKeyError:
+            return None
+        inserted = {k: v for k, v in data.items() if k != "_id"}
+        inserted["id"] = str(result.inserted_id)
         return inserted
 
     @staticmethod
@@ -63,12 +66,13 @@ class AppointmentService:
 
         result = await db.appointments.update_one(
             AppointmentQuery.by_id(appointment_id),
-            {"$set": update_data},
+            {"$set": BlindIndexService.with_index("appointments", update_data)},
         )
 
         if result.matched_count == 0:
             # no appointm   t with that id
             return None
+        decrypted_cache.invalidate("appointment", appointment_id)
 
         updated = await db.appointments.find_one(AppointmentQuery.by_id(appointment_id))
         if updated:
@@ -80,13 +84,28 @@ class AppointmentService:
     async def delete_appointment(db: AsyncIOMotorDatabase, appointment_id: str):
         """Delete an appointment by its ID."""
         result = await db.appointments.delete_one(AppointmentQuery.by_id(appointment_id))
+        decrypted_cache.invalidate("appointment", appointment_id)
         return result.deleted_count > 0
 
     @staticmethod
     async def get_appointments_by_email(db: AsyncIOMotorDatabase, email: str):
-        """Fetch appointments by patient_email"""
-        appointments = await db.appointments.find({"patient_email": email}).to_list(None)
+        """Fetch appointments by patient_email (through its blind index; works for encrypted emails)"""
+        return await AppointmentService._find_by_blind_index(db, "patient_email_bidx", email_index(email))
+
+    @staticmethod
+    async def get_appointments_by_phone(db: AsyncIOMotorDatabase, phone: str):
+        """Fetch appointments by patient_phone, normalized like correct_number (through its blind index)"""
+        return await AppointmentService._find_by_blind_index(db, "patient_phone_bidx", phone_index(phone))
+
+    @staticmethod
+    async def _find_by_blind_index(db: AsyncIOMotorDatabase, field: str, value: str):
+        if value is None:
+            return []
+        appointments = await db.appointments.find({field: value}).to_list(None)
         for appt in appointments:
             appt["id"] = str(appt["_id"])
             del appt["_id"]
+            for contact_field in ("patient_email", "patient_phone"):
+                if contact_field in appt:
+                    appt[contact_field] = safe_decrypt_field(appt[contact_field])
         return appointments
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, WriteError
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_WRITER_MAX_DOCS = int(os.getenv("BATCH_WRITER_MAX_DOCS", 100))
+BATCH_WRITER_MAX_DELAY_MS = int(os.getenv("BATCH_WRITER_MAX_DELAY_MS", 5))
+
+
+class BatchWriter:
+    """
+    Group-commit writer for a single collection.
+
+    Concurrent callers of insert() are gathered into one insert_many(ordered=False)
+    which is flushed when the batch is full or after max_delay_ms. Every caller
+    still gets its own result: the inserted _id, or the WriteError for its document.
+    """
+
+    _writers: Dict[Tuple[int, str], "BatchWriter"] = {}
+
+    def __init__(self, db: AsyncIOMotorDatabase, collection: str,
+                 max_docs: int = BATCH_WRITER_MAX_DOCS, max_delay_ms: int = BATCH_WRITER_MAX_DELAY_MS):
+        self.collection = db[collection]
+        self.name = collection
+        self.max_docs = max_docs
+        self.max_delay = max_delay_ms / 1000
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer = None
+        self._flushes = set()
+
+    @classmethod
+    def for_collection(cls, db: AsyncIOMotorDatabase, collection: str) -> "BatchWriter":
+        key = (id(db), collection)
+        writer = cls._writers.get(key)
+        if writer is None:
+            writer = cls._writers[key] = cls(db, collection)
+        return writer
+
+    @classmethod
+    async def flush_all(cls):
+        """Flush every writer (used on shutdown)."""
+        await asyncio.gather(*(w.flush() for w in cls._writers.values()), return_exceptions=True)
+
+    async def insert(self, document: dict):
+        """Queue a document and wait for its batch to be written. Returns the inserted _id."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_docs:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush)
+        return await future
+
+    async def flush(self):
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        documents = [doc for doc, _ in batch]
+        failed: Dict[int, Exception] = {}
+        start = time.perf_counter()
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = WriteError(err.get("errmsg"), err.get("code"), err)
+        except Exception as e:
+            logger.error(f"Batch insert into {self.name} failed for {len(batch)} documents: {str(e)}")
+            failed = {i: e for i in range(len(batch))}
+        finally:
+            metrics.observe("batch_writer_flush_ms", (time.perf_counter() - start) * 1000, collection=self.name)
+            metrics.observe("batch_writer_batch_size", len(batch), collection=self.name)
+
+        if failed:
+            metrics.incr("batch_writer_failed_docs", len(failed), collection=self.name)
+        for i, (doc, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(doc.get("_id"))
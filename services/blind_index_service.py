@@ -0,0 +1,102 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from typing import Optional
+import logging
+import os
+
+from encrypt.blind_index import email_index, phone_index
+from encrypt.encryption import safe_decrypt_field
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+BLIND_INDEX_BACKFILL_BATCH_SIZE = int(os.getenv("BLIND_INDEX_BACKFILL_BATCH_SIZE", 500))
+
+# Collection -> {source field: (blind index field, hash function)}
+BLIND_INDEXES = {
+    "appointments": {
+        "patient_email": ("patient_email_bidx", email_index),
+        "patient_phone": ("patient_phone_bidx", phone_index),
+    },
+    "call_starts": {"email": ("email_bidx", email_index)},
+    "callslog": {"email": ("email_bidx", email_index)},
+    "chats": {"email": ("email_bidx", email_index)},
+}
+
+
+class BlindIndexService:
+    """Keeps the *_bidx hash fields next to contact fields and backfills them."""
+
+    @staticmethod
+    def index_fields(collection: str, values: dict) -> dict:
+        """
+        {bidx field: hash} for every indexed source field present in `values`
+        (a new document or a $set). Values may already be Fernet tokens; a
+        source set to None clears its hash.
+        """
+        fields = {}
+        for source, (target, hash_fn) in BLIND_INDEXES[collection].items():
+            if source in values:
+                fields[target] = hash_fn(safe_decrypt_field(values[source]))
+        return fields
+
+    @staticmethod
+    def with_index(collection: str, document: dict) -> dict:
+        """`document` plus its blind index fields (for inserts and $set updates)."""
+        return {**document, **BlindIndexService.index_fields(collection, document)}
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        for collection, fields in BLIND_INDEXES.items():
+            for target, _ in fields.values():
+                await db[collection].create_index(target, name=f"{collection}_{target}", sparse=True)
+
+    @staticmethod
+    async def backfill(db: AsyncIOMotorDatabase, collection: str, rebuild: bool = False) -> dict:
+        """
+        Hash every document of `collection` that lacks an index field (or all of
+        them with rebuild=True, e.g. after changing BLIND_INDEX_KEY). Walks in
+        _id order and only writes if the source value is unchanged, so it is
+        safe to run next to live traffic and to re-run after an interruption.
+        """
+        sources = BLIND_INDEXES[collection]
+        if rebuild:
+            base_query = {}
+        else:
+            base_query = {"$or": [
+                {source: {"$nin": [None, ""]}, target: {"$exists": False}}
+                for source, (target, _) in sources.items()
+            ]}
+        projection = {source: 1 for source in sources}
+        counts = {"scanned": 0, "updated": 0, "conflicts": 0}
+        last_id: Optional[object] = None
+
+        while True:
+            query = dict(base_query)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await db[collection].find(query, projection).sort("_id", 1).to_list(
+                length=BLIND_INDEX_BACKFILL_BATCH_SIZE
+            )
+            if not batch:
+                break
+
+            updates = []
+            for doc in batch:
+                present = {source: doc[source] for source in sources if source in doc}
+                if present:
+                    updates.append(UpdateOne(
+                        {"_id": doc["_id"], **present},
+                        {"$set": BlindIndexService.index_fields(collection, present)},
+                    ))
+            if updates:
+                result = await db[collection].bulk_write(updates, ordered=False)
+                counts["updated"] += result.matched_count
+                counts["conflicts"] += len(updates) - result.matched_count
+
+            counts["scanned"] += len(batch)
+            last_id = batch[-1]["_id"]
+            metrics.incr("blind_index_backfill_docs", len(batch), collection=collection)
+
+        logger.info(f"Blind index backfill of {collection}: {counts}")
+        return counts
@@ -0,0 +1,253 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import Binary
+from typing import Optional
+import json
+import logging
+import os
+import zlib
+
+from encrypt.encryption import seal, seal_stream, open_sealed, run_crypto, ENVELOPE_BINARY_SUBTYPE
+from services.batch_writer import BatchWriter
+from services.decrypted_cache import decrypted_cache
+from services.config_snapshot_service import ConfigSnapshotService, extract_snapshots
+from utils import metrics
+from utils.report_normalizer import normalize_report, denormalize_report
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zlib is used instead
+    zstandard = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speedup
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+# "zstd" (needs the zstandard package) or "zlib"
+CALLSLOG_ARCHIVE_CODEC = os.getenv("CALLSLOG_ARCHIVE_CODEC", "zstd")
+CALLSLOG_ARCHIVE_ZSTD_LEVEL = int(os.getenv("CALLSLOG_ARCHIVE_ZSTD_LEVEL", 9))
+CALLSLOG_ARCHIVE_ZLIB_LEVEL = int(os.getenv("CALLSLOG_ARCHIVE_ZLIB_LEVEL", 6))
+# Trained zstd dictionaries live in this directory as <dict_id>.zdict; new
+# archives are compressed with CALLSLOG_ARCHIVE_DICT_ID, older ones keep
+# decompressing with whichever dictionary they were written with.
+CALLSLOG_ARCHIVE_DICT_DIR = os.getenv("CALLSLOG_ARCHIVE_DICT_DIR", "archive_dicts")
+CALLSLOG_ARCHIVE_DICT_ID = int(os.getenv("CALLSLOG_ARCHIVE_DICT_ID", 0)) or None
+# Store one canonical conversation instead of every redundant view of it
+CALLSLOG_ARCHIVE_NORMALIZE = os.getenv("CALLSLOG_ARCHIVE_NORMALIZE", "true").lower() == "true"
+# Read size when streaming a spooled body through the compressor
+CALLSLOG_ARCHIVE_CHUNK_BYTES = int(os.getenv("CALLSLOG_ARCHIVE_CHUNK_BYTES", 256 * 1024))
+
+FORMAT_RAW = "raw"
+FORMAT_NORMALIZED = "normalized"
+
+
+def _load_dictionaries() -> dict:
+    dictionaries = {}
+    if zstandard is None or not os.path.isdir(CALLSLOG_ARCHIVE_DICT_DIR):
+        return dictionaries
+    for name in os.listdir(CALLSLOG_ARCHIVE_DICT_DIR):
+        if not name.endswith(".zdict"):
+            continue
+        with open(os.path.join(CALLSLOG_ARCHIVE_DICT_DIR, name), "rb") as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        dictionaries[dictionary.dict_id()] = dictionary
+    return dictionaries
+
+
+_dictionaries = _load_dictionaries()
+
+if CALLSLOG_ARCHIVE_CODEC == "zstd" and zstandard is None:
+    logger.warning("zstandard is not installed, call log archives fall back to zlib")
+if CALLSLOG_ARCHIVE_DICT_ID and CALLSLOG_ARCHIVE_DICT_ID not in _dictionaries:
+    logger.warning(f"Archive dictionary {CALLSLOG_ARCHIVE_DICT_ID} not found in {CALLSLOG_ARCHIVE_DICT_DIR}")
+
+
+def compress_payload(raw: bytes):
+    """Compress raw bytes with the configured codec. Returns (codec, dict_id, data)."""
+    if CALLSLOG_ARCHIVE_CODEC == "zstd" and zstandard is not None:
+        dictionary = _dictionaries.get(CALLSLOG_ARCHIVE_DICT_ID)
+        compressor = zstandard.ZstdCompressor(level=CALLSLOG_ARCHIVE_ZSTD_LEVEL, dict_data=dictionary)
+        return "zstd", dictionary.dict_id() if dictionary else None, compressor.compress(raw)
+    return "zlib", None, zlib.compress(raw, CALLSLOG_ARCHIVE_ZLIB_LEVEL)
+
+
+def _compressobj(size: int):
+    """Streaming compress_payload. Returns (codec, dict_id, compressor)."""
+    if CALLSLOG_ARCHIVE_CODEC == "zstd" and zstandard is not None:
+        dictionary = _dictionaries.get(CALLSLOG_ARCHIVE_DICT_ID)
+        compressor = zstandard.ZstdCompressor(level=CALLSLOG_ARCHIVE_ZSTD_LEVEL, dict_data=dictionary)
+        # size goes into the frame header so decompress_payload can decode it in one call
+        return "zstd", dictionary.dict_id() if dictionary else None, compressor.compressobj(size=size)
+    return "zlib", None, zlib.compressobj(CALLSLOG_ARCHIVE_ZLIB_LEVEL)
+
+
+def decompress_payload(codec: str, dict_id: Optional[int], data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this call log archive")
+        dictionary = None
+        if dict_id:
+            dictionary = _dictionaries.get(dict_id)
+            if dictionary is None:
+                raise RuntimeError(f"Archive dictionary {dict_id} is not available")
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+    raise ValueError(f"Unknown archive codec {codec}")
+
+
+def _loads(data: bytes):
+    return msgspec.json.decode(data) if msgspec is not None else json.loads(data)
+
+
+def _dumps(value) -> bytes:
+    if msgspec is not None:
+        return msgspec.json.encode(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _seal(payload: bytes, fmt: str, raw_size: int) -> dict:
+    codec, dict_id, compressed = compress_payload(payload)
+    return {
+        "format": fmt,
+        "codec": codec,
+        "dict_id": dict_id,
+        "raw_size": raw_size,
+        "blob": Binary(seal(compressed), ENVELOPE_BINARY_SUBTYPE),
+    }
+
+
+def pack_body(body: dict, raw_size: int):
+    """
+    Normalize a decoded call report, swap its config snapshots for hashes,
+    then compress and seal it. Returns (archive fields, extracted snapshots).
+    """
+    normalize_report(body)
+    snapshots = extract_snapshots(body)
+    return _seal(_dumps(body), FORMAT_NORMALIZED, raw_size), snapshots
+
+
+def pack_archive(raw: bytes):
+    """pack_body for a raw webhook body; stores the bytes untouched when normalization is off or fails."""
+    if CALLSLOG_ARCHIVE_NORMALIZE:
+        try:
+            body = _loads(raw)
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            return pack_body(body, len(raw))
+    return _seal(raw, FORMAT_RAW, len(raw)), {}
+
+
+def pack_archive_file(spool, size: int):
+    """
+    pack_archive for a body spooled to disk: the file is streamed through the
+    compressor and the AES-GCM encryptor chunk by chunk, so only the compressed
+    blob is ever held in memory. Stored as-is (no normalization or snapshots).
+    """
+    codec, dict_id, compressor = _compressobj(size)
+
+    def compressed_chunks():
+        spool.seek(0)
+        while True:
+            block = spool.read(CALLSLOG_ARCHIVE_CHUNK_BYTES)
+            if not block:
+                break
+            out = compressor.compress(block)
+            if out:
+                yield out
+        yield compressor.flush()
+
+    archive = {
+        "format": FORMAT_RAW,
+        "codec": codec,
+        "dict_id": dict_id,
+        "raw_size": size,
+        "blob": Binary(seal_stream(compressed_chunks()), ENVELOPE_BINARY_SUBTYPE),
+    }
+    return archive, {}
+
+
+def unpack_archive(archive: dict) -> bytes:
+    """Stored payload bytes (normalized JSON for the normalized format)."""
+    return decompress_payload(archive["codec"], archive.get("dict_id"), open_sealed(archive["blob"]))
+
+
+def unpack_body(archive: dict) -> dict:
+    """The call report with every conversation view rebuilt (snapshots still as hashes)."""
+    body = _loads(unpack_archive(archive))
+    if archive.get("format") == FORMAT_NORMALIZED:
+        denormalize_report(body)
+    return body
+
+
+class CallLogArchive:
+    """
+    VAPI request body of each call log, normalized, compressed and sealed as
+    one blob (collection: callslog_archive, _id shared with the callslog summary).
+    """
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        # Summary documents are what the admin list and lookups hit
+        await db.callslog.create_index([("receivedAt", -1)], name="callslog_received_at")
+        await db.callslog.create_index("call_id", name="callslog_call_id")
+
+    @staticmethod
+    async def _save(db: AsyncIOMotorDatabase, call_log_id, archive: dict, snapshots: dict, replace: bool) -> dict:
+        # Snapshots first, so an archive never references a hash that is not stored yet
+        await ConfigSnapshotService.put_many(db, snapshots)
+        if replace:
+            await db.callslog_archive.replace_one({"_id": call_log_id}, archive, upsert=True)
+        else:
+            await BatchWriter.for_collection(db, "callslog_archive").insert({"_id": call_log_id, **archive})
+
+        stored_size = len(archive["blob"])
+        metrics.incr("callslog_archive_raw_bytes", archive["raw_size"], codec=archive["codec"])
+        metrics.incr("callslog_archive_stored_bytes", stored_size, codec=archive["codec"])
+        return {
+            "format": archive["format"],
+            "codec": archive["codec"],
+            "dict_id": archive["dict_id"],
+            "raw_size": archive["raw_size"],
+            "stored_size": stored_size,
+            "config_snapshots": {kind: digest for kind, (digest, _) in snapshots.items()},
+        }
+
+    @staticmethod
+    async def store(db: AsyncIOMotorDatabase, call_log_id, raw: bytes) -> dict:
+        """Archive raw under call_log_id and return the archive info kept on the summary."""
+        archive, snapshots = await run_crypto(pack_archive, raw, size=len(raw))
+        return await CallLogArchive._save(db, call_log_id, archive, snapshots, replace=False)
+
+    @staticmethod
+    async def store_file(db: AsyncIOMotorDatabase, call_log_id, spool, size: int) -> dict:
+        """store() for a body spooled to disk."""
+        archive, snapshots = await run_crypto(pack_archive_file, spool, size, size=size)
+        return await CallLogArchive._save(db, call_log_id, archive, snapshots, replace=False)
+
+    @staticmethod
+    async def rewrite(db: AsyncIOMotorDatabase, call_log_id, body: dict, raw_size: int) -> dict:
+        """Re-archive an already decoded report under an existing call log (used by migrations)."""
+        archive, snapshots = await run_crypto(pack_body, body, raw_size, size=raw_size)
+        info = await CallLogArchive._save(db, call_log_id, archive, snapshots, replace=True)
+        decrypted_cache.invalidate("call_log", call_log_id)
+        return info
+
+    @staticmethod
+    async def load_body(db: AsyncIOMotorDatabase, call_log_id, restore_snapshots: bool = True) -> Optional[dict]:
+        """Decoded call report of a call log, or None when it has no archive."""
+        archive = await db.callslog_archive.find_one({"_id": call_log_id})
+        if not archive:
+            return None
+        return await CallLogArchive.open_body(db, archive, restore_snapshots)
+
+    @staticmethod
+    async def open_body(db: AsyncIOMotorDatabase, archive: dict, restore_snapshots: bool = True) -> dict:
+        """Decoded call report of an already fetched callslog_archive document."""
+        body = await run_crypto(unpack_body, archive, size=archive.get("raw_size"))
+        if restore_snapshots:
+            await ConfigSnapshotService.restore(db, body)
+        return body
@@ -0,0 +1,181 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from datetime import datetime
+from itertools import groupby
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from utils import metrics
+from utils.field_selection import slice_list
+
+logger = logging.getLogger(__name__)
+
+# Messages per chat_messages document; positions p go to bucket p // CHAT_BUCKET_SIZE
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", 100))
+# Legacy chats whose `messages` array keeps growing under an old writer are retried this often
+CHAT_MIGRATION_ATTEMPTS = 3
+
+
+class ChatMessageStore:
+    """
+    Encrypted chat messages in fixed-size buckets (collection: chat_messages).
+
+    The parent `chats` document keeps message_count and last_message_at; each
+    bucket is {chat_ref, seq, messages: [{"n": position, "m": token}, ...]}.
+    Appends reserve positions with $inc on message_count, so concurrent appends
+    never collide, and a message range touches only the buckets covering it.
+    Chats written before buckets existed keep an inline `messages` array until
+    migrate_chat moves them (on their next append, or via the migration script).
+    """
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        await db.chat_messages.create_index([("chat_ref", 1), ("seq", 1)], unique=True, name="chat_messages_bucket")
+
+    # ---------- WRITES ----------
+    @staticmethod
+    async def create(db: AsyncIOMotorDatabase, chat: dict, encrypted_messages: List[str], now: datetime) -> ObjectId:
+        """Insert a new parent chat document with its first messages."""
+        chat = {**chat, "message_count": len(encrypted_messages), "last_message_at": now}
+        result = await db.chats.insert_one(chat)
+        await ChatMessageStore._write(db, result.inserted_id, 0, encrypted_messages, now)
+        return result.inserted_id
+
+    @staticmethod
+    async def append(
+        db: AsyncIOMotorDatabase, chat_ref: ObjectId, encrypted_messages: List[str], now: datetime, fields: dict = None,
+    ) -> Optional[int]:
+        """
+        Append messages to a chat (and $set `fields` on the parent in the same update).
+        Returns the position of the first appended message, None if the chat is gone.
+        """
+        await ChatMessageStore.migrate_chat(db, chat_ref)
+        parent = await db.chats.find_one_and_update(
+            {"_id": chat_ref},
+            {
+                "$inc": {"message_count": len(encrypted_messages)},
+                "$set": {**(fields or {}), "last_message_at": now},
+            },
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if parent is None:
+            return None
+        first = parent["message_count"] - len(encrypted_messages)
+        await ChatMessageStore._write(db, chat_ref, first, encrypted_messages, now)
+        return first
+
+    @staticmethod
+    async def _write(db: AsyncIOMotorDatabase, chat_ref: ObjectId, first: int, encrypted_messages: List[str], now: datetime):
+        items = [{"n": first + i, "m": message} for i, message in enumerate(encrypted_messages)]
+        for seq, bucket_items in groupby(items, key=lambda item: item["n"] // CHAT_BUCKET_SIZE):
+            update = {"$push": {"messages": {"$each": list(bucket_items)}}, "$setOnInsert": {"created_at": now}}
+            try:
+                await db.chat_messages.update_one({"chat_ref": chat_ref, "seq": seq}, update, upsert=True)
+            except DuplicateKeyError:
+                # Another append created the bucket between our match and insert
+                await db.chat_messages.update_one({"chat_ref": chat_ref, "seq": seq}, update)
+
+    # ---------- READS ----------
+    @staticmethod
+    async def read(
+        db: AsyncIOMotorDatabase, chat: dict, message_offset: int = None, message_limit: int = None,
+    ) -> List[str]:
+        """
+        Encrypted messages of a chat in order, limited to a message range (same
+        semantics as field_selection.slice_list). `chat` needs _id and
+        message_count, or the inline `messages` of a chat not migrated yet.
+        """
+        if "messages" in chat:
+            return slice_list(chat["messages"], message_offset, message_limit)
+
+        positions = slice_list(range(chat.get("message_count") or 0), message_offset, message_limit)
+        if not positions:
+            return []
+        query = {"chat_ref": chat["_id"]}
+        first_seq, last_seq = positions[0] // CHAT_BUCKET_SIZE, positions[-1] // CHAT_BUCKET_SIZE
+        query["seq"] = first_seq if first_seq == last_seq else {"$gte": first_seq, "$lte": last_seq}
+        buckets = await db.chat_messages.find(query, {"messages": 1}).to_list(length=None)
+
+        wanted = {}
+        for bucket in buckets:
+            for item in bucket["messages"]:
+                if positions.start <= item["n"] < positions.stop:
+                    wanted[item["n"]] = item["m"]
+        return [wanted[n] for n in sorted(wanted)]
+
+    # ---------- MIGRATION ----------
+    @staticmethod
+    async def migrate_chat(db: AsyncIOMotorDatabase, chat_ref: ObjectId) -> bool:
+        """
+        Move a legacy inline `messages` array into buckets. Idempotent: bucket
+        items are merged in, and the array is only removed if it has not grown
+        in the meantime. Returns True when the chat was migrated by this call.
+        """
+        for _ in range(CHAT_MIGRATION_ATTEMPTS):
+            chat = await db.chats.find_one(
+                {"_id": chat_ref, "messages": {"$exists": True}}, {"messages": 1, "updated_at": 1}
+            )
+            if chat is None:
+                return False
+            unchanged = {"$size": len(chat["messages"])} if isinstance(chat["messages"], list) else None
+            messages = chat["messages"] or []
+            now = datetime.utcnow()
+            for seq in range(0, (len(messages) + CHAT_BUCKET_SIZE - 1) // CHAT_BUCKET_SIZE):
+                start = seq * CHAT_BUCKET_SIZE
+                items = [{"n": start + i, "m": m} for i, m in enumerate(messages[start:start + CHAT_BUCKET_SIZE])]
+                await db.chat_messages.update_one(
+                    {"chat_ref": chat_ref, "seq": seq},
+                    # $addToSet, not $set: never drops a message appended by a writer that migrated first
+                    {"$addToSet": {"messages": {"$each": items}}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                )
+            result = await db.chats.update_one(
+                {"_id": chat_ref, "messages": unchanged},
+                {
+                    "$unset": {"messages": ""},
+                    "$set": {"message_count": len(messages), "last_message_at": chat.get("updated_at")},
+                },
+            )
+            if result.modified_count:
+                metrics.incr("chat_bucket_migrations")
+                return True
+        logger.warning(f"Chat {chat_ref} kept changing during migration; left inline for now")
+        return False
+
+    @staticmethod
+    async def migrate_all(db: AsyncIOMotorDatabase, batch_size: int = 200, concurrency: int = 4) -> int:
+        """Migrate every legacy chat, batch by batch in _id order (safe next to live traffic)."""
+        semaphore = asyncio.Semaphore(concurrency)
+        last_id: Optional[ObjectId] = None
+        migrated = 0
+        start = time.perf_counter()
+
+        async def migrate_one(chat_ref) -> bool:
+            async with semaphore:
+                try:
+                    return await ChatMessageStore.migrate_chat(db, chat_ref)
+                except Exception as e:
+                    logger.error(f"Failed to migrate chat {chat_ref}: {str(e)}")
+                    return False
+
+        while True:
+            query = {"messages": {"$exists": True}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await db.chats.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                break
+            results = await asyncio.gather(*(migrate_one(doc["_id"]) for doc in batch))
+            migrated += sum(results)
+            last_id = batch[-1]["_id"]
+            logger.info(
+                f"Migrated {migrated} chats to buckets "
+                f"({migrated / (time.perf_counter() - start):.1f} chats/s), last _id {last_id}"
+            )
+        return migrated
@@ -0,0 +1,127 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable
+import copy
+import hashlib
+import json
+import logging
+import os
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Hashes (and their configs) kept in memory; repeat snapshots skip the write
+CONFIG_SNAPSHOT_CACHE_SIZE = int(os.getenv("CONFIG_SNAPSHOT_CACHE_SIZE", 512))
+
+# Parts of a call report replaced by a reference to config_snapshots
+SNAPSHOT_PATHS = [("message", "assistant"), ("message", "botConfig")]
+SNAPSHOT_REF_KEY = "_snapshot"
+
+
+def snapshot_hash(config) -> str:
+    """Content address of a config: sha256 of its canonical JSON."""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _is_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and SNAPSHOT_REF_KEY in value
+
+
+def extract_snapshots(body: dict) -> Dict[str, dict]:
+    """
+    Replace (in place) every snapshot in a call report with {"_snapshot": hash}.
+    Returns {path: (hash, config)} for the snapshots that were replaced.
+    """
+    extracted = {}
+    for parent_key, key in SNAPSHOT_PATHS:
+        parent = body.get(parent_key)
+        config = parent.get(key) if isinstance(parent, dict) else None
+        if not isinstance(config, dict) or not config or _is_ref(config):
+            continue
+        digest = snapshot_hash(config)
+        parent[key] = {SNAPSHOT_REF_KEY: digest}
+        extracted[key] = (digest, config)
+    return extracted
+
+
+def snapshot_refs(body: dict) -> Dict[str, str]:
+    """{key: hash} of the snapshot references in a call report."""
+    refs = {}
+    for parent_key, key in SNAPSHOT_PATHS:
+        value = (body.get(parent_key) or {}).get(key)
+        if _is_ref(value):
+            refs[key] = value[SNAPSHOT_REF_KEY]
+    return refs
+
+
+class ConfigSnapshotService:
+    """Content-addressed assistant/botConfig snapshots (collection: config_snapshots, _id = sha256)."""
+
+    _cache: "OrderedDict[str, dict]" = OrderedDict()
+
+    @staticmethod
+    def _remember(digest: str, config: dict):
+        cache = ConfigSnapshotService._cache
+        cache[digest] = config
+        cache.move_to_end(digest)
+        while len(cache) > CONFIG_SNAPSHOT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    @staticmethod
+    async def put(db: AsyncIOMotorDatabase, digest: str, config: dict, kind: str):
+        """Store a snapshot once; known hashes return without touching Mongo."""
+        if digest in ConfigSnapshotService._cache:
+            ConfigSnapshotService._cache.move_to_end(digest)
+            metrics.incr("config_snapshot_writes", outcome="cached")
+            return
+        try:
+            await db.config_snapshots.insert_one(
+                {"_id": digest, "kind": kind, "config": config, "created_at": datetime.utcnow()}
+            )
+            metrics.incr("config_snapshot_writes", outcome="inserted")
+        except DuplicateKeyError:
+            metrics.incr("config_snapshot_writes", outcome="existing")
+        ConfigSnapshotService._remember(digest, config)
+
+    @staticmethod
+    async def put_many(db: AsyncIOMotorDatabase, snapshots: Dict[str, tuple]):
+        for kind, (digest, config) in snapshots.items():
+            await ConfigSnapshotService.put(db, digest, config, kind)
+
+    @staticmethod
+    async def get_many(db: AsyncIOMotorDatabase, digests: Iterable[str]) -> Dict[str, dict]:
+        found, missing = {}, []
+        for digest in set(digests):
+            if digest in ConfigSnapshotService._cache:
+                found[digest] = ConfigSnapshotService._cache[digest]
+            else:
+                missing.append(digest)
+        if missing:
+            async for doc in db.config_snapshots.find({"_id": {"$in": missing}}):
+                found[doc["_id"]] = doc["config"]
+                ConfigSnapshotService._remember(doc["_id"], doc["config"])
+        return found
+
+    @staticmethod
+    async def restore(db: AsyncIOMotorDatabase, body: dict) -> dict:
+        """
+        Put the referenced snapshots back into a call report (in place). Each
+        report gets its own copy, so callers may edit it without touching the cache.
+        """
+        refs = snapshot_refs(body)
+        if not refs:
+            return body
+        configs = await ConfigSnapshotService.get_many(db, refs.values())
+        for parent_key, key in SNAPSHOT_PATHS:
+            digest = refs.get(key)
+            if digest is None:
+                continue
+            if digest in configs:
+                body[parent_key][key] = copy.deepcopy(configs[digest])
+            else:
+                logger.error(f"Config snapshot {digest} referenced by a call log is missing")
+        return body
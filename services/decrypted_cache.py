@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+import ctypes
+import logging
+import os
+import pickle
+import time
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Compliance switch: with the cache off, every admin read decrypts from Mongo
+DECRYPTED_CACHE_ENABLED = os.getenv("DECRYPTED_CACHE_ENABLED", "true").lower() == "true"
+DECRYPTED_CACHE_MAX_BYTES = int(os.getenv("DECRYPTED_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DECRYPTED_CACHE_TTL_SECONDS = float(os.getenv("DECRYPTED_CACHE_TTL_SECONDS", 120))
+
+
+def _wipe(buffer: bytearray):
+    """Overwrite plaintext in place before the buffer is released."""
+    if buffer:
+        ctypes.memset((ctypes.c_char * len(buffer)).from_buffer(buffer), 0, len(buffer))
+
+
+class DecryptedCache:
+    """
+    Byte-bounded LRU of decrypted admin documents with a short TTL.
+
+    Entries are kept serialized in a bytearray (pickle, produced and read only
+    in-process), which gives an exact size for the bound and lets the plaintext
+    be zeroed when the entry is evicted, invalidated or expires. Documents
+    handed out on a hit are fresh copies.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, bytearray]]" = OrderedDict()
+        self._keys_by_doc: Dict[Tuple[str, str], Set[Tuple]] = {}
+        self._bytes = 0
+
+    def get(self, kind: str, doc_id: str, variant: Hashable = None) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        key = (kind, doc_id, variant)
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.incr("decrypted_cache", kind=kind, outcome="miss")
+            return None
+        expires_at, buffer = entry
+        if expires_at <= time.monotonic():
+            self._drop(key, "expired")
+            metrics.incr("decrypted_cache", kind=kind, outcome="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.incr("decrypted_cache", kind=kind, outcome="hit")
+        return pickle.loads(buffer)
+
+    def put(self, kind: str, doc_id: str, variant: Hashable, document: dict):
+        if not self.enabled:
+            return
+        try:
+            buffer = bytearray(pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            logger.debug(f"Not caching {kind} {doc_id}: {str(e)}")
+            return
+        if len(buffer) > self.max_bytes:
+            _wipe(buffer)
+            return
+
+        key = (kind, doc_id, variant)
+        if key in self._entries:
+            self._drop(key, "replaced")
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, buffer)
+        self._keys_by_doc.setdefault((kind, doc_id), set()).add(key)
+        self._bytes += len(buffer)
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)), "size")
+
+    def invalidate(self, kind: str, doc_id: str):
+        """Forget every cached view of a document (call after updating it)."""
+        for key in list(self._keys_by_doc.get((kind, str(doc_id)), ())):
+            self._drop(key, "invalidated")
+
+    def clear(self):
+        for key in list(self._entries):
+            self._drop(key, "cleared")
+
+    def _drop(self, key: Tuple, reason: str):
+        _, buffer = self._entries.pop(key)
+        self._bytes -= len(buffer)
+        _wipe(buffer)
+        doc_keys = self._keys_by_doc.get(key[:2])
+        if doc_keys is not None:
+            doc_keys.discard(key)
+            if not doc_keys:
+                del self._keys_by_doc[key[:2]]
+        metrics.incr("decrypted_cache_evictions", kind=key[0], reason=reason)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+decrypted_cache = DecryptedCache(DECRYPTED_CACHE_MAX_BYTES, DECRYPTED_CACHE_TTL_SECONDS, DECRYPTED_CACHE_ENABLED)
+metrics.register_gauge("decrypted_cache", decrypted_cache.stats)
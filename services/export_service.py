@@ -0,0 +1,167 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+
+from services.admin_service import AdminService
+from encrypt.blind_index import email_index
+from utils import metrics
+from utils.field_selection import parse_fields, wants
+
+logger = logging.getLogger(__name__)
+
+# Documents fetched from Mongo per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 100))
+# Documents being decrypted at once; bounds memory to roughly this many plaintext documents
+EXPORT_DECRYPT_WINDOW = int(os.getenv("EXPORT_DECRYPT_WINDOW", 8))
+# Output is handed to the response in chunks of about this size
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", 64 * 1024))
+
+# kind -> (collection, date field used for the range filter and ordering)
+EXPORT_KINDS = {
+    "call_logs": ("callslog", "receivedAt"),
+    "chats": ("chats", "created_at"),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_line(document: dict) -> bytes:
+    return (json.dumps(document, separators=(",", ":"), default=_json_default) + "\n").encode()
+
+
+class ExportService:
+    """Streaming NDJSON export of decrypted call logs and chats (admin audits, QA sampling)."""
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        # callslog.receivedAt is indexed by CallLogArchive
+        await db.chats.create_index([("created_at", 1)], name="chats_created_at")
+
+    @staticmethod
+    def build_query(
+        kind: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        email: str = None, call_id: str = None, user_id: str = None,
+    ) -> dict:
+        _, date_field = EXPORT_KINDS[kind]
+        query = {}
+        if start or end:
+            query[date_field] = {}
+            if start:
+                query[date_field]["$gte"] = start
+            if end:
+                query[date_field]["$lt"] = end
+        if email:
+            query["email_bidx"] = email_index(email)
+        if call_id and kind == "call_logs":
+            query["call_id"] = call_id
+        if user_id and kind == "chats":
+            query["user_id"] = user_id
+        return query
+
+    @staticmethod
+    async def stream(
+        db: AsyncIOMotorDatabase, kind: str, query: dict, fields: str = None,
+        message_offset: int = None, message_limit: int = None, compress: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield the matching documents, decrypted, as NDJSON (gzip when compress).
+
+        Documents are read in EXPORT_BATCH_SIZE batches in date order and decrypted
+        EXPORT_DECRYPT_WINDOW at a time; output keeps the read order. Nothing beyond
+        one batch and the window is held, and the generator only advances as fast
+        as the response is sent, so a slow client slows the export instead of
+        buffering it.
+        """
+        collection, date_field = EXPORT_KINDS[kind]
+        paths = AdminService._with_id(parse_fields(fields))
+        projection = None
+        if kind == "call_logs" and not wants(paths, "body"):
+            projection = {"body": 0}
+        elif kind == "chats":
+            projection = AdminService.chat_projection(paths, message_offset, message_limit)
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        cursor = db[collection].find(query, projection).sort(date_field, 1).batch_size(EXPORT_BATCH_SIZE)
+        window = deque()
+        buffer = bytearray()
+        exported = 0
+        start = time.perf_counter()
+
+        async def decrypt(document: dict, archive: Optional[dict]) -> bytes:
+            try:
+                if kind == "call_logs":
+                    result = await AdminService.decrypt_call_log(
+                        db, document, paths, message_offset, message_limit, archive=archive
+                    )
+                else:
+                    result = await AdminService.decrypt_chat(db, document, paths, message_offset, message_limit)
+            except Exception as e:
+                logger.error(f"Export could not decrypt {collection} {document['_id']}: {str(e)}")
+                result = {"_id": document["_id"], "error": "decryption failed"}
+            return _ndjson_line(result)
+
+        def emit(line: bytes) -> Optional[bytes]:
+            nonlocal buffer
+            buffer += compressor.compress(line) if compressor else line
+            if len(buffer) < EXPORT_CHUNK_BYTES:
+                return None
+            chunk, buffer = bytes(buffer), bytearray()
+            return chunk
+
+        try:
+            while True:
+                batch = await cursor.to_list(length=EXPORT_BATCH_SIZE)
+                if not batch:
+                    break
+                archives = {}
+                if kind == "call_logs" and wants(paths, "body"):
+                    # One round trip for the batch's archives instead of one per document
+                    ids = [doc["_id"] for doc in batch if "archive" in doc]
+                    if ids:
+                        async for archive in db.callslog_archive.find({"_id": {"$in": ids}}):
+                            archives[archive["_id"]] = archive
+
+                for document in batch:
+                    window.append(asyncio.ensure_future(decrypt(document, archives.pop(document["_id"], None))))
+                    if len(window) < EXPORT_DECRYPT_WINDOW:
+                        continue
+                    line = await window.popleft()
+                    exported += 1
+                    chunk = emit(line)
+                    if chunk:
+                        yield chunk
+
+            while window:
+                line = await window.popleft()
+                exported += 1
+                chunk = emit(line)
+                if chunk:
+                    yield chunk
+            if compressor:
+                buffer += compressor.flush()
+            if buffer:
+                yield bytes(buffer)
+        finally:
+            # Client went away (or the read failed): drop what is still being decrypted
+            abandoned = len(window)
+            for task in window:
+                task.cancel()
+            elapsed = time.perf_counter() - start
+            rate = exported / elapsed if elapsed > 0 else 0.0
+            metrics.incr("admin_export_docs", exported, kind=kind)
+            metrics.observe("admin_export_docs_per_second", rate, kind=kind)
+            logger.info(
+                f"Exported {exported} {kind} in {elapsed:.2f}s ({rate:.0f} docs/s)"
+                + (f", {abandoned} abandoned" if abandoned else "")
+            )
@@ -0,0 +1,115 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from fastapi.responses import JSONResponse
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+import hashlib
+import json
+import logging
+import os
+
+from utils import metrics
+from utils.querybuilders import AppointmentQuery
+
+logger = logging.getLogger(__name__)
+
+# How long a processed webhook is remembered (TTL index on created_at)
+WEBHOOK_DEDUP_TTL_SECONDS = int(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", 7 * 24 * 3600))
+# A claim still "processing" after this long is assumed to belong to a crashed worker
+WEBHOOK_DEDUP_STALE_SECONDS = int(os.getenv("WEBHOOK_DEDUP_STALE_SECONDS", 300))
+
+
+class IdempotencyService:
+    """Process each (call_id, message type, event timestamp) webhook at most once."""
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        # _id is the idempotency key, so the unique check is the built-in _id index
+        try:
+            await db.webhook_events.create_index(
+                "created_at", expireAfterSeconds=WEBHOOK_DEDUP_TTL_SECONDS, name="webhook_events_ttl"
+            )
+        except OperationFailure:
+            # TTL changed since the index was created: update it in place
+            await db.command(
+                "collMod", "webhook_events",
+                index={"name": "webhook_events_ttl", "expireAfterSeconds": WEBHOOK_DEDUP_TTL_SECONDS},
+            )
+
+    @staticmethod
+    def make_key(call_id: str, event_type: str, timestamp) -> str:
+        raw = f"{call_id}|{event_type}|{timestamp if timestamp is not None else ''}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    async def claim(db: AsyncIOMotorDatabase, key: str, event_type: str):
+        """Try to claim a key. Returns None when claimed, otherwise the existing record."""
+        now = datetime.utcnow()
+        try:
+            await db.webhook_events.insert_one(
+                {"_id": key, "type": event_type, "status": "processing", "created_at": now}
+            )
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # Take over claims left behind by a worker that died mid-processing
+        stale = await db.webhook_events.find_one_and_update(
+            {
+                "_id": key,
+                "status": "processing",
+                "created_at": {"$lt": now - timedelta(seconds=WEBHOOK_DEDUP_STALE_SECONDS)},
+            },
+            {"$set": {"created_at": now}},
+        )
+        if stale:
+            logger.warning(f"Reclaimed stale webhook claim {key}")
+            return None
+        return await db.webhook_events.find_one({"_id": key}) or {"status": "processing"}
+
+    @staticmethod
+    async def complete(db: AsyncIOMotorDatabase, key: str, response: JSONResponse):
+        await db.webhook_events.update_one(
+            {"_id": key},
+            {"$set": {
+                "status": "done",
+                "status_code": response.status_code,
+                "result": json.loads(response.body),
+                "completed_at": datetime.utcnow(),
+            }},
+        )
+
+    @staticmethod
+    async def release(db: AsyncIOMotorDatabase, key: str):
+        """Forget a failed attempt so VAPI's retry is processed again."""
+        await db.webhook_events.delete_one({"_id": key, "status": "processing"})
+
+    @staticmethod
+    def replay(record: dict) -> JSONResponse:
+        if record.get("status") == "done":
+            return JSONResponse(content=record.get("result"), status_code=record.get("status_code", 200))
+        return AppointmentQuery.generic_success("Webhook event already being processed", {"status": "duplicate"})
+
+    @staticmethod
+    async def run_once(
+        db: AsyncIOMotorDatabase, key: str, event_type: str,
+        handler: Callable[[], Awaitable[JSONResponse]],
+    ) -> JSONResponse:
+        """Run handler unless the key was already seen; duplicates get the original result back."""
+        existing = await IdempotencyService.claim(db, key, event_type)
+        if existing is not None:
+            metrics.incr("webhook_duplicates", type=event_type)
+            logger.info(f"Duplicate {event_type} webhook ignored (key {key})")
+            return IdempotencyService.replay(existing)
+
+        try:
+            response = await handler()
+        except Exception:
+            await IdempotencyService.release(db, key)
+            raise
+
+        if response.status_code >= 400:
+            await IdempotencyService.release(db, key)
+        else:
+            await IdempotencyService.complete(db, key, response)
+        return response
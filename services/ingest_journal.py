@@ -0,0 +1,406 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# "inline" keeps the old behaviour (process before responding),
+# "journal" appends the raw body to disk and acknowledges immediately.
+WEBHOOK_INGEST_MODE = os.getenv("WEBHOOK_INGEST_MODE", "inline").lower()
+INGEST_JOURNAL_DIR = os.getenv("INGEST_JOURNAL_DIR", "journal")
+INGEST_SEGMENT_MAX_BYTES = int(os.getenv("INGEST_SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+INGEST_FSYNC_INTERVAL_MS = int(os.getenv("INGEST_FSYNC_INTERVAL_MS", 5))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+# A failing record is retried with exponential backoff before it goes to the dead-letter file
+INGEST_RETRY_ATTEMPTS = int(os.getenv("INGEST_RETRY_ATTEMPTS", 5))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", 0.5))
+INGEST_RETRY_MAX_SECONDS = float(os.getenv("INGEST_RETRY_MAX_SECONDS", 30))
+# Progress is persisted at most this often (a crash replays at most this window; handlers are idempotent)
+INGEST_CHECKPOINT_INTERVAL_MS = int(os.getenv("INGEST_CHECKPOINT_INTERVAL_MS", 200))
+
+# record = [length:uint32][crc32:uint32][payload]
+_HEADER = struct.Struct(">II")
+_SEGMENT_PREFIX = "segment-"
+_SEGMENT_SUFFIX = ".log"
+_CHECKPOINT_FILE = "checkpoint.json"
+DEAD_LETTER_FILE = "dead-letter.log"
+
+
+class IngestHandlerError(Exception):
+    """Raised by a journal handler whose event failed without an exception of its own (retried)."""
+
+
+def read_records(path: Path, start: int = 0):
+    """(offset, end, payload) of every complete record of a segment or dead-letter file."""
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        offset = start
+        while True:
+            header = fh.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                break
+            length, crc = _HEADER.unpack(header)
+            payload = fh.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                # Torn write at the tail (crash mid-append); it was never acknowledged
+                logger.warning(f"Truncated record in {path.name} at offset {offset}, ignoring tail")
+                break
+            end = offset + _HEADER.size + length
+            yield offset, end, payload
+            offset = end
+
+
+def write_records(path: Path, payloads):
+    """Append records to `path` and fsync them."""
+    with open(path, "ab") as fh:
+        for payload in payloads:
+            fh.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            fh.write(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def fsync_directory(path: Path):
+    """Make renames and unlinks inside `path` durable (no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Record:
+    __slots__ = ("segment", "offset", "end", "payload", "appended_at", "done")
+
+    def __init__(self, segment: int, offset: int, end: int, payload: bytes, appended_at: float):
+        self.segment = segment
+        self.offset = offset
+        self.end = end
+        self.payload = payload
+        self.appended_at = appended_at
+        self.done = False
+
+
+class IngestJournal:
+    """
+    Append-only, fsync-batched journal for raw webhook bodies.
+
+    Requests are acknowledged once their bytes are durable on disk; a pool of
+    asyncio workers then runs the real handler. Progress is checkpointed as
+    (segment, offset) so unprocessed records are replayed after a restart.
+
+    A record whose handler fails is retried with bounded backoff; if it still
+    fails it is appended to the dead-letter file (replay it with
+    scripts/replay_dead_letters.py) before the checkpoint may move past it.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._handler: Optional[Callable[[bytes], Awaitable[None]]] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._work_queue: Optional[asyncio.Queue] = None
+        self._inflight: deque = deque()
+        self._tasks = []
+        self._segment_seq = 0
+        self._segment_fh = None
+        self._segment_size = 0
+        self._checkpoint = (0, 0)
+        self._checkpoint_dirty = False
+        self._appended = 0
+        self._processed = 0
+        self._retries = 0
+        self._failed = 0
+        self.running = False
+
+    @property
+    def enabled(self) -> bool:
+        return WEBHOOK_INGEST_MODE == "journal" and self.running
+
+    # ---------- LIFECYCLE ----------
+    async def start(self, handler: Callable[[bytes], Awaitable[None]], workers: int = INGEST_WORKERS):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._handler = handler
+        self._write_queue = asyncio.Queue()
+        self._work_queue = asyncio.Queue()
+        self._checkpoint = self._load_checkpoint()
+
+        segments = self._list_segments()
+        replayed = 0
+        for seq in segments:
+            if seq < self._checkpoint[0]:
+                continue
+            start = self._checkpoint[1] if seq == self._checkpoint[0] else 0
+            for offset, end, payload in read_records(self._segment_path(seq), start):
+                self._enqueue(_Record(seq, offset, end, payload, time.time()))
+                replayed += 1
+
+        self._segment_seq = (segments[-1] + 1) if segments else max(self._checkpoint[0], 1)
+        self._open_segment()
+
+        self._tasks.append(asyncio.create_task(self._writer_loop()))
+        self._tasks.append(asyncio.create_task(self._checkpoint_loop()))
+        for i in range(workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop(i)))
+        self.running = True
+        metrics.register_gauge("ingest_journal", self.stats)
+        logger.info(f"Ingest journal started in {self.directory} with {workers} workers, replaying {replayed} records")
+
+    async def stop(self):
+        """Flush pending appends and stop workers; unprocessed records are replayed on next start."""
+        if not self.running:
+            return
+        self.running = False
+        await self._write_queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._checkpoint_dirty:
+            self._persist_checkpoint(self._checkpoint)
+        if self._segment_fh:
+            self._segment_fh.close()
+            self._segment_fh = None
+        logger.info(f"Ingest journal stopped. Lag: {self.stats()}")
+
+    # ---------- APPEND ----------
+    async def append(self, payload: bytes) -> None:
+        """Durably append one raw body. Returns once it has been fsynced."""
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((payload, future))
+        await future
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._write_queue.get()]
+            # Group commit: wait a few milliseconds for more appends to share the fsync
+            if INGEST_FSYNC_INTERVAL_MS > 0:
+                await asyncio.sleep(INGEST_FSYNC_INTERVAL_MS / 1000)
+            while not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+
+            try:
+                positions = await loop.run_in_executor(None, self._write_batch, [p for p, _ in batch])
+                now = time.time()
+                for (payload, future), (seq, offset, end) in zip(batch, positions):
+                    self._enqueue(_Record(seq, offset, end, payload, now))
+                    if not future.done():
+                        future.set_result(None)
+                metrics.observe("ingest_journal_fsync_batch_size", len(batch))
+            except Exception as e:
+                logger.exception(f"Ingest journal write failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+    def _write_batch(self, payloads):
+        positions = []
+        for payload in payloads:
+            if self._segment_size >= INGEST_SEGMENT_MAX_BYTES:
+                self._rotate_segment()
+            offset = self._segment_size
+            self._segment_fh.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._segment_fh.write(payload)
+            self._segment_size += _HEADER.size + len(payload)
+            positions.append((self._segment_seq, offset, self._segment_size))
+        self._segment_fh.flush()
+        os.fsync(self._segment_fh.fileno())
+        return positions
+
+    # ---------- PROCESSING ----------
+    def _enqueue(self, record: _Record):
+        self._inflight.append(record)
+        self._appended += 1
+        self._work_queue.put_nowait(record)
+
+    async def _worker_loop(self, worker_id: int):
+        while True:
+            record = await self._work_queue.get()
+            start = time.perf_counter()
+            try:
+                await self._process(worker_id, record)
+            finally:
+                metrics.observe("ingest_journal_process_ms", (time.perf_counter() - start) * 1000)
+                self._work_queue.task_done()
+            # Not reached when cancelled mid-retry (shutdown): the record is replayed on the next start
+            self._complete(record)
+
+    async def _process(self, worker_id: int, record: _Record):
+        """Run the handler with bounded retries; dead-letter the record if every attempt fails."""
+        for attempt in range(1, INGEST_RETRY_ATTEMPTS + 1):
+            try:
+                await self._handler(record.payload)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Ingest worker {worker_id} attempt {attempt}/{INGEST_RETRY_ATTEMPTS} failed on "
+                    f"segment {record.segment} offset {record.offset}: {str(e)}"
+                )
+            if attempt < INGEST_RETRY_ATTEMPTS:
+                self._retries += 1
+                metrics.incr("ingest_journal_retries")
+                await asyncio.sleep(self._backoff(attempt))
+
+        self._failed += 1
+        metrics.incr("ingest_journal_failed")
+        attempt = 0
+        while True:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, write_records, self.directory / DEAD_LETTER_FILE, [record.payload]
+                )
+                logger.error(f"Ingest record at segment {record.segment} offset {record.offset} moved to dead letters")
+                return
+            except OSError as e:
+                # Without a dead-letter copy the record must stay in the journal: keep trying
+                attempt += 1
+                logger.error(f"Could not write dead letter for segment {record.segment}: {str(e)}")
+                await asyncio.sleep(self._backoff(attempt))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(INGEST_RETRY_BASE_SECONDS * 2 ** (attempt - 1), INGEST_RETRY_MAX_SECONDS)
+
+    def _complete(self, record: _Record):
+        record.done = True
+        record.payload = b""
+        self._processed += 1
+        while self._inflight and self._inflight[0].done:
+            head = self._inflight.popleft()
+            self._checkpoint = (head.segment, head.end)
+            self._checkpoint_dirty = True
+
+    async def _checkpoint_loop(self):
+        """Persist progress in batches instead of one file replace per record."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(INGEST_CHECKPOINT_INTERVAL_MS / 1000)
+            if not self._checkpoint_dirty:
+                continue
+            self._checkpoint_dirty = False
+            try:
+                await loop.run_in_executor(None, self._persist_checkpoint, self._checkpoint)
+            except Exception as e:
+                self._checkpoint_dirty = True
+                logger.error(f"Could not save ingest checkpoint: {str(e)}")
+
+    # ---------- SEGMENTS & CHECKPOINT ----------
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f"{_SEGMENT_PREFIX}{seq:012d}{_SEGMENT_SUFFIX}"
+
+    def _list_segments(self):
+        seqs = []
+        for path in self.directory.glob(f"{_SEGMENT_PREFIX}*{_SEGMENT_SUFFIX}"):
+            try:
+                seqs.append(int(path.name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(seqs)
+
+    def _open_segment(self):
+        self._segment_fh = open(self._segment_path(self._segment_seq), "ab")
+        self._segment_size = self._segment_fh.tell()
+
+    def _rotate_segment(self):
+        self._segment_fh.close()
+        self._segment_seq += 1
+        self._open_segment()
+
+    def _load_checkpoint(self):
+        path = self.directory / _CHECKPOINT_FILE
+        if not path.exists():
+            return (0, 0)
+        try:
+            data = json.loads(path.read_text())
+            return (int(data["segment"]), int(data["offset"]))
+        except Exception as e:
+            logger.error(f"Unreadable ingest checkpoint, replaying everything: {str(e)}")
+            return (0, 0)
+
+    def _persist_checkpoint(self, checkpoint):
+        path = self.directory / _CHECKPOINT_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            fh.write(json.dumps({"segment": checkpoint[0], "offset": checkpoint[1]}))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        # The rename must be on disk before the segments it covers are removed
+        fsync_directory(self.directory)
+        self._prune_segments(checkpoint)
+
+    def _prune_segments(self, checkpoint):
+        for seq in self._list_segments():
+            if seq >= checkpoint[0] or seq >= self._segment_seq:
+                break
+            try:
+                self._segment_path(seq).unlink()
+            except OSError as e:
+                logger.warning(f"Could not remove processed segment {seq}: {str(e)}")
+
+    # ---------- MONITORING ----------
+    def stats(self) -> dict:
+        pending = [r for r in self._inflight if not r.done]
+        oldest = min((r.appended_at for r in pending), default=None)
+        return {
+            "mode": WEBHOOK_INGEST_MODE,
+            "running": self.running,
+            "appended": self._appended,
+            "processed": self._processed,
+            "retries": self._retries,
+            "dead_lettered": self._failed,
+            "lag_records": len(pending),
+            "lag_bytes": sum(len(r.payload) for r in pending),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "queued_writes": self._write_queue.qsize() if self._write_queue else 0,
+            "checkpoint": {"segment": self._checkpoint[0], "offset": self._checkpoint[1]},
+            "active_segment": self._segment_seq,
+        }
+
+
+async def replay_dead_letters(directory: str, handler: Callable[[bytes], Awaitable[None]]) -> dict:
+    """
+    Run every dead-lettered body through `handler` once more. Bodies that fail
+    again are kept (the file is rewritten with only those); the rest are dropped.
+    """
+    path = Path(directory) / DEAD_LETTER_FILE
+    if not path.exists():
+        return {"replayed": 0, "failed": 0}
+    # Move the file aside first so records dead-lettered meanwhile are not lost
+    pending = path.with_name(f"{DEAD_LETTER_FILE}.replaying")
+    if not pending.exists():
+        os.replace(path, pending)
+    counts = {"replayed": 0, "failed": 0}
+    failed = []
+    for _, _, payload in list(read_records(pending)):
+        try:
+            await handler(payload)
+            counts["replayed"] += 1
+        except Exception as e:
+            failed.append(payload)
+            counts["failed"] += 1
+            logger.error(f"Dead letter failed again: {str(e)}")
+    if failed:
+        write_records(path, failed)
+    pending.unlink()
+    return counts
+
+
+ingest_journal = IngestJournal(INGEST_JOURNAL_DIR)
@@ -0,0 +1,181 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+from encrypt.encryption import PRIMARY_KEY_ID, rotate_value
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_ROTATION_BATCH_SIZE = int(os.getenv("KEY_ROTATION_BATCH_SIZE", 200))
+KEY_ROTATION_WORKERS = int(os.getenv("KEY_ROTATION_WORKERS", 2))
+# Throughput cap so the job does not starve live traffic (documents scanned per second)
+KEY_ROTATION_MAX_DOCS_PER_SECOND = float(os.getenv("KEY_ROTATION_MAX_DOCS_PER_SECOND", 200))
+
+# Collection -> top-level fields holding Fernet tokens or sealed envelopes
+ROTATION_TARGETS = {
+    "callslog": ["body"],  # legacy documents with an inline encrypted body
+    "callslog_archive": ["blob"],
+    "chats": ["messages"],  # chats not yet moved to chat_messages
+    "chat_messages": ["messages"],
+    "appointments": ["patient_email", "patient_phone", "patient_address"],
+    "outbox": ["payload"],  # pending pushes, sealed
+}
+
+STATE_ID = "state"
+
+
+def _rotate_document(doc: dict, fields: list) -> dict:
+    """{field: new value} for every field that had to be re-encrypted."""
+    changes = {}
+    for field in fields:
+        if field not in doc:
+            continue
+        value, changed = rotate_value(doc[field])
+        if changed:
+            changes[field] = value
+    return changes
+
+
+class KeyRotationJob:
+    """
+    Re-encrypts stored data under the primary key of ENCRYPTION_KEYS.
+
+    Walks each collection in _id order, re-encrypts on a small dedicated
+    thread pool, writes back with bulk_write and checkpoints the last _id in
+    the key_rotation collection, so a restarted job resumes where it stopped.
+    Writes are conditional on the old ciphertext; a document changed in the
+    meantime is counted as a conflict and picked up by the next run.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, db: AsyncIOMotorDatabase) -> bool:
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self.run(db))
+        return True
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def status(self, db: AsyncIOMotorDatabase) -> dict:
+        state = await db.key_rotation.find_one({"_id": STATE_ID}) or {}
+        state.pop("_id", None)
+        for progress in state.get("collections", {}).values():
+            if progress.get("last_id") is not None:
+                progress["last_id"] = str(progress["last_id"])
+        state["running"] = self.running
+        state["primary_key_id"] = PRIMARY_KEY_ID
+        return state
+
+    async def _load_state(self, db: AsyncIOMotorDatabase) -> dict:
+        state = await db.key_rotation.find_one({"_id": STATE_ID})
+        if state and state.get("key_id") == PRIMARY_KEY_ID and state.get("status") != "completed":
+            logger.info("Resuming key rotation from checkpoint")
+            return state
+        # New primary key (or the last run finished): start over
+        return {
+            "_id": STATE_ID,
+            "key_id": PRIMARY_KEY_ID,
+            "started_at": datetime.utcnow(),
+            "collections": {
+                name: {"last_id": None, "done": False, "scanned": 0, "rotated": 0, "conflicts": 0}
+                for name in ROTATION_TARGETS
+            },
+        }
+
+    async def _save_state(self, db: AsyncIOMotorDatabase, state: dict, status: str, error: str = None):
+        state["status"] = status
+        state["updated_at"] = datetime.utcnow()
+        if error:
+            state["error"] = error
+        await db.key_rotation.replace_one({"_id": STATE_ID}, state, upsert=True)
+
+    async def run(self, db: AsyncIOMotorDatabase):
+        """Rotate every collection in ROTATION_TARGETS (resumable)."""
+        state = await self._load_state(db)
+        self._pool = ThreadPoolExecutor(max_workers=KEY_ROTATION_WORKERS, thread_name_prefix="key-rotation")
+        try:
+            await self._save_state(db, state, "running")
+            for name, fields in ROTATION_TARGETS.items():
+                progress = state["collections"].setdefault(
+                    name, {"last_id": None, "done": False, "scanned": 0, "rotated": 0, "conflicts": 0}
+                )
+                if not progress["done"]:
+                    await self._rotate_collection(db, name, fields, state, progress)
+            await self._save_state(db, state, "completed")
+            logger.info(f"Key rotation to key {PRIMARY_KEY_ID} completed")
+        except asyncio.CancelledError:
+            await self._save_state(db, state, "stopped")
+            raise
+        except Exception as e:
+            logger.exception(f"Key rotation failed: {str(e)}")
+            await self._save_state(db, state, "failed", str(e))
+        finally:
+            self._pool.shutdown(wait=False)
+
+    async def _rotate_collection(self, db: AsyncIOMotorDatabase, name: str, fields: list, state: dict, progress: dict):
+        collection = db[name]
+        projection = {field: 1 for field in fields}
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        scanned_here = 0
+
+        while True:
+            query = {"_id": {"$gt": progress["last_id"]}} if progress["last_id"] is not None else {}
+            batch = await collection.find(query, projection).sort("_id", 1).to_list(length=KEY_ROTATION_BATCH_SIZE)
+            if not batch:
+                break
+
+            changes = await asyncio.gather(
+                *(loop.run_in_executor(self._pool, _rotate_document, doc, fields) for doc in batch)
+            )
+            updates = [
+                # Only overwrite the ciphertext we read; concurrent writers win
+                UpdateOne({"_id": doc["_id"], **{f: doc[f] for f in change}}, {"$set": change})
+                for doc, change in zip(batch, changes) if change
+            ]
+            matched = 0
+            if updates:
+                result = await collection.bulk_write(updates, ordered=False)
+                matched = result.matched_count
+
+            progress["last_id"] = batch[-1]["_id"]
+            progress["scanned"] += len(batch)
+            progress["rotated"] += matched
+            progress["conflicts"] += len(updates) - matched
+            metrics.incr("key_rotation_docs", len(batch), collection=name, outcome="scanned")
+            metrics.incr("key_rotation_docs", matched, collection=name, outcome="rotated")
+            await self._save_state(db, state, "running")
+
+            # Throughput cap
+            scanned_here += len(batch)
+            ahead = scanned_here / KEY_ROTATION_MAX_DOCS_PER_SECOND - (time.perf_counter() - start)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+        progress["done"] = True
+        await self._save_state(db, state, "running")
+        logger.info(
+            f"Key rotation of {name} done: {progress['scanned']} scanned, "
+            f"{progress['rotated']} rotated, {progress['conflicts']} conflicts"
+        )
+
+
+key_rotation = KeyRotationJob()
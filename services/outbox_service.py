@@ -0,0 +1,258 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import Binary, ObjectId
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import httpx
+import json
+import logging
+import os
+import random
+import time
+
+from encrypt.encryption import ENVELOPE_BINARY_SUBTYPE, is_sealed, open_sealed, seal
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MAKE_SMS_WEBHOOK_URL = os.getenv("MAKE_SMS_WEBHOOK_URL")
+MAKE_BOOKING_WEBHOOK_URL = os.getenv("MAKE_BOOKING_WEBHOOK_URL")
+
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", 2))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", 2))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", 900))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+OUTBOX_HTTP_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_HTTP_TIMEOUT_SECONDS", 10))
+# Delivered entries are removed by a TTL index this long after sent_at
+OUTBOX_SENT_RETENTION_SECONDS = int(os.getenv("OUTBOX_SENT_RETENTION_SECONDS", 7 * 24 * 3600))
+
+OUTBOX_TARGETS = {
+    "booking": MAKE_BOOKING_WEBHOOK_URL,
+    "sms": MAKE_SMS_WEBHOOK_URL,
+}
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+
+def _seal_payload(payload: dict) -> Binary:
+    # Payloads carry patient names, emails and phone numbers
+    return Binary(seal(json.dumps(payload, default=str).encode("utf-8")), ENVELOPE_BINARY_SUBTYPE)
+
+
+def _open_payload(value) -> dict:
+    # Entries queued before payloads were sealed hold the plain dict
+    return json.loads(open_sealed(value)) if is_sealed(value) else value
+
+
+class OutboxService:
+    """
+    Durable queue of outgoing Make.com pushes (collection: outbox).
+
+    Delivery is at-least-once and best effort: the entry is written after the
+    change it reports (no transaction, the deployment is not a replica set),
+    so a crash in between loses that push, and a push whose response is lost
+    is sent again. Receivers must tolerate duplicates.
+    """
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        await db.outbox.create_index([("status", 1), ("next_attempt_at", 1)], name="outbox_due")
+        await db.outbox.create_index([("status", 1), ("created_at", -1)], name="outbox_status_created")
+        await db.outbox.create_index("claim", name="outbox_claim", sparse=True)
+        # Only delivered entries have sent_at; pending and dead ones are kept
+        await db.outbox.create_index(
+            "sent_at", name="outbox_sent_ttl", expireAfterSeconds=OUTBOX_SENT_RETENTION_SECONDS
+        )
+
+    @staticmethod
+    async def enqueue(db: AsyncIOMotorDatabase, kind: str, payload: dict):
+        """Record a push (payload sealed at rest); the dispatcher delivers it in the background."""
+        url = OUTBOX_TARGETS.get(kind)
+        if not url:
+            logger.debug(f"No webhook URL configured for outbox kind {kind}, skipping")
+            return None
+        now = datetime.utcnow()
+        result = await db.outbox.insert_one({
+            "kind": kind,
+            "url": url,
+            "payload": _seal_payload(payload),
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+        })
+        metrics.incr("outbox_enqueued", kind=kind)
+        outbox_dispatcher.wake()
+        return result.inserted_id
+
+    @staticmethod
+    async def status_counts(db: AsyncIOMotorDatabase) -> dict:
+        counts = {STATUS_PENDING: 0, STATUS_PROCESSING: 0, STATUS_SENT: 0, STATUS_DEAD: 0}
+        async for row in db.outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    @staticmethod
+    async def list_entries(db: AsyncIOMotorDatabase, status: Optional[str] = None, limit: int = 100):
+        query = {"status": status} if status else {"status": {"$ne": STATUS_SENT}}
+        cursor = db.outbox.find(query, {"payload": 0}).sort("created_at", -1).limit(limit)
+        entries = await cursor.to_list(length=limit)
+        for entry in entries:
+            entry["_id"] = str(entry["_id"])
+        return entries
+
+    @staticmethod
+    async def retry(db: AsyncIOMotorDatabase, entry_id: str) -> bool:
+        """Move a dead entry back to pending with a fresh attempt budget."""
+        try:
+            obj_id = ObjectId(entry_id)
+        except Exception:
+            return False
+        result = await db.outbox.update_one(
+            {"_id": obj_id, "status": STATUS_DEAD},
+            {"$set": {"status": STATUS_PENDING, "attempts": 0, "next_attempt_at": datetime.utcnow(),
+                      "updated_at": datetime.utcnow()}},
+        )
+        if result.modified_count:
+            outbox_dispatcher.wake()
+        return result.modified_count > 0
+
+
+class OutboxDispatcher:
+    """Background task delivering outbox entries over one shared keep-alive client."""
+
+    def __init__(self):
+        self._db = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        self._client = httpx.AsyncClient(
+            timeout=OUTBOX_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=OUTBOX_BATCH_SIZE, max_keepalive_connections=OUTBOX_BATCH_SIZE),
+        )
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Outbox dispatcher started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Outbox dispatch failed: {str(e)}")
+                delivered = 0
+            if delivered < OUTBOX_BATCH_SIZE:
+                # Nothing (more) due right now: sleep until the poll interval or a new enqueue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def _claim(self, limit: int) -> list:
+        """
+        Lease up to `limit` due entries in three round trips: pick candidate
+        ids, mark the ones still due with a fresh claim id, read those back.
+        Entries another dispatcher leased in between fail the second filter.
+        """
+        now = datetime.utcnow()
+        due = {"$or": [
+            {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+            # lease expired: the process handling it died
+            {"status": STATUS_PROCESSING, "next_attempt_at": {"$lte": now}},
+        ]}
+        candidates = await self._db.outbox.find(due, {"_id": 1}).sort("next_attempt_at", 1).limit(limit).to_list(length=limit)
+        if not candidates:
+            return []
+        claim = ObjectId()
+        await self._db.outbox.update_many(
+            {"_id": {"$in": [c["_id"] for c in candidates]}, **due},
+            {"$set": {
+                "status": STATUS_PROCESSING,
+                "claim": claim,
+                "next_attempt_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                "updated_at": now,
+            }},
+        )
+        return await self._db.outbox.find({"claim": claim}).to_list(length=limit)
+
+    async def dispatch_once(self) -> int:
+        """Claim up to OUTBOX_BATCH_SIZE due entries and deliver them concurrently."""
+        batch = await self._claim(OUTBOX_BATCH_SIZE)
+        if batch:
+            metrics.observe("outbox_batch_size", len(batch))
+            await asyncio.gather(*(self._deliver(entry) for entry in batch))
+        return len(batch)
+
+    async def _deliver(self, entry: dict):
+        start = time.perf_counter()
+        error = None
+        try:
+            response = await self._client.post(entry["url"], json=_open_payload(entry["payload"]))
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        metrics.observe("outbox_push_ms", (time.perf_counter() - start) * 1000, kind=entry["kind"])
+
+        now = datetime.utcnow()
+        if error is None:
+            metrics.incr("outbox_sent", kind=entry["kind"])
+            await self._settle(entry, {
+                "$set": {"status": STATUS_SENT, "sent_at": now, "updated_at": now},
+                "$inc": {"attempts": 1}, "$unset": {"last_error": "", "claim": ""},
+            })
+            return
+
+        attempts = entry.get("attempts", 0) + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            metrics.incr("outbox_dead", kind=entry["kind"])
+            logger.error(f"Outbox entry {entry['_id']} moved to dead letter after {attempts} attempts: {error}")
+            update = {"status": STATUS_DEAD, "last_error": error, "attempts": attempts, "updated_at": now}
+        else:
+            metrics.incr("outbox_retries", kind=entry["kind"])
+            delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(f"Outbox entry {entry['_id']} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+            update = {
+                "status": STATUS_PENDING,
+                "last_error": error,
+                "attempts": attempts,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "updated_at": now,
+            }
+        await self._settle(entry, {"$set": update, "$unset": {"claim": ""}})
+
+    async def _settle(self, entry: dict, update: dict):
+        """Record a delivery outcome, unless the lease expired and another dispatcher re-claimed the entry."""
+        result = await self._db.outbox.update_one({"_id": entry["_id"], "claim": entry["claim"]}, update)
+        if result.matched_count == 0:
+            metrics.incr("outbox_lease_lost", kind=entry["kind"])
+            logger.warning(f"Outbox entry {entry['_id']} was re-claimed before its delivery finished; result discarded")
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from motor.motor_asyncio import AsyncIOMotorCollection
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+import bcrypt
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes; stored hashes with another cost are rehashed on next login
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+# Threads hashing at once (bcrypt releases the GIL, so each one uses a core)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hashes allowed to wait for a worker; beyond that requests are refused with 429
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 8))
+
+BCRYPT_IDENT = b"$2b$"
+# bcrypt only reads the first 72 bytes; older bcrypt/passlib truncated silently, bcrypt>=5 raises
+_BCRYPT_MAX_BYTES = 72
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when more hashes are queued than PASSWORD_HASH_MAX_QUEUE (answer with 429)."""
+
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:_BCRYPT_MAX_BYTES]
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_secret(password), hashed.encode("utf-8"))
+    except (ValueError, TypeError):
+        # Malformed or non-bcrypt stored value
+        return False
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing off the event loop, on a small dedicated thread pool.
+
+    A hash costs 100-300 ms of CPU; run inline it stalls every other request on
+    the worker. Here at most `workers` hashes run at once and at most
+    `max_queue` wait for them; further calls fail fast with PasswordHasherBusy
+    instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_queue: int, rounds: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._in_flight = 0
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self.workers + self.max_queue:
+            metrics.incr("password_hash_rejected")
+            raise PasswordHasherBusy("Too many password checks in progress, retry shortly")
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._in_flight -= 1
+            metrics.observe("password_hash_ms", (time.perf_counter() - start) * 1000, op=fn.__name__.strip("_"))
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> bool:
+        if not isinstance(hashed, str) or not hashed:
+            return False
+        return await self._run(_verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True for hashes made with another variant or cost than the current settings."""
+        try:
+            ident, rounds = hashed.encode("utf-8")[:4], int(hashed[4:6])
+        except (ValueError, AttributeError):
+            return True
+        return ident != BCRYPT_IDENT or rounds != self.rounds
+
+    async def verify_and_upgrade(
+        self, collection: AsyncIOMotorCollection, document: dict, field: str, password: str,
+    ) -> bool:
+        """
+        Check `password` against document[field]; on success, replace a hash made
+        with outdated parameters. The upgrade is best effort: skipped when the
+        pool is busy, and only written if the stored hash is still the one checked.
+        """
+        hashed = document.get(field)
+        if not await self.verify(password, hashed):
+            return False
+        if self.needs_rehash(hashed):
+            try:
+                new_hash = await self.hash(password)
+                await collection.update_one({"_id": document["_id"], field: hashed}, {"$set": {field: new_hash}})
+                metrics.incr("password_rehashed", collection=collection.name)
+            except PasswordHasherBusy:
+                pass
+            except Exception as e:
+                logger.error(f"Could not upgrade password hash in {collection.name}: {str(e)}")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rounds": self.rounds,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_BCRYPT_ROUNDS)
+metrics.register_gauge("password_hasher", password_hasher.stats)
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import hashlib
+import logging
+import os
+import time
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+# Upper bound on how long a cached admin outlives a change made outside this process
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+def token_hash(token: str) -> bytes:
+    """Cache and revocation key of a bearer token (the raw token is never kept)."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class PrincipalCache:
+    """
+    Verified admin tokens and the admin document each one resolved to, keyed by
+    the SHA-256 of the token.
+
+    An entry lives until the token's `exp` or AUTH_CACHE_TTL_SECONDS, whichever
+    comes first, so a hit skips both the JWT signature check and the admins
+    lookup without ever accepting an expired token. Admin writes in this process
+    invalidate the admin's entries; revoked tokens are kept (until their own
+    expiry) in an in-memory set checked before the cache.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, str, dict]]" = OrderedDict()
+        self._keys_by_admin: Dict[str, Set[bytes]] = {}
+        self._revoked: Dict[bytes, float] = {}
+
+    # ---------- PRINCIPALS ----------
+    def get(self, token: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        key = token_hash(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.incr("principal_cache", outcome="miss")
+            return None
+        expires_at, _, admin = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            metrics.incr("principal_cache", outcome="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.incr("principal_cache", outcome="hit")
+        return dict(admin)
+
+    def put(self, token: str, exp, admin: dict):
+        """Cache `admin` for a token that just passed verification (`exp`: its claim, epoch seconds)."""
+        if not self.enabled:
+            return
+        lifetime = self.ttl_seconds
+        if exp is not None:
+            lifetime = min(lifetime, float(exp) - time.time())
+        if lifetime <= 0:
+            return
+
+        key = token_hash(token)
+        username = admin.get("username")
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + lifetime, username, dict(admin))
+        self._keys_by_admin.setdefault(username, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_admin(self, username: str):
+        """Forget every cached token of an admin (call after changing or deleting it)."""
+        for key in list(self._keys_by_admin.get(username, ())):
+            self._drop(key)
+        metrics.incr("principal_cache_invalidations")
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_admin.clear()
+
+    def _drop(self, key: bytes):
+        _, username, _ = self._entries.pop(key)
+        keys = self._keys_by_admin.get(username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_admin[username]
+
+    # ---------- REVOCATION ----------
+    def revoke(self, token: str, exp=None):
+        """Reject `token` from now on (in this process) even though its signature and exp are valid."""
+        key = token_hash(token)
+        now = time.time()
+        self._revoked = {k: until for k, until in self._revoked.items() if until > now}
+        # Past its exp the token is rejected by verification anyway; one without exp never expires
+        self._revoked[key] = float(exp) if exp is not None else float("inf")
+        if key in self._entries:
+            self._drop(key)
+        metrics.incr("principal_cache_revocations")
+
+    def is_revoked(self, token: str) -> bool:
+        until = self._revoked.get(token_hash(token))
+        return until is not None and until > time.time()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "revoked": len(self._revoked),
+        }
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_ENABLED)
+metrics.register_gauge("principal_cache", principal_cache.stats)
@@ -0,0 +1,453 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import os
+import re
+
+from encrypt.blind_index import blind_index
+from encrypt.encryption import run_crypto
+from services.admin_service import AdminService
+from utils import metrics
+from utils.report_normalizer import conversation_turns
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+# Prefix queries ("appoint*") need at least this many characters...
+SEARCH_MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", 3))
+# ...and are exact up to this many; longer prefixes also match words sharing their first SEARCH_MAX_PREFIX chars
+SEARCH_MAX_PREFIX = int(os.getenv("SEARCH_MAX_PREFIX", 10))
+# Conversations read per query term; beyond that the result is flagged as truncated
+SEARCH_MAX_POSTINGS = int(os.getenv("SEARCH_MAX_POSTINGS", 20000))
+SEARCH_SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", 8))
+# Hits per result page that get a snippet (each one decrypts its call or chat message)
+SEARCH_SNIPPET_HITS = int(os.getenv("SEARCH_SNIPPET_HITS", 5))
+# New call logs are indexed by a background worker, at most this many at a time
+SEARCH_INDEX_BATCH_SIZE = int(os.getenv("SEARCH_INDEX_BATCH_SIZE", 10))
+SEARCH_INDEX_POLL_INTERVAL_SECONDS = float(os.getenv("SEARCH_INDEX_POLL_INTERVAL_SECONDS", 2))
+# Call logs failing this often are left to scripts/build_search_index.py
+SEARCH_INDEX_MAX_ATTEMPTS = int(os.getenv("SEARCH_INDEX_MAX_ATTEMPTS", 5))
+# A failed call log waits base * 2^(attempts-1) seconds, capped, before the worker retries it
+SEARCH_INDEX_BACKOFF_BASE_SECONDS = float(os.getenv("SEARCH_INDEX_BACKOFF_BASE_SECONDS", 30))
+SEARCH_INDEX_BACKOFF_MAX_SECONDS = float(os.getenv("SEARCH_INDEX_BACKOFF_MAX_SECONDS", 3600))
+
+SOURCE_CALL = "call"
+SOURCE_CHAT = "chat"
+SOURCES = (SOURCE_CALL, SOURCE_CHAT)
+
+# Call turns worth searching (system prompts and tool payloads are skipped)
+INDEXED_ROLES = {"user", "bot"}
+
+_TOKEN = re.compile(r"\w+")
+_MAX_TOKEN_CHARS = 40
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+# ---------- TOKENIZING ----------
+def tokenize(text: str) -> List[re.Match]:
+    """Word matches of a text; position i in the index is the i-th element."""
+    if not isinstance(text, str):
+        return []
+    return [m for m in _TOKEN.finditer(text.lower()) if len(m.group()) <= _MAX_TOKEN_CHARS]
+
+
+def _terms_of(token: str) -> Iterable[Tuple[str, str]]:
+    yield "term", token
+    for length in range(SEARCH_MIN_PREFIX, min(len(token) - 1, SEARCH_MAX_PREFIX) + 1):
+        yield "prefix", token[:length]
+
+
+def build_postings(units: Iterable[Tuple[int, str]]) -> Dict[str, List[List[int]]]:
+    """
+    {keyed term: [[unit, position], ...]} for (unit number, plaintext) pairs.
+    Only HMACs leave this function.
+    """
+    hits: Dict[Tuple[str, str], List[List[int]]] = defaultdict(list)
+    for unit, text in units:
+        for position, match in enumerate(tokenize(text)):
+            for term in _terms_of(match.group()):
+                hits[term].append([unit, position])
+    return {blind_index(kind, value): term_hits for (kind, value), term_hits in hits.items()}
+
+
+def _call_units(turns: list) -> List[Tuple[int, str]]:
+    return [
+        (i, turn.get("message")) for i, turn in enumerate(turns)
+        if isinstance(turn, dict) and turn.get("role") in INDEXED_ROLES and isinstance(turn.get("message"), str)
+    ]
+
+
+def _chat_text(message) -> Optional[str]:
+    """Searchable text of a decrypted chat message ({"role", "content"} JSON or plain text)."""
+    if isinstance(message, dict):
+        message = message.get("content")
+    return message if isinstance(message, str) else None
+
+
+# ---------- QUERIES ----------
+def parse_query(q: str) -> List[dict]:
+    """
+    'reschedule "next tuesday" dent*' -> clauses ANDed together: single words,
+    quoted phrases (consecutive words) and trailing-* prefixes.
+    """
+    clauses = []
+    for phrase, word in _QUERY_PART.findall(q or ""):
+        text = phrase if phrase else word
+        prefix = bool(word) and word.endswith("*")
+        words = [m.group() for m in tokenize(text)]
+        if not words:
+            continue
+        tokens = [(w, False) for w in words]
+        if prefix and len(words[-1]) >= SEARCH_MIN_PREFIX:
+            tokens[-1] = (words[-1], True)
+        if phrase:
+            clauses.append({"tokens": tokens, "phrase": len(tokens) > 1})
+        else:
+            clauses.extend({"tokens": [token], "phrase": False} for token in tokens)
+    return clauses
+
+
+def _term_hashes(token: Tuple[str, bool]) -> List[str]:
+    word, prefix = token
+    if not prefix:
+        return [blind_index("term", word)]
+    return [blind_index("term", word), blind_index("prefix", word[:SEARCH_MAX_PREFIX])]
+
+
+def _phrase_at(units: Dict[int, List[set]]) -> Optional[Tuple[int, int]]:
+    """(unit, start position) of the first place where the phrase's words follow each other."""
+    for unit, token_positions in units.items():
+        if any(not positions for positions in token_positions):
+            continue
+        for start in sorted(token_positions[0]):
+            if all(start + i in positions for i, positions in enumerate(token_positions)):
+                return unit, start
+    return None
+
+
+def make_snippet(text: str, position: int, length: int = 1) -> str:
+    """The words around `position` (a token index) of a decrypted text."""
+    tokens = tokenize(text)
+    if not tokens:
+        return ""
+    position = min(position, len(tokens) - 1)
+    first = max(position - SEARCH_SNIPPET_WORDS, 0)
+    last = min(position + length - 1 + SEARCH_SNIPPET_WORDS, len(tokens) - 1)
+    snippet = text[tokens[first].start():tokens[last].end()]
+    return ("…" if first > 0 else "") + snippet + ("…" if last < len(tokens) - 1 else "")
+
+
+class SearchIndexService:
+    """
+    Keyword search over call transcripts and chat turns without storing plaintext.
+
+    Text is tokenized at ingest, before it is encrypted; every word (and its
+    prefixes) becomes an HMAC term under the blind index key, stored in
+    search_postings as {term, source, ref, hits: [[unit, position], ...]}: one
+    document per term per conversation, so the index grows with vocabulary rather
+    than with turns. `unit` is the turn of the call or the chat message position;
+    positions make phrase queries possible. Queries hash their words the same way
+    and only touch the index.
+    """
+
+    @staticmethod
+    async def ensure_indexes(db: AsyncIOMotorDatabase):
+        await db.search_postings.create_index(
+            [("term", 1), ("source", 1), ("ref", 1)], unique=True, name="search_postings_term"
+        )
+        await db.callslog.create_index(
+            [("search_pending", 1), ("search_next_attempt_at", 1)], name="callslog_search_due", sparse=True
+        )
+
+    # ---------- INGEST ----------
+    @staticmethod
+    async def _write(db: AsyncIOMotorDatabase, source: str, ref: ObjectId, postings: Dict[str, list]):
+        """
+        Merge hits into the postings of one conversation. $addToSet makes
+        re-indexing (backfill next to live ingest) a no-op instead of a duplicate.
+        """
+        if not postings:
+            return
+        terms = list(postings)
+
+        def merge(term: str, upsert: bool) -> UpdateOne:
+            return UpdateOne(
+                {"term": term, "source": source, "ref": ref},
+                {"$addToSet": {"hits": {"$each": postings[term]}}},
+                upsert=upsert,
+            )
+
+        try:
+            await db.search_postings.bulk_write([merge(term, True) for term in terms], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            # A concurrent write created these postings between our match and insert
+            await db.search_postings.bulk_write([merge(terms[err["index"]], False) for err in errors], ordered=False)
+        metrics.incr("search_postings_written", len(terms), source=source)
+
+    @staticmethod
+    async def index_call_turns(db: AsyncIOMotorDatabase, call_log_id: ObjectId, turns: list):
+        units = _call_units(turns)
+        size = sum(len(text) for _, text in units)
+        postings = await run_crypto(build_postings, units, size=size)
+        await SearchIndexService._write(db, SOURCE_CALL, call_log_id, postings)
+        await db.callslog.update_one(
+            {"_id": call_log_id},
+            {"$set": {"search_indexed": True}, "$unset": {"search_pending": "", "search_attempts": ""}},
+        )
+
+    @staticmethod
+    async def index_chat_messages(db: AsyncIOMotorDatabase, chat_ref: ObjectId, first: int, messages: list):
+        """Index chat messages appended at positions first, first + 1, ... (never raises)."""
+        if not SEARCH_INDEX_ENABLED:
+            return
+        try:
+            units = [(first + i, _chat_text(m)) for i, m in enumerate(messages)]
+            units = [(unit, text) for unit, text in units if text]
+            size = sum(len(text) for _, text in units)
+            postings = await run_crypto(build_postings, units, size=size)
+            await SearchIndexService._write(db, SOURCE_CHAT, chat_ref, postings)
+            if first == 0:
+                await db.chats.update_one({"_id": chat_ref}, {"$set": {"search_indexed": True}})
+        except Exception as e:
+            logger.error(f"Could not index chat {chat_ref} for search: {str(e)}")
+
+    # ---------- STORED DOCUMENTS (worker and backfill) ----------
+    @staticmethod
+    async def index_existing_call_log(db: AsyncIOMotorDatabase, document: dict):
+        """Index a stored call log (archived or legacy inline body)."""
+        paths = [("body", "message", "artifact", "messages"), ("body", "message", "messages")]
+        decrypted = await AdminService.decrypt_call_log(db, document, paths)
+        body = decrypted.get("body")
+        turns = conversation_turns(body) if isinstance(body, dict) else []
+        await SearchIndexService.index_call_turns(db, document["_id"], turns)
+
+    @staticmethod
+    async def index_existing_chat(db: AsyncIOMotorDatabase, document: dict):
+        """Index every message a stored chat has right now (later appends index themselves)."""
+        decrypted = await AdminService.decrypt_chat(db, document)
+        await SearchIndexService.index_chat_messages(db, document["_id"], 0, decrypted.get("messages") or [])
+
+    # ---------- SEARCH ----------
+    @staticmethod
+    async def search(db: AsyncIOMotorDatabase, q: str, sources=SOURCES, limit: int = 20) -> dict:
+        """
+        Ranked call/chat ids for a query; snippets are decrypted for the returned hits only.
+        Rarest word first: its postings give the candidates, the others are only read for them.
+        """
+        clauses = parse_query(q)
+        result = {"hits": [], "candidates": 0, "truncated": False}
+        if not clauses:
+            return result
+
+        tokens = list(dict.fromkeys(token for clause in clauses for token in clause["tokens"]))
+        hashes = {token: _term_hashes(token) for token in tokens}
+        source_filter = {"$in": list(sources)}
+        df = {}
+        for token in tokens:
+            df[token] = await db.search_postings.count_documents(
+                {"term": {"$in": hashes[token]}, "source": source_filter}, limit=SEARCH_MAX_POSTINGS
+            )
+        tokens.sort(key=df.get)
+        if df[tokens[0]] == 0:
+            return result
+
+        # (source, ref) -> token -> unit -> positions
+        matches: Dict[Tuple[str, ObjectId], Dict[tuple, Dict[int, set]]] = {}
+        projection = {"_id": 0, "source": 1, "ref": 1, "hits": 1}
+        for i, token in enumerate(tokens):
+            query = {"term": {"$in": hashes[token]}, "source": source_filter}
+            if i > 0:
+                query["ref"] = {"$in": list({ref for _, ref in matches})}
+            postings = await db.search_postings.find(query, projection).to_list(length=SEARCH_MAX_POSTINGS)
+            if i == 0:
+                result["truncated"] = len(postings) >= SEARCH_MAX_POSTINGS
+            found = defaultdict(lambda: defaultdict(set))
+            for posting in postings:
+                for unit, position in posting["hits"]:
+                    found[(posting["source"], posting["ref"])][unit].add(position)
+            if i == 0:
+                matches = {key: {token: units} for key, units in found.items()}
+            else:
+                matches = {key: {**hits, token: found[key]} for key, hits in matches.items() if key in found}
+            if not matches:
+                return result
+
+        # Phrases: every word in one unit at consecutive positions
+        anchors = {}
+        for key, hits in list(matches.items()):
+            for clause in clauses:
+                if not clause["phrase"]:
+                    continue
+                units = {
+                    unit: [hits[token].get(unit, set()) for token in clause["tokens"]]
+                    for unit in hits[clause["tokens"][0]]
+                }
+                found_at = _phrase_at(units)
+                if found_at is None:
+                    del matches[key]
+                    break
+                anchors.setdefault(key, (*found_at, len(clause["tokens"])))
+        result["candidates"] = len(matches)
+
+        # tf-idf: rare words and repeated matches rank first
+        total = max(await db.callslog.estimated_document_count() + await db.chats.estimated_document_count(), 1)
+        scored = []
+        for key, hits in matches.items():
+            score = 0.0
+            for token, units in hits.items():
+                tf = sum(len(positions) for positions in units.values())
+                score += (1 + math.log(tf)) * math.log(1 + total / max(df[token], 1))
+            scored.append((score, key))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        snippets = []
+        for rank, (score, key) in enumerate(scored[:limit]):
+            source, ref = key
+            if key in anchors:
+                unit, position, length = anchors[key]
+            else:
+                rarest = matches[key][tokens[0]]
+                unit = min(rarest)
+                position, length = min(rarest[unit]), 1
+            hit = {"source": source, "id": str(ref), "score": round(score, 3), "unit": unit, "snippet": None}
+            result["hits"].append(hit)
+            if rank < SEARCH_SNIPPET_HITS:
+                snippets.append(SearchIndexService._fill_snippet(db, hit, ref, position, length))
+        await asyncio.gather(*snippets)
+        metrics.incr("search_queries")
+        return result
+
+    @staticmethod
+    async def _fill_snippet(db: AsyncIOMotorDatabase, hit: dict, ref: ObjectId, position: int, length: int):
+        try:
+            hit["snippet"] = await SearchIndexService._snippet(db, hit["source"], ref, hit["unit"], position, length)
+        except Exception as e:
+            logger.error(f"Could not build search snippet for {hit['source']} {ref}: {str(e)}")
+
+    @staticmethod
+    async def _snippet(db: AsyncIOMotorDatabase, source: str, ref: ObjectId, unit: int, position: int, length: int):
+        """Decrypt one unit of one hit and cut the words around the match."""
+        if source == SOURCE_CALL:
+            document = await db.callslog.find_one({"_id": ref})
+            if document is None:
+                return None
+            paths = [("body", "message", "artifact", "messages"), ("body", "message", "messages")]
+            body = (await AdminService.decrypt_call_log(db, document, paths)).get("body")
+            turns = conversation_turns(body) if isinstance(body, dict) else []
+            text = turns[unit].get("message") if unit < len(turns) else None
+        else:
+            document = await db.chats.find_one({"_id": ref}, AdminService.chat_projection(None, unit, 1))
+            if document is None:
+                return None
+            messages = (await AdminService.decrypt_chat(db, document, None, unit, 1)).get("messages") or []
+            text = _chat_text(messages[0]) if messages else None
+        return make_snippet(text, position, length) if isinstance(text, str) else None
+
+
+class SearchIndexWorker:
+    """
+    Background task indexing new call logs off the webhook path.
+
+    save_call_log flags each summary with search_pending; the worker picks
+    flagged call logs up in small batches, decrypts their stored conversation
+    and writes the postings. The flag lives in Mongo, so call logs received
+    just before a restart are indexed after it. A failing call log is retried
+    with exponential backoff and dropped after SEARCH_INDEX_MAX_ATTEMPTS (the
+    backfill script retries it).
+    """
+
+    def __init__(self):
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.indexed = 0
+        self.failed = 0
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if not SEARCH_INDEX_ENABLED:
+            return
+        self._db = db
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Search index worker started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                done = await self.index_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Search indexing failed: {str(e)}")
+                done = 0
+            if done < SEARCH_INDEX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), SEARCH_INDEX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def index_pending(self, db: AsyncIOMotorDatabase = None) -> int:
+        """Index one batch of due call logs; returns how many were indexed successfully."""
+        db = db if db is not None else self._db
+        due = {
+            "search_pending": True,
+            "$or": [
+                {"search_next_attempt_at": {"$exists": False}},
+                {"search_next_attempt_at": {"$lte": datetime.utcnow()}},
+            ],
+        }
+        batch = await db.callslog.find(due).sort("search_next_attempt_at", 1).limit(SEARCH_INDEX_BATCH_SIZE).to_list(
+            length=SEARCH_INDEX_BATCH_SIZE
+        )
+        results = await asyncio.gather(*(self._index(db, document) for document in batch))
+        return sum(results)
+
+    async def _index(self, db: AsyncIOMotorDatabase, document: dict) -> bool:
+        try:
+            await SearchIndexService.index_existing_call_log(db, document)
+            self.indexed += 1
+            return True
+        except Exception as e:
+            self.failed += 1
+            attempts = document.get("search_attempts", 0) + 1
+            update = {"$set": {"search_attempts": attempts}}
+            if attempts >= SEARCH_INDEX_MAX_ATTEMPTS:
+                logger.error(f"Dropping call log {document['_id']} from search indexing after {attempts} attempts: {str(e)}")
+                update["$unset"] = {"search_pending": "", "search_next_attempt_at": ""}
+            else:
+                delay = min(SEARCH_INDEX_BACKOFF_MAX_SECONDS, SEARCH_INDEX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+                logger.error(
+                    f"Could not index call log {document['_id']} for search (attempt {attempts}), "
+                    f"retrying in {delay:.0f}s: {str(e)}"
+                )
+                update["$set"]["search_next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+            await db.callslog.update_one({"_id": document["_id"]}, update)
+            return False
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, "indexed": self.indexed, "failed": self.failed}
+
+
+search_index_worker = SearchIndexWorker()
+metrics.register_gauge("search_index_worker", search_index_worker.stats)
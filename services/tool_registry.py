@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", 10))
+
+ToolHandler = Callable[[AsyncIOMotorDatabase, dict, dict], Awaitable[object]]
+
+_tools: Dict[str, Tuple[ToolHandler, float]] = {}
+
+
+class ToolCallError(Exception):
+    """Raised by a tool handler to return an error entry for its toolCallId."""
+
+
+def register_tool(name: str, timeout: Optional[float] = None):
+    """Register an async handler(db, parameters, context) for a VAPI function name."""
+    def decorator(fn: ToolHandler) -> ToolHandler:
+        _tools[name] = (fn, timeout or TOOL_CALL_TIMEOUT_SECONDS)
+        return fn
+    return decorator
+
+
+async def _run_tool_call(db: AsyncIOMotorDatabase, tool_call: dict, context: dict) -> dict:
+    tool_call_id = tool_call.get("id")
+    function = tool_call.get("function") or {}
+    name = function.get("name")
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        if name not in _tools:
+            outcome = "unknown"
+            return {"toolCallId": tool_call_id, "error": f"Tool {name} is not handled."}
+        handler, timeout = _tools[name]
+
+        parameters = function.get("arguments") or {}
+        if isinstance(parameters, str):
+            try:
+                parameters = json.loads(parameters)
+            except json.JSONDecodeError as e:
+                outcome = "error"
+                return {"toolCallId": tool_call_id, "error": f"Invalid arguments JSON: {str(e)}"}
+
+        try:
+            result = await asyncio.wait_for(handler(db, parameters, context), timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logger.error(f"Tool {name} timed out after {timeout}s (toolCallId {tool_call_id})")
+            return {"toolCallId": tool_call_id, "error": f"Tool {name} timed out"}
+        except ToolCallError as e:
+            outcome = "error"
+            return {"toolCallId": tool_call_id, "error": str(e)}
+        except Exception as e:
+            outcome = "error"
+            logger.exception(f"Tool {name} failed (toolCallId {tool_call_id}): {str(e)}")
+            return {"toolCallId": tool_call_id, "error": f"Processing error: {str(e)}"}
+
+        if not isinstance(result, str):
+            result = json.dumps(result, default=str)
+        return {"toolCallId": tool_call_id, "result": result}
+    finally:
+        metrics.observe("tool_call_ms", (time.perf_counter() - start) * 1000, tool=name, outcome=outcome)
+
+
+async def dispatch_tool_calls(db: AsyncIOMotorDatabase, tool_calls: list, context: dict) -> list:
+    """Run every tool call concurrently; results keep the order of tool_calls."""
+    return await asyncio.gather(*(_run_tool_call(db, tc, context) for tc in tool_calls))
@@ -1,10 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.admin import UserInDB, UserCreate
-from passlib.context import CryptContext
+from services.password_hasher import password_hasher
 from typing import Optional
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 class AdminService:
     @staticmethod
     async def get_admin_by_username(db: AsyncIOMotorDatabase, username: str) -> Optional[UserInDB]:
@@ -17,7 +15,7 @@ class AdminService:
     @staticmethod
     async def create_admin(db: AsyncIOMotorDatabase, admin: UserCreate) -> UserInDB:
         """Create a new admin with hashed password."""
-        hashed_password = pwd_context.hash(admin.password)
+        hashed_password = await password_hasher.hash(admin.password)
         admin_dict = admin.dict(exclude={"password"})
         admin_dict["password"] = hashed_password  # keep consistent naming
         result = await db.admins.insert_one(admin_dict)
@@ -25,6 +23,6 @@ class AdminService:
         return UserInDB(**created_admin)
 
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Verify a password against the hashed version."""
-        return pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
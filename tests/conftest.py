@@ -0,0 +1,25 @@
+import asyncio
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+# Test-only settings, set before any application module reads its environment
+os.environ.setdefault("ENCRYPTION_KEYS", Fernet.generate_key().decode())
+os.environ.setdefault("BLIND_INDEX_KEY", "dGVzdC1ibGluZC1pbmRleC1rZXktMzItYnl0ZXMhISE=")
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key-with-enough-bytes")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database per test."""
+    return AsyncMongoMockClient()["test"]
+
+
+def run(coro):
+    """Run a coroutine to completion (tests are plain functions, no async plugin needed)."""
+    return asyncio.run(coro)
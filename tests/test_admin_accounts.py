@@ -0,0 +1,43 @@
+import httpx
+
+from conftest import run
+
+
+def _client(db):
+    import main
+    from database import get_database
+
+    main.app.dependency_overrides[get_database] = lambda: db
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+def test_admin_changes_reach_cached_sessions(db):
+    from dependencies.auth import create_access_token
+    from services.principal_cache import principal_cache
+
+    async def scenario():
+        await db.admins.insert_many([
+            {"username": "alice", "hashed_password": "x", "role": "admin"},
+            {"username": "bob", "hashed_password": "x", "role": "admin"},
+        ])
+        alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+        bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob'})}"}
+        async with _client(db) as client:
+            statuses = [(await client.get("/admin/metrics", headers=bob)).status_code]
+            # bob is now cached; a role change must be visible on his next request
+            statuses.append((await client.patch("/admin/admins/bob", json={"role": "viewer"}, headers=alice)).status_code)
+            role = principal_cache.get(bob["Authorization"][7:])
+            statuses.append((await client.delete("/admin/admins/bob", headers=alice)).status_code)
+            statuses.append((await client.get("/admin/metrics", headers=bob)).status_code)
+            statuses.append((await client.delete("/admin/admins/alice", headers=alice)).status_code)
+            statuses.append((await client.patch("/admin/admins/nobody", json={"role": "x"}, headers=alice)).status_code)
+        return statuses, role
+
+    try:
+        statuses, cached_after_update = run(scenario())
+    finally:
+        import main
+        main.app.dependency_overrides.clear()
+        principal_cache.clear()
+    assert cached_after_update is None
+    assert statuses == [200, 200, 200, 403, 400, 404]
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from conftest import run
+from database import ensure_indexes
+from models.clinic import Appointment
+from services.appointment_service import AppointmentService
+
+SLOT = datetime(2026, 3, 2, 9, 30)
+
+
+def appointment(patient: str, doctor: str = "Dr. Grey", when: datetime = SLOT) -> Appointment:
+    return Appointment(patient_name=patient, doctor_name=doctor, appointment_time=when, call_id=f"call-{patient}")
+
+
+def test_concurrent_bookings_for_one_doctor_slot_keep_one(db):
+    async def scenario():
+        await AppointmentService.ensure_indexes(db)
+        results = await asyncio.gather(
+            *(AppointmentService.create_appointment(db, appointment(f"patient {i}")) for i in range(20))
+        )
+        return results, await db.appointments.count_documents({})
+
+    results, stored = run(scenario())
+    booked = [r for r in results if r is not None]
+    assert len(booked) == 1
+    assert stored == 1
+    assert booked[0]["id"]
+
+
+def test_patient_cannot_hold_two_doctors_at_once(db):
+    async def scenario():
+        await AppointmentService.ensure_indexes(db)
+        first = await AppointmentService.create_appointment(db, appointment("Ann", "Dr. Grey"))
+        second = await AppointmentService.create_appointment(db, appointment("Ann", "Dr. House"))
+        later = await AppointmentService.create_appointment(
+            db, appointment("Ann", "Dr. House", datetime(2026, 3, 2, 10, 30))
+        )
+        return first, second, later
+
+    first, second, later = run(scenario())
+    assert first is not None
+    assert second is None
+    assert later is not None
+
+
+def test_startup_fails_when_slot_indexes_cannot_be_built(db):
+    async def scenario():
+        # Double bookings stored before the unique indexes existed
+        await db.appointments.insert_many([
+            {"patient_name": "Ann", "doctor_name": "Dr. Grey", "appointment_time": SLOT},
+            {"patient_name": "Bob", "doctor_name": "Dr. Grey", "appointment_time": SLOT},
+        ])
+        await ensure_indexes(db)
+
+    with pytest.raises(DuplicateKeyError):
+        run(scenario())
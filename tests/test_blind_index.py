@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+from encrypt.blind_index import email_index, phone_index
+
+
+def test_lookups_ignore_formatting():
+    assert email_index(" Ann@Example.com ") == email_index("ann@example.com")
+    assert phone_index("+1 (555) 010-0100") == phone_index("+15550100100")
+    assert email_index("ann@example.com") != email_index("bob@example.com")
+
+
+def test_import_fails_without_blind_index_key():
+    env = {k: v for k, v in os.environ.items() if k != "BLIND_INDEX_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import encrypt.blind_index"], env=env, capture_output=True, text=True,
+    )
+    assert result.returncode != 0
+    assert "BLIND_INDEX_KEY not set" in result.stderr
@@ -0,0 +1,80 @@
+import copy
+import json
+
+import pytest
+
+from benchmarks.payloads import make_report
+from conftest import run
+from services import call_log_archive
+from services.admin_service import AdminService
+from services.batch_writer import BatchWriter
+from services.call_log_archive import CallLogArchive
+from services.webhook_service import WebhookService
+from utils.report_decoder import decode_end_of_call
+
+
+def _with_system_turn():
+    report = make_report(20)
+    report["message"]["artifact"]["messages"].insert(
+        0, {"role": "system", "message": "system prompt", "time": 1, "secondsFromStart": 0}
+    )
+    return report
+
+
+def _with_edited_conversation():
+    report = make_report(20)
+    report["message"]["conversation"][3]["content"] += " (edited)"
+    return report
+
+
+def _without_artifact():
+    report = make_report(20)
+    del report["message"]["artifact"]
+    return report
+
+
+def _with_tool_call_turn():
+    report = make_report(20)
+    report["message"]["messages"].append({"role": "tool_calls", "toolCalls": [{"id": "tool-1"}]})
+    return report
+
+
+REPORTS = {
+    "small": lambda: make_report(6),
+    "median": lambda: make_report(60),
+    "large": lambda: make_report(1200),
+    "system turn": _with_system_turn,
+    "edited conversation": _with_edited_conversation,
+    "no artifact": _without_artifact,
+    "tool-call turn": _with_tool_call_turn,
+}
+
+
+@pytest.mark.parametrize("normalize", [True, False], ids=["normalized", "raw"])
+@pytest.mark.parametrize("name", list(REPORTS))
+def test_archive_round_trip_is_exact(db, name, normalize, monkeypatch):
+    monkeypatch.setattr(call_log_archive, "CALLSLOG_ARCHIVE_NORMALIZE", normalize)
+    raw = json.dumps(REPORTS[name]()).encode()
+
+    async def scenario():
+        info = await CallLogArchive.store(db, "log-1", raw)
+        await BatchWriter.flush_all()
+        return info, await CallLogArchive.load_body(db, "log-1")
+
+    info, body = run(scenario())
+    assert info["format"] == ("normalized" if normalize else "raw")
+    assert body == json.loads(raw)
+
+
+def test_stored_call_log_reads_back_as_received(db):
+    report = make_report(60)
+
+    async def scenario():
+        await WebhookService.handle_end_of_call(db, decode_end_of_call(json.dumps(report).encode()))
+        await BatchWriter.flush_all()
+        stored = await db.callslog.find_one({})
+        return stored, await AdminService.get_decrypted_call_log(db, str(stored["_id"]))
+
+    stored, decrypted = run(scenario())
+    assert "body" not in stored
+    assert decrypted["body"] == copy.deepcopy(report)
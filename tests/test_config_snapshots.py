@@ -0,0 +1,17 @@
+from conftest import run
+from services.config_snapshot_service import ConfigSnapshotService, extract_snapshots
+
+
+def test_restored_snapshots_do_not_share_the_cache(db):
+    body = {"message": {"assistant": {"name": "Clinic", "model": {"model": "gpt-4o"}}}}
+    snapshots = extract_snapshots(body)
+    digest = snapshots["assistant"][0]
+
+    async def scenario():
+        await ConfigSnapshotService.put_many(db, snapshots)
+        first = await ConfigSnapshotService.restore(db, {"message": {"assistant": {"_snapshot": digest}}})
+        first["message"]["assistant"]["model"]["model"] = "changed"
+        return await ConfigSnapshotService.restore(db, {"message": {"assistant": {"_snapshot": digest}}})
+
+    second = run(scenario())
+    assert second["message"]["assistant"] == {"name": "Clinic", "model": {"model": "gpt-4o"}}
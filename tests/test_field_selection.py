@@ -0,0 +1,60 @@
+import httpx
+import pytest
+
+from conftest import run
+from utils.field_selection import mongo_slice, slice_list
+
+MESSAGES = list(range(10))
+
+
+@pytest.mark.parametrize("offset, limit, expected", [
+    (None, None, MESSAGES),
+    (None, 3, [0, 1, 2]),
+    (2, 3, [2, 3, 4]),
+    (-3, None, [7, 8, 9]),
+    (-3, 2, [7, 8]),
+    (-20, 2, [0, 1]),
+    (8, 5, [8, 9]),
+])
+def test_slice_list_matches_mongo_slice(offset, limit, expected):
+    assert slice_list(MESSAGES, offset, limit) == expected
+    window = mongo_slice(offset, limit)
+    if window is None:
+        return
+    if isinstance(window, int):
+        assert MESSAGES[:window] == expected
+    else:
+        start = window[0] if window[0] >= 0 else max(len(MESSAGES) + window[0], 0)
+        assert MESSAGES[start:start + window[1]] == expected
+
+
+@pytest.mark.parametrize("offset", [None, 0, -5])
+@pytest.mark.parametrize("limit", [0, -2])
+def test_non_positive_limit_is_rejected(offset, limit):
+    with pytest.raises(ValueError):
+        mongo_slice(offset, limit)
+    with pytest.raises(ValueError):
+        slice_list(MESSAGES, offset, limit)
+
+
+def test_admin_endpoints_answer_422_for_non_positive_limit(db):
+    import main
+    from database import get_database
+    from dependencies.auth import get_current_admin_user
+
+    main.app.dependency_overrides[get_database] = lambda: db
+    main.app.dependency_overrides[get_current_admin_user] = lambda: {"username": "admin"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                (await client.get(path, params={"message_offset": -5, "message_limit": -2})).status_code
+                for path in ("/admin/chats/0123456789abcdef01234567", "/admin/call-logs/0123456789abcdef01234567",
+                             "/admin/export/chats")
+            ]
+
+    try:
+        assert run(scenario()) == [422, 422, 422]
+    finally:
+        main.app.dependency_overrides.clear()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import httpx
+import pytest
+
+from conftest import run
+from services import outbox_service
+from services.outbox_service import OutboxService, outbox_dispatcher
+
+
+class StubMake:
+    """Make.com webhook stand-in answering 503 to the first `failures` posts."""
+
+    def __init__(self, failures: int = 0):
+        self.received = []
+        self.failures = failures
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if stub.failures > 0:
+                    stub.failures -= 1
+                    self.send_response(503)
+                else:
+                    stub.received.append(json.loads(body))
+                    self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubMake(failures=2)
+    monkeypatch.setitem(outbox_service.OUTBOX_TARGETS, "booking", stub.url)
+    monkeypatch.setitem(outbox_service.OUTBOX_TARGETS, "sms", "http://127.0.0.1:1/unreachable")
+    monkeypatch.setattr(outbox_service, "OUTBOX_POLL_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(outbox_service, "OUTBOX_BACKOFF_BASE_SECONDS", 0.05)
+    monkeypatch.setattr(outbox_service, "OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(outbox_service, "OUTBOX_BATCH_SIZE", 4)
+    yield stub
+    stub.close()
+
+
+async def _wait_until(condition, timeout: float = 10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await condition():
+        assert asyncio.get_running_loop().time() < deadline, "outbox did not settle"
+        await asyncio.sleep(0.05)
+
+
+def test_pushes_are_delivered_through_retries_and_dead_lettered(db, stub):
+    async def scenario():
+        await OutboxService.ensure_indexes(db)
+        await outbox_dispatcher.start(db)
+        try:
+            for i in range(6):
+                await OutboxService.enqueue(db, "booking", {"patient_name": f"patient {i}", "n": i})
+            await OutboxService.enqueue(db, "sms", {"patient_phone": "+15550100"})
+
+            async def settled():
+                counts = await OutboxService.status_counts(db)
+                return counts["sent"] == 6 and counts["dead"] == 1
+            await _wait_until(settled)
+        finally:
+            await outbox_dispatcher.stop()
+        return await db.outbox.find().to_list(None)
+
+    entries = run(scenario())
+    assert sorted(p["n"] for p in stub.received) == list(range(6))
+    # Payloads are sealed at rest and the lease marker is cleared
+    for entry in entries:
+        assert outbox_service.is_sealed(entry["payload"])
+        assert b"patient" not in bytes(entry["payload"])
+        assert "claim" not in entry
+    dead = [e for e in entries if e["status"] == "dead"]
+    assert dead[0]["attempts"] == 3 and dead[0]["kind"] == "sms"
+
+
+def test_claim_leases_each_entry_once(db, monkeypatch):
+    monkeypatch.setitem(outbox_service.OUTBOX_TARGETS, "booking", "http://127.0.0.1:1/unused")
+
+    async def scenario():
+        for i in range(10):
+            await OutboxService.enqueue(db, "booking", {"n": i})
+        outbox_dispatcher._db = db
+        try:
+            first, second, third = await asyncio.gather(
+                outbox_dispatcher._claim(4), outbox_dispatcher._claim(4), outbox_dispatcher._claim(4)
+            )
+        finally:
+            outbox_dispatcher._db = None
+        return first, second, third
+
+    batches = run(scenario())
+    ids = [entry["_id"] for batch in batches for entry in batch]
+    assert len(ids) == len(set(ids)) == 10
+
+
+def test_late_delivery_does_not_overwrite_a_newer_lease(db, stub, monkeypatch):
+    monkeypatch.setattr(outbox_service, "OUTBOX_LEASE_SECONDS", 0)
+
+    async def scenario():
+        await OutboxService.enqueue(db, "booking", {"n": 0})
+        outbox_dispatcher._db = db
+        outbox_dispatcher._client = httpx.AsyncClient()
+        try:
+            [stale] = await outbox_dispatcher._claim(1)
+            [current] = await outbox_dispatcher._claim(1)
+            # The stale holder's delivery fails (the stub answers 503) after its lease was taken over
+            await outbox_dispatcher._deliver(stale)
+        finally:
+            await outbox_dispatcher._client.aclose()
+            outbox_dispatcher._client = None
+            outbox_dispatcher._db = None
+        return current, await db.outbox.find_one({})
+
+    current, entry = run(scenario())
+    assert entry["status"] == "processing" and entry["claim"] == current["claim"]
+    assert entry.get("attempts", 0) == 0 and "last_error" not in entry
@@ -0,0 +1,45 @@
+import json
+import tempfile
+
+import pytest
+
+from services.idempotency_service import IdempotencyService
+from utils.report_decoder import decode_end_of_call, decode_end_of_call_file
+
+
+def _spooled(raw: bytes):
+    spool = tempfile.TemporaryFile()
+    spool.write(raw)
+    spool.flush()
+    return spool
+
+
+@pytest.mark.parametrize("timestamp", ["1700000000000", "1700000000000.0", "1.7e12"])
+def test_in_memory_and_spooled_bodies_give_the_same_idempotency_key(timestamp):
+    raw = (
+        '{"message":{"timestamp":%s,"type":"end-of-call-report","call":{"id":"call-1"},'
+        '"durationSeconds":12}}' % timestamp
+    ).encode()
+    with _spooled(raw) as spool:
+        spooled = decode_end_of_call_file(spool)
+    in_memory = decode_end_of_call(raw)
+
+    assert in_memory.timestamp == spooled.timestamp == 1700000000000
+    assert type(in_memory.timestamp) is type(spooled.timestamp) is int
+    assert IdempotencyService.make_key("call-1", "end-of-call-report", in_memory.timestamp) == \
+        IdempotencyService.make_key("call-1", "end-of-call-report", spooled.timestamp)
+
+
+def test_spooled_body_decodes_the_same_fields():
+    body = {"message": {
+        "timestamp": 1700000000000, "type": "end-of-call-report", "call": {"id": "call-1"},
+        "durationSeconds": 42.5, "endedReason": "customer-ended-call",
+        "metadata": {"user_email": "ann@example.com"}, "artifact": {"messages": [{"role": "user"}] * 50},
+    }}
+    raw = json.dumps(body).encode()
+    with _spooled(raw) as spool:
+        spooled = decode_end_of_call_file(spool)
+    in_memory = decode_end_of_call(raw)
+
+    for field in in_memory.FIELDS:
+        assert getattr(spooled, field) == getattr(in_memory, field), field
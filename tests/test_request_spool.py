@@ -0,0 +1,33 @@
+from starlette.requests import Request
+
+from conftest import run
+from utils import request_spool
+from utils.request_spool import read_body
+
+
+def _request(chunks, content_length=None):
+    headers = [(b"content-length", str(content_length).encode())] if content_length is not None else []
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def test_small_body_stays_in_memory():
+    raw, spool = run(read_body(_request([b'{"message":', b"{}}"], content_length=12)))
+    assert raw == b'{"message":{}}' and spool is None
+
+
+def test_chunked_body_past_threshold_is_spooled(monkeypatch):
+    monkeypatch.setattr(request_spool, "WEBHOOK_SPOOL_THRESHOLD_BYTES", 1000)
+    monkeypatch.setattr(request_spool, "WEBHOOK_SPOOL_WRITE_BYTES", 700)
+    chunks = [bytes([65 + i % 26]) * 300 for i in range(20)]
+
+    raw, spool = run(read_body(_request(chunks)))
+    try:
+        assert raw is None
+        assert spool.read() == b"".join(chunks)
+    finally:
+        spool.close()
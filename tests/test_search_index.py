@@ -0,0 +1,96 @@
+import json
+
+from conftest import run
+from services import search_index
+from services.batch_writer import BatchWriter
+from services.search_index import SearchIndexService, search_index_worker
+from services.webhook_service import WebhookService
+from utils.report_decoder import decode_end_of_call
+
+
+def _report(call_id: str, *turns: str) -> bytes:
+    messages = [{"role": "user" if i % 2 else "bot", "message": text} for i, text in enumerate(turns)]
+    return json.dumps({"message": {
+        "timestamp": 1700000000000, "type": "end-of-call-report", "call": {"id": call_id},
+        "durationSeconds": 30, "artifact": {"messages": messages}, "messages": messages,
+    }}).encode()
+
+
+async def _receive(db, *reports: bytes):
+    await SearchIndexService.ensure_indexes(db)
+    for raw in reports:
+        await WebhookService.handle_end_of_call(db, decode_end_of_call(raw))
+    await BatchWriter.flush_all()
+
+
+def test_calls_are_indexed_by_the_worker_not_the_webhook(db):
+    async def scenario():
+        await _receive(db, _report("call-1", "Hello, how can I help?", "I need to reschedule my dentist visit"))
+        before = await db.search_postings.count_documents({})
+        indexed = await search_index_worker.index_pending(db)
+        found = await SearchIndexService.search(db, '"reschedule my" dent*')
+        return before, indexed, found, await db.callslog.find_one({})
+
+    before, indexed, found, call_log = run(scenario())
+    assert before == 0
+    assert indexed == 1
+    assert "search_pending" not in call_log and call_log["search_indexed"] is True
+    assert [hit["unit"] for hit in found["hits"]] == [1]
+    assert "reschedule my dentist" in found["hits"][0]["snippet"]
+
+
+def test_only_the_first_hits_get_snippets(db, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_SNIPPET_HITS", 2)
+
+    async def scenario():
+        await _receive(db, *(_report(f"call-{i}", "Clinic here", f"my tooth hurts since day {i}") for i in range(4)))
+        await search_index_worker.index_pending(db)
+        return await SearchIndexService.search(db, "tooth")
+
+    found = run(scenario())
+    snippets = [hit["snippet"] for hit in found["hits"]]
+    assert len(snippets) == 4
+    assert all("tooth hurts" in snippet for snippet in snippets[:2])
+    assert snippets[2:] == [None, None]
+
+
+def test_failing_call_log_is_dropped_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_BACKOFF_BASE_SECONDS", 0)
+    tried = []
+
+    async def broken(db, document):
+        tried.append(document["_id"])
+        raise RuntimeError("archive unreadable")
+    monkeypatch.setattr(SearchIndexService, "index_existing_call_log", broken)
+
+    async def scenario():
+        await _receive(db, _report("call-1", "Hi", "Book me in"))
+        indexed = [await search_index_worker.index_pending(db) for _ in range(3)]
+        return indexed, await db.callslog.find_one({})
+
+    indexed, call_log = run(scenario())
+    assert indexed == [0, 0, 0]
+    assert len(tried) == 2
+    assert "search_pending" not in call_log and call_log["search_attempts"] == 2
+    assert "search_next_attempt_at" not in call_log
+
+
+def test_failed_call_log_waits_for_its_backoff(db, monkeypatch):
+    tried = []
+
+    async def broken(db, document):
+        tried.append(document["_id"])
+        raise RuntimeError("crypto pool unavailable")
+    monkeypatch.setattr(SearchIndexService, "index_existing_call_log", broken)
+
+    async def scenario():
+        await _receive(db, _report("call-1", "Hi", "Book me in"))
+        for _ in range(3):
+            await search_index_worker.index_pending(db)
+        return await db.callslog.find_one({})
+
+    call_log = run(scenario())
+    assert len(tried) == 1
+    assert call_log["search_pending"] is True and call_log["search_attempts"] == 1
+    assert call_log["search_next_attempt_at"] > call_log["_id"].generation_time.replace(tzinfo=None)
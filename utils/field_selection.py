@@ -0,0 +1,78 @@
+from typing import List, Optional, Tuple
+
+Path = Tuple[str, ...]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[Path]]:
+    """'body.message.summary,email' -> [('body', 'message', 'summary'), ('email',)]; None = everything."""
+    if not fields:
+        return None
+    paths = [tuple(p for p in part.strip().split(".") if p) for part in fields.split(",")]
+    return [p for p in paths if p] or None
+
+
+def wants(paths: Optional[List[Path]], *prefix: str) -> bool:
+    """True when the selection includes anything at or below prefix (or prefix is inside a selected path)."""
+    if paths is None:
+        return True
+    n = len(prefix)
+    return any(p[:n] == prefix or prefix[:len(p)] == p for p in paths)
+
+
+def sub_paths(paths: Optional[List[Path]], *prefix: str) -> Optional[List[Path]]:
+    """Selection relative to prefix; None when prefix itself (or an ancestor) is selected whole."""
+    if paths is None:
+        return None
+    n = len(prefix)
+    if any(prefix[:len(p)] == p for p in paths):
+        return None
+    return [p[n:] for p in paths if p[:n] == prefix and len(p) > n]
+
+
+def omitted(value) -> dict:
+    """Opaque marker returned in place of a value that was not selected (never decrypted)."""
+    marker = {"omitted": True}
+    if isinstance(value, list):
+        marker["count"] = len(value)
+    return marker
+
+
+def select(document: dict, paths: Optional[List[Path]]) -> dict:
+    """Keep the selected paths of a document and replace every sibling with an omitted() marker."""
+    if paths is None or not isinstance(document, dict):
+        return document
+    result = {}
+    for key, value in document.items():
+        if not wants(paths, key):
+            result[key] = omitted(value)
+            continue
+        nested = sub_paths(paths, key)
+        result[key] = select(value, nested) if nested else value
+    return result
+
+
+def check_message_range(offset: Optional[int], limit: Optional[int]) -> None:
+    """A message range needs a positive limit ($slice rejects [offset, n <= 0])."""
+    if limit is not None and limit <= 0:
+        raise ValueError("message_limit must be a positive number")
+
+
+def mongo_slice(offset: Optional[int], limit: Optional[int]):
+    """$slice argument for a message range (negative offset counts from the end), or None for all."""
+    check_message_range(offset, limit)
+    if offset is None and limit is None:
+        return None
+    if offset is None:
+        return limit
+    return [offset, limit if limit is not None else 2 ** 31 - 1]
+
+
+def slice_list(values: list, offset: Optional[int], limit: Optional[int]) -> list:
+    """The same range as mongo_slice, applied in Python."""
+    check_message_range(offset, limit)
+    if offset is None and limit is None:
+        return values
+    if offset is None:
+        return values[:limit]
+    start = offset if offset >= 0 else max(len(values) + offset, 0)
+    return values[start:start + limit] if limit is not None else values[start:]
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, float]] = {}
+_gauges: Dict[str, Callable[[], object]] = {}
+
+
+def _key(name: str, labels: Optional[dict]) -> str:
+    if not labels:
+        return name
+    parts = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{parts}}}"
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """Increment a counter (optionally labelled)."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one observation (latency, batch size, ...) into a running summary."""
+    key = _key(name, labels)
+    with _lock:
+        s = _summaries.get(key)
+        if s is None:
+            _summaries[key] = {"count": 1, "sum": value, "min": value, "max": value}
+        else:
+            s["count"] += 1
+            s["sum"] += value
+            s["min"] = min(s["min"], value)
+            s["max"] = max(s["max"], value)
+
+
+def register_gauge(name: str, fn: Callable[[], object]) -> None:
+    """Register a callable evaluated every time a snapshot is taken."""
+    with _lock:
+        _gauges[name] = fn
+
+
+class timer:
+    """Context manager that observes the elapsed time in milliseconds."""
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, (time.perf_counter() - self._start) * 1000, **self.labels)
+        return False
+
+
+def snapshot() -> dict:
+    """Return a JSON-serialisable copy of every metric."""
+    with _lock:
+        counters = dict(_counters)
+        summaries = {
+            k: {**v, "avg": round(v["sum"] / v["count"], 3) if v["count"] else 0.0}
+            for k, v in _summaries.items()
+        }
+        gauges = dict(_gauges)
+
+    gauge_values = {}
+    for name, fn in gauges.items():
+        try:
+            gauge_values[name] = fn()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+
+    return {"counters": counters, "summaries": summaries, "gauges": gauge_values}
@@ -0,0 +1,77 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+import bson
+from bson import ObjectId
+from bson.errors import BSONError
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Above this many matches a filtered total is reported as a lower bound
+ESTIMATED_TOTAL_LIMIT = 10000
+
+_CURSOR_VALUE_TYPES = (datetime, str, int, float, type(None))
+
+
+def encode_cursor(sort_value, last_id) -> str:
+    """Opaque continuation token for the (sort_value, _id) of the last item of a page."""
+    return base64.urlsafe_b64encode(bson.encode({"v": sort_value, "i": last_id})).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[object, object]:
+    """Inverse of encode_cursor; ValueError for anything that is not one of our tokens."""
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        sort_value, last_id = data["v"], data["i"]
+    except (BSONError, KeyError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    # Tokens come from clients: only scalars, never a document that Mongo would read as operators
+    if not isinstance(last_id, ObjectId) or not isinstance(sort_value, _CURSOR_VALUE_TYPES):
+        raise ValueError("Invalid cursor")
+    return sort_value, last_id
+
+
+def after_cursor(sort_field: str, sort_value, last_id) -> dict:
+    """
+    Filter for the documents after (sort_value, last_id) in (sort_field desc, _id desc)
+    order. Documents without the sort field sort last, so they follow every value.
+    """
+    if sort_value is None:
+        return {sort_field: None, "_id": {"$lt": last_id}}
+    return {"$or": [
+        {sort_field: {"$lt": sort_value}},
+        {sort_field: sort_value, "_id": {"$lt": last_id}},
+        {sort_field: None},
+    ]}
+
+
+async def keyset_page(
+    collection: AsyncIOMotorCollection, query: dict, projection: dict,
+    sort_field: str, limit: int, cursor: Optional[str] = None,
+) -> Tuple[list, Optional[str]]:
+    """
+    One page of `query` newest first, continuing after `cursor`. Every page is an
+    index range scan from the cursor position (needs a (filter..., sort_field -1,
+    _id -1) index), so page 1000 costs the same as page 1.
+    """
+    if cursor:
+        position = after_cursor(sort_field, *decode_cursor(cursor))
+        query = {"$and": [query, position]} if query else position
+    docs = await (
+        collection.find(query, projection)
+        .sort([(sort_field, -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1].get(sort_field), docs[-1]["_id"])
+
+
+async def estimated_total(collection: AsyncIOMotorCollection, query: dict) -> dict:
+    """Collection metadata count when unfiltered, else an index count capped at ESTIMATED_TOTAL_LIMIT."""
+    if not query:
+        return {"estimated_total": await collection.estimated_document_count(), "total_is_lower_bound": False}
+    count = await collection.count_documents(query, limit=ESTIMATED_TOTAL_LIMIT)
+    return {"estimated_total": count, "total_is_lower_bound": count >= ESTIMATED_TOTAL_LIMIT}
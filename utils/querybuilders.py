@@ -1,5 +1,4 @@
 from bson import ObjectId
-from datetime import datetime
 from fastapi.responses import JSONResponse
 
 
@@ -14,16 +13,6 @@ class AppointmentQuery:
         except Exception:
             return {"_id": None}
 
-    @staticmethod
-    def duplicate_check(patient_name: str, doctor_name: str, appointment_time: datetime):
-        """Query to check for duplicate appointment"""
-        return {
-            "$or": [
-                {"patient_name": patient_name, "appointment_time": appointment_time},
-                {"doctor_name": doctor_name, "appointment_time": appointment_time},
-            ]
-        }
-
     # JSON responses
     @staticmethod
     def generic_success(message: str, extra_data: dict = None):
@@ -37,12 +26,14 @@ class AppointmentQuery:
         return JSONResponse(content={"status": status, "message": message}, status_code=400)
 
     @staticmethod
-    def appointment_booked(patient_name: str, doctor_name: str, appointment_id: str):
-        return JSONResponse(
-            content={
-                "status": "success",
-                "message": f"Appointment booked for {patient_name} with {doctor_name}",
-                "appointment_id": appointment_id,
-            },
-            status_code=200,
-        )
+    def booking_confirmation(patient_name: str, doctor_name: str, appointment_id: str):
+        return {
+            "status": "success",
+            "message": f"Appointment booked for {patient_name} with {doctor_name}",
+            "appointment_id": appointment_id,
+        }
+
+    @staticmethod
+    def tool_results(results: list):
+        """VAPI tool-call response: one entry per toolCallId with `result` or `error`."""
+        return JSONResponse(content={"results": results}, status_code=200)
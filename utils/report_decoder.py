@@ -0,0 +1,249 @@
+import json
+import logging
+import mmap
+import re
+import typing
+from typing import Optional
+
+from models.info import CallInfo
+from models.report import VapiCallReport
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speedup
+    msgspec = None
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - spooled bodies are decoded through mmap instead
+    ijson = None
+
+logger = logging.getLogger("utils.report_decoder")
+
+# Fields of VapiCallReport the webhook pipeline reads; everything else is
+# skipped by the decoder and only kept in the raw bytes for archival.
+REPORT_FIELDS = ["type", "timestamp", "durationSeconds", "endedReason", "startedAt", "endedAt"]
+CALL_FIELDS = ["id"]
+
+
+def _annotation(model, name):
+    """Optional[X] annotation of a pydantic field, as msgspec understands it."""
+    annotation = model.model_fields[name].annotation
+    return annotation if type(None) in typing.get_args(annotation) else Optional[annotation]
+
+
+def _struct_from_model(model, fields, extra=(), name=None):
+    """Generate a msgspec Struct holding only `fields` of a pydantic model (types copied from it)."""
+    spec = [(f, _annotation(model, f), None) for f in fields]
+    spec += [(f, t, None) for f, t in extra]
+    return msgspec.defstruct(name or f"{model.__name__}Fast", spec, kw_only=True)
+
+
+if msgspec is not None:
+    _MetadataStruct = msgspec.defstruct("MetadataFast", [("user_email", Optional[str], None)], kw_only=True)
+    _CallStruct = _struct_from_model(CallInfo, CALL_FIELDS)
+    _MessageStruct = _struct_from_model(
+        VapiCallReport, REPORT_FIELDS,
+        extra=[
+            ("call", Optional[_CallStruct]),
+            ("duration", Optional[float]),
+            ("email", Optional[str]),
+            ("metadata", Optional[_MetadataStruct]),
+        ],
+        name="VapiCallReportFast",
+    )
+    _CallStartStruct = msgspec.defstruct("CallStartDataFast", [("email", Optional[str], None)], kw_only=True)
+    _EnvelopeStruct = msgspec.defstruct(
+        "VapiWebhookFast",
+        [
+            ("message", Optional[_MessageStruct], None),
+            ("call_id", Optional[str], None),
+            ("email", Optional[str], None),
+            ("call_start_data", Optional[_CallStartStruct], None),
+        ],
+        kw_only=True,
+    )
+    _decoder = msgspec.json.Decoder(_EnvelopeStruct)
+    _generic_decoder = msgspec.json.Decoder()
+
+    _TypeProbe = msgspec.defstruct(
+        "TypeProbe",
+        [("message", Optional[msgspec.defstruct("MessageTypeProbe", [("type", Optional[str], None)])], None)],
+    )
+    _probe_decoder = msgspec.json.Decoder(_TypeProbe)
+
+# VAPI serializes `message` first with `type` as its first or second key
+# ({"message":{"timestamp":...,"type":"..."}); match that prefix directly.
+_EVENT_TYPE_PREFIX = re.compile(
+    rb'\s*\{\s*"message"\s*:\s*\{\s*(?:"timestamp"\s*:\s*[-+0-9.eE]+\s*,\s*)?"type"\s*:\s*"([A-Za-z0-9_.\-]{1,64})"'
+)
+
+
+def normalize_timestamp(value):
+    """
+    Event timestamps (epoch ms) as int whenever they are whole numbers. The
+    typed decoder yields ints while json/ijson yield floats for 1.7e12-style
+    numbers, and the value is part of the idempotency key.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class EndOfCallReport:
+    """
+    The handful of end-of-call fields the pipeline needs, plus the untouched
+    body: raw bytes, or a seekable spool file for bodies spooled to disk.
+    """
+
+    FIELDS = (
+        "event_type", "timestamp", "call_id", "email", "duration_seconds",
+        "ended_reason", "started_at", "ended_at",
+    )
+    __slots__ = ("raw", "spool", "_size", "_body") + FIELDS
+
+    def __init__(self, raw: Optional[bytes], spool=None, size: int = None, **fields):
+        self.raw = raw
+        self.spool = spool
+        self._size = size
+        self._body = fields.pop("body", None)
+        for slot in self.FIELDS:
+            setattr(self, slot, fields.get(slot))
+
+    @property
+    def size(self) -> int:
+        return len(self.raw) if self.raw is not None else self._size
+
+    def head(self, limit: int = 4096) -> bytes:
+        """First bytes of the body (for logging) without reading a spool file whole."""
+        if self.raw is not None:
+            return self.raw[:limit]
+        self.spool.seek(0)
+        return self.spool.read(limit)
+
+    def body(self) -> dict:
+        """Materialize the full payload (only when something really needs the dict)."""
+        if self._body is None:
+            raw = self.raw
+            if raw is None:
+                self.spool.seek(0)
+                raw = self.spool.read()
+            self._body = _generic_decoder.decode(raw) if msgspec is not None else json.loads(raw)
+        return self._body
+
+
+def _from_struct(raw: Optional[bytes], env, **extra) -> EndOfCallReport:
+    msg = env.message
+    call = msg.call if msg else None
+    return EndOfCallReport(
+        raw,
+        **extra,
+        event_type=msg.type if msg else None,
+        timestamp=normalize_timestamp(msg.timestamp) if msg else None,
+        call_id=(call.id if call else None) or env.call_id,
+        email=env.email or (msg.email if msg else None)
+            or (msg.metadata.user_email if msg and msg.metadata else None)
+            or (env.call_start_data.email if env.call_start_data else None),
+        duration_seconds=(msg.durationSeconds or msg.duration or 0) if msg else 0,
+        ended_reason=msg.endedReason if msg else None,
+        started_at=msg.startedAt if msg else None,
+        ended_at=msg.endedAt if msg else None,
+    )
+
+
+def _from_dict(raw: Optional[bytes], body: dict, keep_body: bool = True, **extra) -> EndOfCallReport:
+    msg = body.get("message") or {}
+    return EndOfCallReport(
+        raw,
+        body=body if keep_body else None,
+        **extra,
+        event_type=msg.get("type"),
+        timestamp=normalize_timestamp(msg.get("timestamp")),
+        call_id=(msg.get("call") or {}).get("id") or body.get("call_id"),
+        email=body.get("email") or msg.get("email")
+            or (msg.get("metadata") or {}).get("user_email")
+            or (body.get("call_start_data") or {}).get("email"),
+        duration_seconds=msg.get("durationSeconds") or msg.get("duration") or 0,
+        ended_reason=msg.get("endedReason"),
+        started_at=msg.get("startedAt"),
+        ended_at=msg.get("endedAt"),
+    )
+
+
+def decode_end_of_call(raw: bytes) -> EndOfCallReport:
+    """
+    Decode a VAPI webhook body into an EndOfCallReport without building the
+    full dict. Falls back to json.loads when msgspec is unavailable or the
+    payload does not match the expected types.
+    """
+    if msgspec is not None:
+        try:
+            return _from_struct(raw, _decoder.decode(raw))
+        except msgspec.ValidationError as e:
+            logger.debug(f"Typed decode failed, falling back to generic JSON: {e}")
+    return _from_dict(raw, json.loads(raw))
+
+
+def peek_event_type(raw: bytes) -> Optional[str]:
+    """
+    Read message.type from a raw webhook body without materializing it.
+
+    Tries an anchored byte match on the usual VAPI layout first (a few
+    microseconds regardless of payload size), then a typed probe decode that
+    skips every other field.
+    """
+    match = _EVENT_TYPE_PREFIX.match(raw)
+    if match:
+        return match.group(1).decode()
+    if msgspec is not None:
+        try:
+            probe = _probe_decoder.decode(raw)
+            return probe.message.type if probe.message else None
+        except msgspec.DecodeError:
+            return None
+    try:
+        return (json.loads(raw).get("message") or {}).get("type")
+    except (ValueError, AttributeError):
+        return None
+
+
+# Prefixes (in ijson notation) of every field _from_dict reads
+_SPOOL_PREFIXES = {
+    "message.type", "message.timestamp", "message.call.id", "call_id", "email", "message.email",
+    "message.metadata.user_email", "call_start_data.email", "message.durationSeconds",
+    "message.duration", "message.endedReason", "message.startedAt", "message.endedAt",
+}
+_SCALAR_EVENTS = {"string", "number", "boolean", "null"}
+
+
+def _set_path(target: dict, prefix: str, value) -> None:
+    *parents, leaf = prefix.split(".")
+    for key in parents:
+        target = target.setdefault(key, {})
+    target[leaf] = value
+
+
+def decode_end_of_call_file(spool) -> EndOfCallReport:
+    """
+    decode_end_of_call for a body spooled to a seekable file. The file is
+    parsed incrementally (ijson) so large arrays stream past without being
+    materialized; without ijson the typed msgspec decoder reads it through mmap.
+    """
+    spool.seek(0, 2)
+    size = spool.tell()
+    spool.seek(0)
+    if ijson is not None:
+        fields = {}
+        for prefix, event, value in ijson.parse(spool, use_float=True):
+            if prefix in _SPOOL_PREFIXES and event in _SCALAR_EVENTS and value is not None:
+                _set_path(fields, prefix, value)
+        return _from_dict(None, fields, keep_body=False, spool=spool, size=size)
+
+    with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        if msgspec is not None:
+            try:
+                return _from_struct(None, _decoder.decode(view), spool=spool, size=size)
+            except msgspec.ValidationError as e:
+                logger.debug(f"Typed decode failed, falling back to generic JSON: {e}")
+        return _from_dict(None, json.loads(bytes(view)), keep_body=False, spool=spool, size=size)
+
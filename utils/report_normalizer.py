@@ -0,0 +1,135 @@
+from typing import Optional
+
+from utils.field_selection import slice_list
+
+# A report carries the same conversation several times (message.messages,
+# artifact.messages, artifact.messagesOpenAIFormatted, conversation and the
+# flat transcripts); only one copy needs to be stored.
+
+# Marker key added to a normalized report, listing the dropped views
+NORMALIZED_KEY = "_derived_views"
+
+# Where the canonical VAPI-format turn list may live, in order of preference
+CANONICAL_PATHS = [("message", "artifact", "messages"), ("message", "messages")]
+
+# Redundant views and the format they are rebuilt in
+VIEW_PATHS = {
+    ("message", "messages"): "vapi",
+    ("message", "artifact", "messages"): "vapi",
+    ("message", "artifact", "messagesOpenAIFormatted"): "openai",
+    ("message", "conversation"): "openai",
+    ("message", "transcript"): "transcript",
+    ("message", "artifact", "transcript"): "transcript",
+}
+
+_OPENAI_ROLES = {"bot": "assistant", "user": "user", "system": "system"}
+_TRANSCRIPT_SPEAKERS = {"bot": "AI", "user": "User"}
+
+
+def _get(body: dict, path: tuple):
+    node = body
+    for key in path:
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return node
+
+
+def _set(body: dict, path: tuple, value) -> None:
+    node = body
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+
+def _pop(body: dict, path: tuple) -> None:
+    _get(body, path[:-1]).pop(path[-1], None)
+
+
+def _to_openai(turns: list) -> list:
+    return [{"role": _OPENAI_ROLES[t["role"]], "content": t["message"]} for t in turns]
+
+
+def _to_transcript(turns: list) -> str:
+    return "\n".join(
+        f"{_TRANSCRIPT_SPEAKERS[t['role']]}: {t['message']}"
+        for t in turns if t.get("role") in _TRANSCRIPT_SPEAKERS
+    )
+
+
+def _build_view(fmt: str, turns: list):
+    if fmt == "vapi":
+        return turns
+    if fmt == "openai":
+        return _to_openai(turns)
+    return _to_transcript(turns)
+
+
+def _rebuild(fmt: str, turns: list, original) -> bool:
+    """True when the view can be rebuilt from turns and matches the original."""
+    try:
+        return _build_view(fmt, turns) == original
+    except (KeyError, TypeError):
+        return False
+
+
+def _canonical(body: dict):
+    for path in CANONICAL_PATHS:
+        turns = _get(body, path)
+        if isinstance(turns, list) and turns:
+            return path, turns
+    return None, None
+
+
+def conversation_turns(body: dict) -> list:
+    """The canonical VAPI turn list of a report ([] when it has none)."""
+    _, turns = _canonical(body)
+    return turns or []
+
+
+def normalize_report(body: dict) -> dict:
+    """
+    Keep one canonical turn list and drop (in place) every other conversation
+    view. A view is only dropped after its rebuilt form compared equal to the
+    original, so denormalize_report() always restores the exact payload.
+    """
+    canonical_path, turns = _canonical(body)
+    if turns is None:
+        return body
+
+    derived = {}
+    for path, fmt in VIEW_PATHS.items():
+        if path == canonical_path:
+            continue
+        original = _get(body, path)
+        if original is not None and _rebuild(fmt, turns, original):
+            derived[".".join(path)] = fmt
+    for dotted in derived:
+        _pop(body, tuple(dotted.split(".")))
+    if derived:
+        body[NORMALIZED_KEY] = {"canonical": ".".join(canonical_path), "views": derived}
+    return body
+
+
+def denormalize_report(body: dict) -> dict:
+    """Rebuild (in place) the views dropped by normalize_report."""
+    marker: Optional[dict] = body.pop(NORMALIZED_KEY, None)
+    if not marker:
+        return body
+    turns = _get(body, tuple(marker["canonical"].split(".")))
+    for dotted, fmt in marker["views"].items():
+        view = _build_view(fmt, turns)
+        # vapi views are a second copy of the canonical list, not an alias of it
+        _set(body, tuple(dotted.split(".")), list(view) if fmt == "vapi" else view)
+    return body
+
+
+def slice_conversation(body: dict, offset: Optional[int], limit: Optional[int]) -> dict:
+    """Apply a message range to every list-shaped conversation view (in place)."""
+    if offset is None and limit is None:
+        return body
+    for path, fmt in VIEW_PATHS.items():
+        view = _get(body, path)
+        if isinstance(view, list):
+            _set(body, path, slice_list(view, offset, limit))
+    return body
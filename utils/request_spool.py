@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import IO, Optional, Tuple
+
+from fastapi import Request
+
+logger = logging.getLogger("utils.request_spool")
+
+# Bodies larger than this are written to a temp file while they arrive
+WEBHOOK_SPOOL_THRESHOLD_BYTES = int(os.getenv("WEBHOOK_SPOOL_THRESHOLD_BYTES", 1024 * 1024))
+# Where spool files go (default: the system temp dir)
+WEBHOOK_SPOOL_DIR = os.getenv("WEBHOOK_SPOOL_DIR") or None
+# Received bytes are handed to a worker thread in writes of about this size
+WEBHOOK_SPOOL_WRITE_BYTES = int(os.getenv("WEBHOOK_SPOOL_WRITE_BYTES", 256 * 1024))
+
+
+def _open_spool(data: bytes) -> IO[bytes]:
+    spool = tempfile.TemporaryFile(dir=WEBHOOK_SPOOL_DIR, prefix="webhook-")
+    spool.write(data)
+    return spool
+
+
+def _finish_spool(spool: IO[bytes], data: bytes) -> None:
+    spool.write(data)
+    spool.flush()
+    spool.seek(0)
+
+
+async def read_body(request: Request) -> Tuple[Optional[bytes], Optional[IO[bytes]]]:
+    """
+    Read a request body, spooling it to disk once it grows past
+    WEBHOOK_SPOOL_THRESHOLD_BYTES. Returns (bytes, None) for small bodies and
+    (None, file) for spooled ones; the caller closes the file (it is deleted on close).
+    File creation and writes run on the default executor, never on the event loop.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) < WEBHOOK_SPOOL_THRESHOLD_BYTES:
+        return await request.body(), None
+
+    loop = asyncio.get_running_loop()
+    buffer = bytearray()
+    spool = None
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            if spool is None:
+                if len(buffer) >= WEBHOOK_SPOOL_THRESHOLD_BYTES:
+                    spool = await loop.run_in_executor(None, _open_spool, bytes(buffer))
+                    buffer = bytearray()
+            elif len(buffer) >= WEBHOOK_SPOOL_WRITE_BYTES:
+                await loop.run_in_executor(None, spool.write, bytes(buffer))
+                buffer = bytearray()
+        if spool is None:
+            return bytes(buffer), None
+        await loop.run_in_executor(None, _finish_spool, spool, bytes(buffer))
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        raise
+    return None, spool
@@ -5,7 +5,11 @@ from typing import Any, Dict, List, Optional, Tuple
 import asyncio
 import httpx  # async http client (non-blocking)
 
-from encrypt.encryption import encrypt_field  # 🔒
+from encrypt.encryption import encrypt_fields_async  # 🔒
+from services.decrypted_cache import decrypted_cache
+from services.blind_index_service import BlindIndexService
+from services.chat_message_store import ChatMessageStore
+from services.search_index import SearchIndexService
 
 VAPI_API_KEY = os.getenv("VAPI_API_KEY")
 VAPI_CHAT_BASE_URL = os.getenv("VAPI_CHAT_BASE_URL")
@@ -70,7 +74,7 @@ async def send_message(user_id: str, assistant_id: str, user_input: str, db, ema
     }
 
     # Reuse previous chat if we have it
-    existing_chat = await db.chats.find_one({"user_id": user_id})
+    existing_chat = await db.chats.find_one({"user_id": user_id}, {"chat_id": 1})
     if existing_chat:
         payload["previousChatId"] = existing_chat["chat_id"]
 
@@ -97,37 +101,41 @@ async def send_message(user_id: str, assistant_id: str, user_input: str, db, ema
     if tool_call:
         assistant_msg["content"] = f"[Tool Call] {tool_call.get('toolName')} with params {tool_call.get('parameters')}"
 
-    encrypted_messages = [
-        encrypt_field(json.dumps(user_msg)),
-        encrypt_field(json.dumps(assistant_msg)),
-    ]
+    encrypted_messages = await encrypt_fields_async([
+        json.dumps(user_msg),
+        json.dumps(assistant_msg),
+    ])
 
     async def _persist():
         try:
             now = datetime.utcnow()
             if existing_chat:
-                await db.chats.update_one(
-                    {"_id": existing_chat["_id"]},
-                    {
-                        "$set": {
-                            "chat_id": chat_id,
-                            "updated_at": now,
-                            "email": email,  # 🔹 keep email updated
-                        },
-                        "$push": {"messages": {"$each": encrypted_messages}},
-                    },
+                chat_ref = existing_chat["_id"]
+                first = await ChatMessageStore.append(
+                    db, chat_ref, encrypted_messages, now,
+                    BlindIndexService.with_index("chats", {
+                        "chat_id": chat_id,
+                        "updated_at": now,
+                        "email": email,  # 🔹 keep email updated
+                    }),
                 )
+                decrypted_cache.invalidate("chat", chat_ref)
             else:
-                await db.chats.insert_one(
-                    {
+                first = 0
+                chat_ref = await ChatMessageStore.create(
+                    db,
+                    BlindIndexService.with_index("chats", {
                         "user_id": user_id,
                         "email": email,  # 🔹 store email on first insert
                         "chat_id": chat_id,
-                        "messages": encrypted_messages,
                         "created_at": now,
                         "updated_at": now,
-                    }
+                    }),
+                    encrypted_messages, now,
                 )
+            if first is not None:
+                # Indexed from the plaintext we still hold; only keyed hashes are stored
+                await SearchIndexService.index_chat_messages(db, chat_ref, first, [user_msg, assistant_msg])
         except Exception as e:
             print("Mongo persist failed:", e)
 